@@ -1,13 +1,18 @@
+import io
 import os
 import time
 import json
 import uuid
 import hashlib
+import threading
 import tempfile
 import numpy as np
 import re
+import random
+from xml.sax.saxutils import escape as xml_escape
 from datetime import datetime, timedelta
 from collections import defaultdict, deque
+from contextlib import contextmanager
 from typing import Dict, List, Tuple, Optional, Set, Any
 from flask import Flask, render_template, request, jsonify, make_response, send_file
 from flask_socketio import SocketIO, emit
@@ -17,9 +22,24 @@ import tiktoken
 from pathlib import Path
 from scipy.io import wavfile
 import base64
+import click
 import requests
 from modules.rag_system import RAGSystem
-from modules.speech_processor import SpeechProcessor
+from modules.speech_processor import SpeechProcessor, AudioTooLargeError
+from modules.audio_store import AudioMemoryCache, AudioStore, AudioPack, AUDIO_MIME_TYPES, AUDIO_KEY_PATTERN
+from modules.http_session import PooledHTTPSession
+from modules.tts_resilience import EngineFailover
+from modules.single_flight import SingleFlight
+from modules.audio_stitch import split_sentences, stitch_wav
+from modules.lipsync import LipSyncCache, build_lipsync
+from modules.audio_duration import get_duration_ms
+from modules.audio_postprocess import postprocess_audio
+from modules.transcode import FFMPEG_PATH, parse_codecs, negotiate_codec, transcode
+from modules.tts_scheduler import TTSScheduler, TTSProviderError, parse_rate_limits
+from modules.tts_text import canonicalize_tts_request, canonicalize_tts_params
+from modules.tts_engines import TTSEngine, TTSEngineRegistry, SLOPolicy
+from modules.openai_tts_client import OpenAITTSClient
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
 import azure.cognitiveservices.speech as speechsdk
 from dotenv import load_dotenv
@@ -285,7 +305,8 @@ emotion_transition_stats = defaultdict(lambda: defaultdict(int))
 
 # キャッシュ(会話履歴用)
 conversation_cache = {}
-audio_cache = {}
+# 音声キャッシュ(メモリ、バイト上限付きLRU)
+audio_cache = AudioMemoryCache(max_bytes=int(float(os.getenv('AUDIO_CACHE_MAX_MB', '32')) * 1024 * 1024))
 
 # ====== クイズシステムデータ ======
 QUIZ_DATA = {
@@ -355,6 +376,50 @@ QUIZ_DATA = {
     ]
 }
 
+# クイズの定型セリフ（音声パックの事前合成対象）
+QUIZ_PROPOSAL_TEXT = {
+    'ja': '理解度レベルがMAXになりました！クイズに挑戦して全問正解したら素敵なプレゼントがもらえるよ！クイズに挑戦しますか？',
+    'en': 'Your understanding level is MAX! Challenge the quiz and get a special present if you answer all correctly! Will you try?'
+}
+
+QUIZ_RESULT_TEXT = {
+    'correct': {
+        'ja': 'すごい！正解です！',
+        'en': 'Amazing! Correct!'
+    },
+    'incorrect': {
+        'ja': 'あぁ、惜しいです！',
+        'en': 'Oh, so close!'
+    }
+}
+
+QUIZ_DECLINE_TEXT = {
+    'ja': 'わかった！また挑戦したくなったら声をかけてね！',
+    'en': 'Okay! Let me know when you want to try!'
+}
+
+QUIZ_QUIT_TEXT = {
+    'ja': 'わかった！準備ができたらまた挑戦してね！',
+    'en': 'Okay! Come back when you\'re ready!'
+}
+
+QUIZ_PERFECT_TEXT = {
+    'ja': 'コングラチュレーション！おめでとうございます！全問正解したあなたに特別なプレゼントです！',
+    'en': 'Congratulations! Perfect score! Here\'s a special present for you!'
+}
+
+QUIZ_SCORE_TEXT = {
+    'ja': '{score}/3問正解でした。再度挑戦しますか？',
+    'en': 'You got {score}/3 correct. Try again?'
+}
+
+def format_quiz_question_text(language, question_index):
+    """読み上げ用の問題文"""
+    question_data = QUIZ_DATA[language][question_index]
+    if language == 'ja':
+        return f"問題{question_index + 1}: {question_data['question']}"
+    return f"Question {question_index + 1}: {question_data['question']}"
+
 # クイズセッション管理
 quiz_sessions = {}
 
@@ -366,18 +431,183 @@ use_coe_font = False
 azure_speech_client = None
 use_azure_speech = False
 
+# 応答生成中の相づち（キャッシュミスで応答を生成する間、すぐに短い音声を再生する）
+THINKING_FILLER_ENABLED = os.getenv('THINKING_FILLER_ENABLED', 'true').lower() == 'true'
+filler_stats = {'emitted': 0, 'unavailable': 0}
+
+# 音声エンジンのレジストリ（エンジンの選択はSLO: p95レイテンシ・エラー率に基づく）
+tts_registry = TTSEngineRegistry(
+    policy=SLOPolicy(
+        p95_ms=float(os.getenv('TTS_SLO_P95_MS', '6000')),
+        max_error_rate=float(os.getenv('TTS_SLO_ERROR_RATE', '0.2')),
+        min_calls=int(os.getenv('TTS_SLO_MIN_CALLS', '5'))
+    ),
+    window_size=int(os.getenv('TTS_STATS_WINDOW', '50'))
+)
+
+# 接続プールを共有するスレッドの数（リクエスト処理スレッド: Procfileの --threads と各Executor）
+GUNICORN_THREADS = int(os.getenv('GUNICORN_THREADS', '4'))
+POST_RESPONSE_WORKERS = int(os.getenv('POST_RESPONSE_WORKERS', '8'))
+TTS_SEGMENT_WORKERS = int(os.getenv('TTS_SEGMENT_WORKERS', '8'))
+TTS_FAILOVER_WORKERS = int(os.getenv('TTS_FAILOVER_WORKERS', '8'))
+
+# 音声合成APIとの共有HTTP接続プール
+# 同時に使われうる接続数（スレッド数と各Executorのワーカー数の合計）に合わせ、
+# 接続待ちや、プールに戻せない接続の破棄が起きないようにする
+TTS_HTTP_POOL_MAXSIZE = int(os.getenv(
+    'TTS_HTTP_POOL_MAXSIZE',
+    str(GUNICORN_THREADS + POST_RESPONSE_WORKERS + TTS_SEGMENT_WORKERS + TTS_FAILOVER_WORKERS)
+))
+tts_http_session = PooledHTTPSession(
+    pool_maxsize=TTS_HTTP_POOL_MAXSIZE,
+    connect_timeout=float(os.getenv('TTS_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.getenv('TTS_READ_TIMEOUT', '20'))
+)
+
+# 応答テキスト生成後の後処理（音声・サジェスチョン・メディア）を並行実行するExecutor
+post_response_executor = ThreadPoolExecutor(
+    max_workers=POST_RESPONSE_WORKERS,
+    thread_name_prefix='post-response'
+)
+# 後処理の各ステップのタイムアウト（秒）
+POST_RESPONSE_TIMEOUTS = {
+    'audio': float(os.getenv('AUDIO_STEP_TIMEOUT', '30')),
+    'suggestions': float(os.getenv('SUGGESTIONS_STEP_TIMEOUT', '5')),
+    'media': float(os.getenv('MEDIA_STEP_TIMEOUT', '5'))
+}
+
+# 文単位の音声断片キャッシュ（既出の文の組み合わせは合成せずにPCMを連結する）
+# WAV（PCM）を出力する音声エンジンの場合のみ有効
+AUDIO_FRAGMENT_CACHE = os.getenv('AUDIO_FRAGMENT_CACHE', 'false').lower() == 'true'
+# 文の間に入れる無音（ミリ秒）。断片は前後の無音を除いてあるため、重ねずに間を入れる
+AUDIO_FRAGMENT_GAP_MS = float(os.getenv('AUDIO_FRAGMENT_GAP_MS', '250'))
+fragment_stats = {'stitched': 0, 'fallbacks': 0, 'retried': 0, 'fragment_hits': 0, 'fragment_misses': 0}
+
+# 長い応答の分割合成: 文ごとに並行して合成し、順番どおりに連結する
+TTS_SEGMENTED_SYNTHESIS = os.getenv('TTS_SEGMENTED_SYNTHESIS', 'false').lower() == 'true'
+TTS_SEGMENT_MIN_CHARS = int(os.getenv('TTS_SEGMENT_MIN_CHARS', '80'))
+tts_segment_executor = ThreadPoolExecutor(
+    max_workers=TTS_SEGMENT_WORKERS,
+    thread_name_prefix='tts-segment'
+)
+# 音声合成APIのレート制限（トークンバケット）と優先度付きスケジューラー
+# 優先度: live（会話の応答）> greeting（挨拶）> quiz（クイズ）> prefetch（事前合成）
+tts_scheduler = TTSScheduler(
+    rate_limits=parse_rate_limits(os.getenv('TTS_RATE_LIMITS', 'azure_speech=10/20,coe_font=2/5,openai_tts=5/10')),
+    max_retries=int(os.getenv('TTS_MAX_RETRIES', '3')),
+    backoff_base=float(os.getenv('TTS_RETRY_BASE_MS', '500')) / 1000,
+    backoff_max=float(os.getenv('TTS_RETRY_MAX_MS', '8000')) / 1000
+)
+# 音声エンジンごとの同時リクエスト上限
+TTS_ENGINE_MAX_CONCURRENCY = int(os.getenv('TTS_ENGINE_MAX_CONCURRENCY', '4'))
+tts_engine_slots = {
+    name: threading.BoundedSemaphore(TTS_ENGINE_MAX_CONCURRENCY)
+    for name in ('azure_speech', 'coe_font', 'openai_tts')
+}
+
+# 合成音声の後処理: 前後の無音の除去と、エンジン間で揃えるための音量の正規化
+AUDIO_POSTPROCESS = os.getenv('AUDIO_POSTPROCESS', 'true').lower() == 'true'
+AUDIO_POSTPROCESS_OPTIONS = {
+    'trim': os.getenv('AUDIO_TRIM_SILENCE', 'true').lower() == 'true',
+    'normalize': os.getenv('AUDIO_NORMALIZE_LOUDNESS', 'true').lower() == 'true',
+    'threshold_db': float(os.getenv('AUDIO_SILENCE_THRESHOLD_DB', '-45')),
+    'keep_ms': float(os.getenv('AUDIO_SILENCE_KEEP_MS', '50')),
+    'target_dbfs': float(os.getenv('AUDIO_LOUDNESS_TARGET_DBFS', '-20')),
+    'peak_dbfs': float(os.getenv('AUDIO_LOUDNESS_PEAK_DBFS', '-1'))
+}
+# 圧縮形式（OpenAIのMP3など）はデコード・再エンコードが必要（FFmpegがない場合は処理しない）
+# 正規化しないとエンジン間で音量が揃わないため、既定では音量の正規化が有効なら再エンコードする
+AUDIO_POSTPROCESS_REENCODE = os.getenv(
+    'AUDIO_POSTPROCESS_REENCODE', str(AUDIO_POSTPROCESS_OPTIONS['normalize'])
+).lower() == 'true'
+postprocess_stats = {'processed': 0, 'skipped': 0, 'failed': 0, 'trimmed_ms': 0.0, 'bytes_saved': 0}
+
+# リップシンク用の口の開き具合（RMSエンベロープ）を音声と一緒に送る
+LIPSYNC_ENVELOPE = os.getenv('LIPSYNC_ENVELOPE', 'false').lower() == 'true'
+LIPSYNC_FRAME_MS = int(os.getenv('LIPSYNC_FRAME_MS', '40'))
+lipsync_cache = LipSyncCache(max_entries=int(os.getenv('LIPSYNC_CACHE_ENTRIES', '1000')))
+
+# 感情違いの音声での代替（stale-while-revalidate）
+# 指定の感情の音声が無く、同じテキストの別の感情の音声があればそれを即座に返し、
+# 指定の感情の音声はバックグラウンドで合成して次回に備える
+AUDIO_EMOTION_FALLBACK = os.getenv('AUDIO_EMOTION_FALLBACK', 'false').lower() == 'true'
+emotion_fallback_stats = {'served': 0, 'revalidated': 0, 'revalidate_failed': 0}
+revalidating_audio_keys = set()
+revalidating_lock = threading.Lock()
+
+# エンジンごとの音声キャッシュヒット率（record_audio_lookup で記録）
+audio_lookup_stats = {}
+audio_lookup_lock = threading.Lock()
+
+# 同じ音声の同時合成を1回にまとめる（キー: 音声キャッシュキー）
+tts_single_flight = SingleFlight()
+
+# 音声エンジンのサーキットブレーカーとヘッジ付きフェイルオーバー
+tts_failover = EngineFailover(
+    breaker_options={
+        'window_size': int(os.getenv('TTS_BREAKER_WINDOW', '20')),
+        'min_calls': int(os.getenv('TTS_BREAKER_MIN_CALLS', '5')),
+        'error_rate_threshold': float(os.getenv('TTS_BREAKER_ERROR_RATE', '0.5')),
+        'p95_threshold_ms': float(os.getenv('TTS_BREAKER_P95_MS', '8000')),
+        'open_seconds': float(os.getenv('TTS_BREAKER_OPEN_SECONDS', '30'))
+    },
+    hedge_enabled=os.getenv('TTS_HEDGE_ENABLED', 'false').lower() == 'true',
+    hedge_default_ms=float(os.getenv('TTS_HEDGE_DEFAULT_MS', '3000')),
+    hedge_min_ms=float(os.getenv('TTS_HEDGE_MIN_MS', '500')),
+    max_workers=TTS_FAILOVER_WORKERS
+)
+
 # SpeechProcessor (音声認識)
 speech_processor = None
 
+# 録音中に分割送信されている音声（audio_chunk / audio_end）: セッションID → {ストリームID: AudioUploadStream}
+# audio_end 後も音声認識が終わるまでは登録したままにし、遅れて届いた断片を受け付ける
+audio_streams = defaultdict(dict)
+# 音声認識まで終わったストリームID（さらに遅れて届いた断片で新しいストリームを作らないため）
+finished_audio_streams = defaultdict(lambda: deque(maxlen=8))
+audio_streams_lock = threading.Lock()
+
+# 音声ストア（ディスク永続化）
+audio_store = None
+
+# 定型セリフの事前合成音声パック（flask prerender-audio で生成）
+audio_pack = None
+
+# 音声の配信方式: 'base64'（インライン）/ 'url'（/audio/<key> 経由）/ 'binary'（バイナリ添付）
+# クライアントが接続時に audio_transport を指定した場合はそちらを優先
+AUDIO_TRANSPORTS = ('base64', 'url', 'binary')
+AUDIO_DELIVERY_MODE = os.getenv('AUDIO_DELIVERY_MODE', 'base64').lower()
+
+# 応答モード: 'sync'（音声合成を待って送信）/ 'text_first'（テキストを先に送り、音声は response_audio で後送）
+# クライアントが接続時に response_mode を指定した場合はそちらを優先
+RESPONSE_MODES = ('sync', 'text_first')
+RESPONSE_MODE = os.getenv('RESPONSE_MODE', 'sync').lower()
+
+# 音声形式のネゴシエーション: クライアントが接続時/言語変更時に再生可能なコーデックを通知し、
+# サーバーは合成音声を1回だけ最適な形式に変換して、形式ごとにキャッシュする
+AUDIO_TRANSCODE = os.getenv('AUDIO_TRANSCODE', 'true').lower() == 'true'
+AUDIO_CODEC_PREFERENCE = parse_codecs(os.getenv('AUDIO_CODEC_PREFERENCE', 'opus-ogg,opus-webm,aac,mp3'))
+transcode_stats = {'transcoded': 0, 'variant_hits': 0, 'failed': 0, 'bytes_in': 0, 'bytes_out': 0}
+
 # ====== CoeFontの音声合成クラス ======
-class CoeFontClient:
+class CoeFontClient(TTSEngine):
     """CoeFont音声合成クライアント"""
     
-    def __init__(self, access_key=None, access_secret=None, coefont_id=None):
+    name = 'coe_font'
+    languages = ('ja',)
+    
+    def __init__(self, access_key=None, access_secret=None, coefont_id=None, output_format='wav', http_session=None,
+                 base_url=None):
         self.access_key = access_key
         self.access_secret = access_secret
         self.coefont_id = coefont_id
-        self.base_url = "https://api.coefont.ai/v2"
+        # base_url はローカルの代替サーバーで試験する場合に指定
+        self.base_url = (base_url or "https://api.coefont.ai/v2").rstrip('/')
+        # Keep-Alive接続プール（未指定なら専用に作成）
+        self.http = http_session or PooledHTTPSession()
+        # 出力形式（'wav' または 'mp3'）
+        self.output_format = output_format if output_format in ('wav', 'mp3') else 'wav'
+        self.audio_ext = self.output_format
         
     def test_connection(self):
         """接続テスト"""
@@ -390,11 +620,19 @@ class CoeFontClient:
         }
         
         try:
-            response = requests.get(f"{self.base_url}/voices", headers=headers)
+            response = self.http.get(f"{self.base_url}/voices", headers=headers)
             return response.status_code == 200
         except:
             return False
     
+    def prewarm(self, connections=1):
+        """接続を事前に確立"""
+        headers = {
+            'X-Api-Key': self.access_key,
+            'X-Api-Secret': self.access_secret
+        }
+        return self.http.prewarm(f"{self.base_url}/voices", headers=headers, connections=connections)
+    
     def generate_voice(self, text, emotion='neutral', speed=1.0):
         """音声生成"""
         if not self.access_key or not self.access_secret or not self.coefont_id:
@@ -413,10 +651,11 @@ class CoeFontClient:
             'text': text,
             'voice_id': self.coefont_id,
             'speed': speed,
+            'format': self.output_format,
             **emotion_params
         }
         
-        response = requests.post(
+        response = self.http.post(
             f"{self.base_url}/text-to-speech",
             headers=headers,
             json=data
@@ -425,7 +664,26 @@ class CoeFontClient:
         if response.status_code == 200:
             return response.content
         else:
-            raise Exception(f"CoeFont API Error: {response.status_code} - {response.text}")
+            raise TTSProviderError(
+                f"CoeFont API Error: {response.status_code} - {response.text}",
+                status_code=response.status_code,
+                retry_after=response.headers.get('Retry-After')
+            )
+    
+    def synthesize(self, text, language, emotion='neutral'):
+        """Returns: (audio_content, ext)"""
+        print(f"🎤 CoeFont APIで音声生成中... (感情: {emotion})")
+        audio_content = self.generate_voice(text, emotion=emotion)
+        print(f"✅ CoeFont音声生成成功")
+        return audio_content, self.audio_ext
+    
+    def describe(self):
+        return {
+            'audio_ext': self.audio_ext,
+            'access_key_set': bool(self.access_key),
+            'access_secret_set': bool(self.access_secret),
+            'voice_id_set': bool(self.coefont_id)
+        }
     
     def _get_emotion_params(self, emotion):
         """感情に応じたパラメータを設定"""
@@ -433,19 +691,52 @@ class CoeFontClient:
             'happy': {'pitch': 1.1, 'volume': 1.1},
             'sad': {'pitch': 0.9, 'volume': 0.9},
             'angry': {'pitch': 1.0, 'volume': 1.2},
+            'surprise': {'pitch': 1.2, 'volume': 1.1},
             'surprised': {'pitch': 1.2, 'volume': 1.1},
             'neutral': {'pitch': 1.0, 'volume': 1.0}
         }
         return emotion_map.get(emotion, emotion_map['neutral'])
 
 # ====== Azure Speech Serviceの音声合成クラス ======
-class AzureSpeechClient:
+class AzureSpeechClient(TTSEngine):
     """Azure Speech Service音声合成クライアント"""
     
-    def __init__(self, speech_key=None, speech_region=None, voice_name=None):
+    name = 'azure_speech'
+    languages = ('ja',)
+    
+    DEFAULT_OUTPUT_FORMAT = 'riff-24khz-16bit-mono-pcm'
+    
+    def __init__(self, speech_key=None, speech_region=None, voice_name=None, output_format=None, http_session=None,
+                 endpoint=None):
         self.speech_key = speech_key
         self.speech_region = speech_region
         self.voice_name = voice_name or 'ja-JP-NanamiNeural'
+        # 合成エンドポイント（ローカルの代替サーバーで試験する場合に指定）
+        self.endpoint = endpoint or f"https://{speech_region}.tts.speech.microsoft.com/cognitiveservices/v1"
+        # Keep-Alive接続プール（未指定なら専用に作成）
+        self.http = http_session or PooledHTTPSession()
+        
+        # 出力形式（例: 'audio-24khz-48kbitrate-mono-mp3', 'ogg-24khz-16bit-mono-opus'）
+        self.output_format = output_format or self.DEFAULT_OUTPUT_FORMAT
+        self.audio_ext = self._get_audio_ext(self.output_format)
+        if not self.audio_ext:
+            print(f"⚠️ 未対応のAzure出力形式: {self.output_format} → {self.DEFAULT_OUTPUT_FORMAT}")
+            self.output_format = self.DEFAULT_OUTPUT_FORMAT
+            self.audio_ext = 'wav'
+    
+    @staticmethod
+    def _get_audio_ext(output_format):
+        """X-Microsoft-OutputFormat からブラウザで再生できる拡張子を判定"""
+        if output_format.startswith('riff-'):
+            return 'wav'
+        if output_format.startswith('ogg-'):
+            return 'ogg'
+        if output_format.startswith('webm-'):
+            return 'webm'
+        if output_format.endswith('-mp3'):
+            return 'mp3'
+        # raw-* (ヘッダーなしPCM) などはブラウザで再生できない
+        return None
         
     def test_connection(self):
         """接続テスト"""
@@ -461,6 +752,33 @@ class AzureSpeechClient:
             print(f"Azure Speech接続エラー: {e}")
             return False
     
+    def prewarm(self, connections=1):
+        """合成エンドポイントと同じホストへの接続を事前に確立（音声一覧APIを使用）"""
+        url = self.endpoint.rsplit('/', 1)[0] + '/voices/list'
+        headers = {'Ocp-Apim-Subscription-Key': self.speech_key}
+        return self.http.prewarm(url, headers=headers, connections=connections)
+    
+    def probe(self):
+        """音声一覧APIで死活確認（音声は合成しない）"""
+        url = self.endpoint.rsplit('/', 1)[0] + '/voices/list'
+        response = self.http.get(url, headers={'Ocp-Apim-Subscription-Key': self.speech_key})
+        return response.status_code == 200
+    
+    def synthesize(self, text, language, emotion='neutral'):
+        """Returns: (audio_content, ext)"""
+        print(f"🎤 Azure Speech Serviceで音声生成中... (感情: {emotion})")
+        audio_content = self.generate_voice(text, emotion=emotion, speed=1.0)
+        print(f"✅ Azure音声生成成功: {len(audio_content)} バイト ({self.output_format})")
+        return audio_content, self.audio_ext
+    
+    def describe(self):
+        return {
+            'audio_ext': self.audio_ext,
+            'voice_name': self.voice_name,
+            'output_format': self.output_format,
+            'region': self.speech_region
+        }
+    
     def generate_voice(self, text, voice_name=None, emotion='neutral', speed=1.0):
         """音声生成（REST API使用）
         
@@ -481,6 +799,7 @@ class AzureSpeechClient:
             'happy': 'cheerful',
             'sad': 'sad',
             'angry': 'angry',
+            'surprise': 'excited',
             'surprised': 'excited',
             'neutral': 'general',
             'start': 'cheerful',
@@ -495,7 +814,7 @@ class AzureSpeechClient:
         
         # 抑揚の強さを設定（感情によって変える）
         style_degree = "2"  # 1.0（デフォルト）～ 2.0（最大）、抑揚を強くする
-        if emotion in ['happy', 'surprised', 'start']:
+        if emotion in ['happy', 'surprise', 'surprised', 'start']:
             style_degree = "2"  # 明るい感情は抑揚を最大に
         elif emotion in ['sad', 'angry']:
             style_degree = "1.8"  # 悲しみや怒りも抑揚を強めに
@@ -509,7 +828,7 @@ class AzureSpeechClient:
             <voice name="{voice}">
                 <mstts:express-as style="{style}" styledegree="{style_degree}">
                     <prosody rate="{speech_rate}" pitch="+5%">
-                        {text}
+                        {xml_escape(text.strip())}
                     </prosody>
                 </mstts:express-as>
             </voice>
@@ -519,19 +838,17 @@ class AzureSpeechClient:
         # Azure Speech REST APIを使用（SDKの代わり）
         # ⚠️ SDKはAWS環境で「Error 2176」が発生するため、REST APIを使用
         try:
-            import requests
-            
             # REST API エンドポイント
-            url = f"https://{self.speech_region}.tts.speech.microsoft.com/cognitiveservices/v1"
+            url = self.endpoint
             
             headers = {
                 'Ocp-Apim-Subscription-Key': self.speech_key,
                 'Content-Type': 'application/ssml+xml',
-                'X-Microsoft-OutputFormat': 'riff-24khz-16bit-mono-pcm',  # WAV形式
+                'X-Microsoft-OutputFormat': self.output_format,
                 'User-Agent': 'REI-Avatar-System'
             }
             
-            response = requests.post(url, headers=headers, data=ssml.encode('utf-8'), timeout=30)
+            response = self.http.post(url, headers=headers, data=ssml.encode('utf-8'))
             
             if response.status_code == 200:
                 audio_data = response.content
@@ -540,7 +857,11 @@ class AzureSpeechClient:
             else:
                 error_msg = f"Azure Speech REST API Error: {response.status_code} - {response.text}"
                 print(f"❌ {error_msg}")
-                raise Exception(error_msg)
+                raise TTSProviderError(
+                    error_msg,
+                    status_code=response.status_code,
+                    retry_after=response.headers.get('Retry-After')
+                )
                 
         except Exception as e:
             print(f"❌ Azure音声生成エラー (REST API): {e}")
@@ -562,29 +883,55 @@ def calculate_relationship_level(conversation_count):
     else:
         return {'level': 4, 'style': 'best_friend', 'name': 'MAX'}
 
+# 初回接続時の自己紹介
+INTRO_MESSAGE = "はじめまして！手描き京友禅職人のレイです！私は糸目のりおきという工程を専門にしています。何でも質問してくださいね！"
+
+# 関係性レベル別の挨拶
+RELATIONSHIP_GREETINGS = {
+    'ja': {
+        'formal': "はじめまして！手描き京友禅職人のレイです！私は糸目のり置きという工程を専門にしています。何でも質問してくださいね！",
+        'polite': "こんにちは!また会えて嬉しいです。今日はどんなお話をしましょうか?",
+        'friendly': "やっほー!会いたかったよ〜!今日も楽しくお話しようね!",
+        'casual': "おっす!元気にしてた?なんか面白い話ある?"
+    },
+    'en': {
+        'formal': "Hello! I'm Rei. It's a pleasure to meet you.",
+        'polite': "Hello again! It's nice to see you. What would you like to talk about today?",
+        'friendly': "Hey there! I missed you! Let's have fun chatting today!",
+        'casual': "Yo! How've you been? Got any interesting stories?"
+    }
+}
+
+# 応答生成中の相づち（事前合成の音声パックからのみ再生。音声エンジンは呼ばない）
+# 関係性スタイルは calculate_relationship_level の style
+THINKING_FILLERS = {
+    'ja': {
+        'formal': ["えーっと…", "少々お待ちくださいね。", "そうですね…"],
+        'casual_polite': ["えーっと…", "ちょっと待ってくださいね。", "うーん、そうですね…"],
+        'friendly': ["えーっと…", "ちょっと待ってね。", "うーん…"],
+        'close': ["えーっとね…", "ちょっと待ってね！", "うーん、なんだろ…"],
+        'best_friend': ["えーっとね…", "待って待って！", "うーん、そうだなぁ…"]
+    },
+    'en': {
+        'formal': ["Let me think…", "Just a moment, please.", "Well…"],
+        'casual_polite': ["Let me think…", "Just a moment.", "Hmm, well…"],
+        'friendly': ["Hmm, let me think…", "Give me a sec!", "Ooh, let's see…"],
+        'close': ["Hmm, let me think…", "Give me a sec!", "Ooh, let's see…"],
+        'best_friend': ["Ooh, good one…", "Give me a sec!", "Hmm, let's see…"]
+    }
+}
+# 相づちの間のアバターのモーション（考えている様子）
+THINKING_FILLER_EMOTION = 'responseready'
+
 def get_relationship_adjusted_greeting(language, relationship_style):
     """関係性レベルに応じた挨拶を生成"""
-    greetings = {
-        'ja': {
-            'formal': "はじめまして！手描き京友禅職人のレイです！私は糸目のり置きという工程を専門にしています。何でも質問してくださいね！",
-            'polite': "こんにちは!また会えて嬉しいです。今日はどんなお話をしましょうか?",
-            'friendly': "やっほー!会いたかったよ〜!今日も楽しくお話しようね!",
-            'casual': "おっす!元気にしてた?なんか面白い話ある?"
-        },
-        'en': {
-            'formal': "Hello! I'm Rei. It's a pleasure to meet you.",
-            'polite': "Hello again! It's nice to see you. What would you like to talk about today?",
-            'friendly': "Hey there! I missed you! Let's have fun chatting today!",
-            'casual': "Yo! How've you been? Got any interesting stories?"
-        }
-    }
-    
+    greetings = RELATIONSHIP_GREETINGS
     return greetings.get(language, greetings['ja']).get(relationship_style, greetings[language]['formal'])
 
 # ====== 初期化処理 ======
 def initialize_system():
     """システムの初期化"""
-    global client, chatbot, coe_font_client, use_coe_font, azure_speech_client, use_azure_speech, speech_processor
+    global client, chatbot, coe_font_client, use_coe_font, azure_speech_client, use_azure_speech, speech_processor, audio_store, audio_pack
     
     print("🚀 システム初期化中...")
     
@@ -607,11 +954,17 @@ def initialize_system():
     azure_key = os.getenv('AZURE_SPEECH_KEY')
     azure_region = os.getenv('AZURE_SPEECH_REGION', 'japaneast')
     azure_voice = os.getenv('AZURE_VOICE_NAME', 'ja-JP-NanamiNeural')
+    azure_output_format = os.getenv('AZURE_SPEECH_OUTPUT_FORMAT')
     
     if azure_key and azure_region:
-        azure_speech_client = AzureSpeechClient(azure_key, azure_region, azure_voice)
+        azure_speech_client = AzureSpeechClient(
+            azure_key, azure_region, azure_voice, azure_output_format,
+            http_session=tts_http_session,
+            endpoint=os.getenv('AZURE_TTS_ENDPOINT')
+        )
         if azure_speech_client.test_connection():
             use_azure_speech = True
+            tts_registry.register(azure_speech_client)
             print(f"✅ Azure Speech Service初期化完了 (音声: {azure_voice})")
         else:
             print("⚠️ Azure Speech Service接続テスト失敗")
@@ -624,19 +977,60 @@ def initialize_system():
     coefont_secret = os.getenv('COEFONT_ACCESS_SECRET')
     coefont_id = os.getenv('COEFONT_VOICE_ID')
     
-    # Azureが使えない場合のみCoeFontを初期化
-    if not use_azure_speech and coefont_enabled and coefont_key and coefont_secret and coefont_id:
-        coe_font_client = CoeFontClient(coefont_key, coefont_secret, coefont_id)
+    # 設定されていればCoeFontも初期化（Azure障害時のフェイルオーバー先）
+    if coefont_enabled and coefont_key and coefont_secret and coefont_id:
+        coe_font_client = CoeFontClient(
+            coefont_key, coefont_secret, coefont_id,
+            output_format=os.getenv('COEFONT_OUTPUT_FORMAT', 'wav'),
+            http_session=tts_http_session,
+            base_url=os.getenv('COEFONT_BASE_URL')
+        )
         if coe_font_client.test_connection():
             use_coe_font = True
+            tts_registry.register(coe_font_client)
             print("✅ CoeFont API初期化完了（フォールバック）")
         else:
             print("⚠️ CoeFont API接続テスト失敗")
     else:
-        if use_azure_speech:
-            print("ℹ️ Azure Speech Serviceを使用するため、CoeFontは無効化されています")
-        else:
-            print("ℹ️ CoeFont APIは設定されていません")
+        print("ℹ️ CoeFont APIは設定されていません")
+    
+    # 音声合成APIへの接続を事前に確立（初回合成のTLSハンドシェイクを省く）
+    if os.getenv('TTS_HTTP_PREWARM', 'false').lower() == 'true':
+        prewarm_connections = int(os.getenv('TTS_HTTP_PREWARM_CONNECTIONS', '1'))
+        for name, engine_client, enabled in (('Azure', azure_speech_client, use_azure_speech),
+                                             ('CoeFont', coe_font_client, use_coe_font)):
+            if enabled:
+                warmed = engine_client.prewarm(prewarm_connections)
+                print(f"🔥 {name} 接続プリウォーム: {warmed}/{prewarm_connections}")
+    
+    # OpenAI TTS（全言語のフォールバック）
+    if client:
+        tts_registry.register(OpenAITTSClient(
+            client=client,
+            model=os.getenv('OPENAI_TTS_MODEL', 'tts-1'),
+            voices={'en': 'nova'},
+            default_voice='alloy',
+            response_format=os.getenv('OPENAI_TTS_RESPONSE_FORMAT', 'mp3').lower()
+        ))
+    
+    # 音声エンジンの死活確認（SLOに基づくエンジン選択に使用）
+    tts_registry.start_probe(float(os.getenv('TTS_PROBE_INTERVAL', '60')))
+    
+    # 音声ストア初期化（再起動後も合成済み音声を再利用）
+    try:
+        audio_store_dir = os.getenv('AUDIO_STORE_DIR', os.path.join('data', 'audio_store'))
+        audio_store_max_mb = int(os.getenv('AUDIO_STORE_MAX_MB', '200'))
+        audio_store = AudioStore(audio_store_dir, max_bytes=audio_store_max_mb * 1024 * 1024)
+        print(f"✅ 音声ストア初期化完了 (配信方式: {AUDIO_DELIVERY_MODE})")
+    except Exception as e:
+        print(f"⚠️ 音声ストア初期化失敗: {e}")
+    
+    # 音声パック読み込み（定型セリフは音声エンジンを呼ばずに返す）
+    try:
+        audio_pack = AudioPack(os.getenv('AUDIO_PACK_DIR', os.path.join('data', 'audio_pack')))
+        audio_pack.load()
+    except Exception as e:
+        print(f"⚠️ 音声パック読み込み失敗: {e}")
     
     # RAGChatbot初期化
     try:
@@ -646,7 +1040,7 @@ def initialize_system():
         print(f"❌ RAGChatbot初期化エラー: {e}")
     
     print("🎉 システム初期化完了")
-    print(f"📊 音声エンジン状況: Azure={use_azure_speech}, CoeFont={use_coe_font}, OpenAI TTS=常に利用可能")
+    print(f"📊 音声エンジン状況: {', '.join(tts_registry.names()) or 'なし'}")
 
 # ====== ユーティリティ関数 ======
 def get_session_data(session_id):
@@ -666,7 +1060,10 @@ def get_session_data(session_id):
             },
             'selected_suggestions': [],
             'current_emotion': 'neutral',
-            'relationship_style': 'formal'
+            'relationship_style': 'formal',
+            'audio_transport': None,
+            'response_mode': None,
+            'audio_codecs': []
         }
     return session_data[session_id]
 
@@ -686,97 +1083,684 @@ def get_visitor_data(visitor_id):
     return visitor_data[visitor_id]
 
 # ====== 音声生成関数 ======
-def generate_audio_by_language(text, language='ja', emotion_params='neutral'):
-    """言語に応じた音声生成（Azure優先）"""
-    # 音声キャッシュのチェック
-    cache_key = hashlib.md5(f"{text}_{language}_{emotion_params}".encode()).hexdigest()
-    if cache_key in audio_cache:
+def get_audio_cache_key(text, language, emotion_params, engine=None):
+    """音声キャッシュキー（音声ストアのファイル名にも使用）
+    同じ音声になる入力が同じキーになるよう、正規化してからハッシュする
+    engine: 文単位の断片のように、エンジン（声）を揃える必要がある場合に指定
+    """
+    text, language, emotion_params = canonicalize_tts_request(text, language, emotion_params)
+    if engine:
+        return hashlib.md5(f"{text}_{language}_{emotion_params}_{engine}".encode()).hexdigest()
+    return hashlib.md5(f"{text}_{language}_{emotion_params}".encode()).hexdigest()
+
+def record_audio_lookup(language, source, fragment=False):
+    """エンジンごと（言語の第一候補のエンジン）のキャッシュヒット率を記録
+    source: 'memory' / 'pack' / 'store' / 'emotion_fallback' / 'synthesized' / 'failed'
+    fragment: 文単位の断片の検索（発話単位のヒット率に混ぜず fragment_stats に記録する）
+    """
+    if fragment:
+        with audio_lookup_lock:
+            fragment_stats['fragment_misses' if source in ('synthesized', 'failed') else 'fragment_hits'] += 1
+        return
+    engine = get_primary_engine_name(language) or 'none'
+    with audio_lookup_lock:
+        stats = audio_lookup_stats.setdefault(engine, defaultdict(int))
+        stats[source] += 1
+
+def get_audio_lookup_stats():
+    with audio_lookup_lock:
+        result = {}
+        for engine, stats in audio_lookup_stats.items():
+            hits = sum(stats[source] for source in ('memory', 'pack', 'store', 'emotion_fallback'))
+            total = sum(stats.values())
+            result[engine] = {**stats, 'hit_rate': round(hits / total, 3) if total else 0}
+        return result
+
+def get_tts_engines(language):
+    """言語ごとの音声エンジン（選択順）
+    tts_registry に登録されたエンジンのうち言語に対応するものを、SLOを満たすものから順に返す
+    （日本語の既定の順: Azure → CoeFont → OpenAI TTS / その他の言語: OpenAI TTS）
+    Returns: [(engine_name, synthesize_fn), ...]
+    """
+    return [(engine.name, engine.synthesize) for engine in tts_registry.select(language)]
+
+def get_primary_engine_name(language):
+    """言語の第一候補の音声エンジン名"""
+    engines = tts_registry.select(language)
+    return engines[0].name if engines else None
+
+def get_preferred_engine_name(language):
+    """言語の本来の音声エンジン名（登録順で最初に対応するもの。現在のSLO・障害状況は考慮しない）
+    事前合成・永続化する音声の声を揃えるために使う
+    """
+    for name in tts_registry.names():
+        engine = tts_registry.get(name)
+        if engine and engine.supports(language):
+            return name
+    return None
+
+def synthesize_audio(text, language='ja', emotion_params='neutral', priority='live', engine=None):
+    """音声エンジンで合成（Azure優先、障害時は次のエンジンへフェイルオーバー）
+    priority: tts_scheduler の優先度クラス（'live' / 'greeting' / 'quiz' / 'prefetch'）
+    engine: 指定時はそのエンジンのみで合成（他のエンジンへはフェイルオーバーしない）
+    Returns: (audio_content, ext) or None
+    """
+    return synthesize_audio_with_engine(text, language, emotion_params, priority, engine)[1]
+
+def synthesize_audio_with_engine(text, language='ja', emotion_params='neutral', priority='live', engine=None):
+    """synthesize_audio と同じ。Returns: (使用したエンジン名, (audio_content, ext)) or (None, None)"""
+    # テキストは正規化せずにそのまま合成する（読み・抑揚を変えないため）
+    language, emotion_params = canonicalize_tts_params(language, emotion_params)
+    engines = get_tts_engines(language)
+    if engine:
+        engines = [(name, fn) for name, fn in engines if name == engine]
+    if not engines:
+        print("⚠️ 利用可能な音声エンジンがありません")
+        return None, None
+    
+    @contextmanager
+    def engine_slot(name):
+        # レート制限・優先度に従ってトークンを受け取り、エンジンごとの同時リクエスト数を制限
+        # （待ち時間はブレーカー・SLOのレイテンシに含めない）
+        tts_scheduler.acquire(name, priority)
+        with tts_engine_slots[name]:
+            yield
+    
+    def timed(name, fn):
+        def call():
+            start = time.time()
+            try:
+                result = fn(text, language, emotion_params)
+            except Exception as e:
+                tts_registry.record(name, (time.time() - start) * 1000, ok=False)
+                tts_scheduler.record_error(name, e)
+                raise
+            tts_registry.record(name, (time.time() - start) * 1000, ok=True)
+            return result
+        return call
+    
+    # 再試行は tts_failover が行う（失敗したら次のエンジンへ。最後のエンジンのみ 429/5xx をバックオフして再試行）
+    engine_name, result = tts_failover.call(
+        [(name, timed(name, fn)) for name, fn in engines],
+        acquire=engine_slot,
+        retry_delay=tts_scheduler.retry_delay
+    )
+    print(f"🎵 使用エンジン: {engine_name}")
+    return engine_name, result
+
+def postprocess_synthesized_audio(result):
+    """合成直後の音声の前後の無音を除き、音量を正規化（処理できない形式はそのまま返す）
+    result: (audio_content, ext) → (audio_content, ext)
+    """
+    if not AUDIO_POSTPROCESS or not result:
+        return result
+    try:
+        processed = postprocess_audio(result[0], result[1], reencode=AUDIO_POSTPROCESS_REENCODE,
+                                      **AUDIO_POSTPROCESS_OPTIONS)
+    except Exception as e:
+        print(f"⚠️ 音声後処理エラー: {e}")
+        postprocess_stats['failed'] += 1
+        return result
+    if not processed:
+        postprocess_stats['skipped'] += 1
+        return result
+    audio_content, ext, trimmed_ms = processed
+    postprocess_stats['processed'] += 1
+    postprocess_stats['trimmed_ms'] += trimmed_ms
+    postprocess_stats['bytes_saved'] += len(result[0]) - len(audio_content)
+    return audio_content, ext
+
+def get_postprocess_stats():
+    processed = postprocess_stats['processed']
+    return {
+        'enabled': AUDIO_POSTPROCESS,
+        'reencode': AUDIO_POSTPROCESS_REENCODE,
+        **postprocess_stats,
+        'trimmed_ms': round(postprocess_stats['trimmed_ms']),
+        'avg_trimmed_ms': round(postprocess_stats['trimmed_ms'] / processed, 1) if processed else 0,
+        'avg_bytes_saved': round(postprocess_stats['bytes_saved'] / processed) if processed else 0
+    }
+
+def select_fragment_engine(language):
+    """文単位の断片に使う音声エンジン（1つの発話の中で声が混ざらないよう、発話ごとに1つに決める）
+    選択順の先頭のうち、サーキットブレーカーで遮断されていないもの
+    """
+    for engine in tts_registry.select(language):
+        if tts_failover.breaker(engine.name).state != 'open':
+            return engine
+    return None
+
+def stitch_audio_fragments(text, language='ja', emotion_params='neutral', priority='live'):
+    """文ごとの音声（キャッシュ済みまたは新規合成）を文の間に無音を挟んで連結
+    未合成の文は並行して合成する（エンジンごとの同時実行数は tts_engine_slots で制限）
+    全ての文を同じエンジンで合成し、断片はエンジンごとのキーでキャッシュする
+    Returns: (使用したエンジン名, (audio_content, 'wav')) or None（1文のみ・PCM以外・失敗時）
+    """
+    sentences = split_sentences(text)
+    engine = select_fragment_engine(language) if len(sentences) >= 2 else None
+    if not engine or engine.audio_ext != 'wav':
+        return None
+    
+    def fetch(sentence):
+        # 連結結果は指定の感情のキーで保存するため、感情違いの代替は使わない
+        return get_audio_clip(sentence, language, emotion_params, use_fragments=False, priority=priority,
+                              allow_stale=False, engine=engine.name)
+    
+    clips = list(tts_segment_executor.map(fetch, sentences))
+    # 失敗した文だけ合成し直す（成功した断片はキャッシュ済みのものをそのまま使う）
+    failed = [index for index, clip in enumerate(clips) if not clip]
+    if failed and len(failed) < len(clips):
+        fragment_stats['retried'] += len(failed)
+        print(f"🔁 合成に失敗した文のみ再合成: {len(failed)}/{len(clips)} 文")
+        for index in failed:
+            clips[index] = fetch(sentences[index])
+    
+    fragments = None
+    if all(clip and clip[2] == 'wav' for clip in clips):
+        fragments = [clip[1] for clip in clips]
+    
+    audio_content = stitch_wav(fragments, AUDIO_FRAGMENT_GAP_MS) if fragments else None
+    if not audio_content:
+        fragment_stats['fallbacks'] += 1
+        print("⚠️ 音声断片を連結できないため全文を合成します")
+        return None
+    
+    fragment_stats['stitched'] += 1
+    print(f"🧩 音声断片を連結: {len(sentences)} 文")
+    return engine.name, (audio_content, 'wav')
+
+def has_cached_audio(cache_key):
+    """合成せずに返せる音声があるか（メモリ・音声パック・音声ストア）"""
+    return (
+        cache_key in audio_cache or
+        bool(audio_pack and audio_pack.contains(cache_key)) or
+        bool(audio_store and audio_store.contains(cache_key))
+    )
+
+def find_emotion_variant(text, language, emotion_params):
+    """同じテキストの別の感情の音声のキャッシュキーを探す（neutral系を優先）"""
+    for emotion in dict.fromkeys(['neutral', 'neutraltalking', *VALID_EMOTIONS]):
+        if emotion == emotion_params:
+            continue
+        variant_key = get_audio_cache_key(text, language, emotion)
+        if has_cached_audio(variant_key):
+            return variant_key
+    return None
+
+def _lookup_cached_clip(cache_key):
+    """キャッシュ済みの音声を取得（メモリ → 音声パック → 音声ストア）
+    Returns: (audio_content, ext) or None
+    """
+    cached = audio_cache.get(cache_key)
+    if cached:
+        return cached
+    if audio_pack:
+        packed = audio_pack.get(cache_key)
+        if packed:
+            return packed
+    if audio_store:
+        stored = audio_store.get(cache_key)
+        if stored:
+            audio_cache.put(cache_key, stored[0], stored[1])
+            return stored
+    return None
+
+def revalidate_audio_async(cache_key, text, language, emotion_params):
+    """指定の感情の音声をバックグラウンドで合成（同じキーは1回だけ）"""
+    with revalidating_lock:
+        if cache_key in revalidating_audio_keys:
+            return
+        revalidating_audio_keys.add(cache_key)
+    
+    def revalidate():
+        try:
+            clip = get_audio_clip(text, language, emotion_params, priority='prefetch', allow_stale=False)
+            emotion_fallback_stats['revalidated' if clip else 'revalidate_failed'] += 1
+        finally:
+            with revalidating_lock:
+                revalidating_audio_keys.discard(cache_key)
+    
+    post_response_executor.submit(revalidate)
+
+def get_audio_clip(text, language='ja', emotion_params='neutral', use_fragments=True, priority='live',
+                   allow_stale=True, engine=None):
+    """音声クリップを取得（メモリキャッシュ → 音声パック → 音声ストア → 感情違いの代替 → 音声断片の連結 → 音声エンジンの順）
+    engine: 指定時はそのエンジンのみで合成し、エンジンごとのキーでキャッシュする（文単位の断片用）
+    Returns: (cache_key, audio_content, ext) or None
+    ※ 感情違いで代替した場合、cache_key は代替した音声のキー
+    """
+    # 同じ表現になる感情をまとめてから検索・合成する
+    # テキストの表記揺れはキャッシュキーの中でのみまとめ、合成には元のテキストを使う
+    language, emotion_params = canonicalize_tts_params(language, emotion_params)
+    cache_key = get_audio_cache_key(text, language, emotion_params, engine)
+    # エンジン指定は文単位の断片の検索のみ（ヒット率は発話単位と分けて記録する）
+    fragment = engine is not None
+    
+    # 音声キャッシュのチェック（生バイトで保持）
+    cached = audio_cache.get(cache_key)
+    if cached:
         print(f"🎵 音声キャッシュヒット: {cache_key[:8]}")
-        return audio_cache[cache_key]
+        record_audio_lookup(language, 'memory', fragment)
+        return cache_key, cached[0], cached[1]
+    
+    if audio_pack:
+        packed = audio_pack.get(cache_key)
+        if packed:
+            print(f"📦 音声パックヒット: {cache_key[:8]}")
+            record_audio_lookup(language, 'pack', fragment)
+            return cache_key, packed[0], packed[1]
+    
+    if audio_store:
+        stored = audio_store.get(cache_key)
+        if stored:
+            print(f"💽 音声ストアヒット: {cache_key[:8]}")
+            audio_cache.put(cache_key, stored[0], stored[1])
+            record_audio_lookup(language, 'store', fragment)
+            return cache_key, stored[0], stored[1]
+    
+    if AUDIO_EMOTION_FALLBACK and allow_stale:
+        variant_key = find_emotion_variant(text, language, emotion_params)
+        variant = _lookup_cached_clip(variant_key) if variant_key else None
+        if variant:
+            emotion_fallback_stats['served'] += 1
+            print(f"♻️ 感情違いの音声で代替: {cache_key[:8]} → {variant_key[:8]} (指定の感情はバックグラウンドで合成)")
+            revalidate_audio_async(cache_key, text, language, emotion_params)
+            record_audio_lookup(language, 'emotion_fallback', fragment)
+            return variant_key, variant[0], variant[1]
+    
+    def synthesize_and_store():
+        # 直前に他の呼び出しが合成を終えていればそれを使う
+        cached = audio_cache.peek(cache_key)
+        if cached:
+            return cached
+        
+        result = None
+        engine_used = None
+        segmented = TTS_SEGMENTED_SYNTHESIS and len(text) >= TTS_SEGMENT_MIN_CHARS
+        if use_fragments and (AUDIO_FRAGMENT_CACHE or segmented):
+            stitched = stitch_audio_fragments(text, language, emotion_params, priority)
+            if stitched:
+                engine_used, result = stitched
+        if not result:
+            # 文単位の断片も含め、合成した音声はここで後処理してからキャッシュする
+            engine_used, result = synthesize_audio_with_engine(text, language, emotion_params, priority, engine)
+            result = postprocess_synthesized_audio(result)
+        if not result:
+            return None
+        audio_content, ext = result
+        
+        # フェイルオーバー先のエンジン（別の声）の音声はキャッシュしない
+        # （エンジン指定のキーは声が決まっているため対象外）
+        if not engine and engine_used != get_preferred_engine_name(language):
+            print(f"🔀 代替エンジン {engine_used} の音声のためキャッシュしません: {cache_key[:8]}")
+            return result
+        
+        if audio_store:
+            try:
+                audio_store.put_async(cache_key, audio_content, ext)
+            except Exception as e:
+                print(f"⚠️ 音声ストア保存エラー: {e}")
+        audio_cache.put(cache_key, audio_content, ext)
+        
+        print(f"🎵 音声生成完了: {cache_key[:8]}")
+        return result
     
     try:
-        # 🆕 日本語の場合、Azure Speech Serviceを最優先
-        if language == 'ja' and use_azure_speech:
-            print(f"🎤 Azure Speech Serviceで音声生成中... (感情: {emotion_params})")
-            audio_content = azure_speech_client.generate_voice(
-                text, 
-                emotion=emotion_params,
-                speed=1.0
-            )
-            
-            # WAVファイルとして一時保存
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                tmp_file.write(audio_content)
-                tmp_path = tmp_file.name
-            
-            # Base64エンコード
-            with open(tmp_path, 'rb') as f:
-                audio_base64 = base64.b64encode(f.read()).decode('utf-8')
-            
-            # 一時ファイル削除
-            os.unlink(tmp_path)
-            
-            print(f"✅ Azure音声生成成功: {len(audio_content)} バイト")
-            
-        # フォールバック: 日本語 + CoeFont（Azureが無い場合のみ）
-        elif language == 'ja' and use_coe_font:
-            print(f"🎤 CoeFont APIで音声生成中... (感情: {emotion_params})")
-            audio_content = coe_font_client.generate_voice(text, emotion=emotion_params)
-            
-            # WAVファイルとして保存
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.wav') as tmp_file:
-                tmp_file.write(audio_content)
-                tmp_path = tmp_file.name
-            
-            # Base64エンコード
-            with open(tmp_path, 'rb') as f:
-                audio_base64 = base64.b64encode(f.read()).decode('utf-8')
-            
-            os.unlink(tmp_path)
-            print(f"✅ CoeFont音声生成成功")
-            
-        # その他の言語（英語など） → OpenAI TTS
-        else:
-            print(f"🎤 OpenAI TTSで音声生成中... (言語: {language})")
-            if not client:
-                print("⚠️ OpenAI clientが初期化されていません")
-                return None
-                
-            voice = 'nova' if language == 'en' else 'alloy'
-            
-            speech_response = client.audio.speech.create(
-                model="tts-1",
-                voice=voice,
-                input=text
-            )
-            
-            # MP3をBase64エンコード
-            audio_content = speech_response.content
-            audio_base64 = base64.b64encode(audio_content).decode('utf-8')
-            print(f"✅ OpenAI TTS音声生成成功")
-        
-        # キャッシュに保存(最大100件)
-        if len(audio_cache) >= 100:
-            # 古いエントリを削除
-            oldest_key = next(iter(audio_cache))
-            del audio_cache[oldest_key]
-        
-        audio_cache[cache_key] = audio_base64
-        
-        # 使用した音声エンジンをログ出力
-        engine = 'Azure Speech' if (language == 'ja' and use_azure_speech) else \
-                 'CoeFont' if (language == 'ja' and use_coe_font) else \
-                 'OpenAI TTS'
-        print(f"🎵 音声生成完了: {cache_key[:8]} (エンジン: {engine})")
-        
-        return audio_base64
+        # 同じキーの合成が実行中なら、その結果を待って共有する
+        # 合成はリーダーの優先度でトークンを待つため、同じ優先度の呼び出し同士でのみまとめる
+        # （会話の応答がバックグラウンドの再検証や事前合成の優先度で待たされないように）
+        result, shared = tts_single_flight.do(f"{priority}:{cache_key}", synthesize_and_store)
+        if not result:
+            record_audio_lookup(language, 'failed', fragment)
+            return None
+        if shared:
+            print(f"🤝 同時リクエストの合成結果を共有: {cache_key[:8]}")
+        record_audio_lookup(language, 'synthesized', fragment)
+        return cache_key, result[0], result[1]
         
     except Exception as e:
+        record_audio_lookup(language, 'failed', fragment)
         print(f"❌ 音声生成エラー: {e}")
         import traceback
         traceback.print_exc()
         return None
 
+def generate_audio_by_language(text, language='ja', emotion_params='neutral'):
+    """言語に応じた音声生成（Base64文字列を返す）"""
+    clip = get_audio_clip(text, language, emotion_params)
+    if not clip:
+        return None
+    return audio_cache.get_base64(clip[0]) or base64.b64encode(clip[1]).decode('utf-8')
+
+def _inline_audio_payload(clip):
+    """Base64インラインの音声フィールド"""
+    # メモリキャッシュにある音声はエンコード済みのBase64を再利用
+    encoded = audio_cache.get_base64(clip[0]) or base64.b64encode(clip[1]).decode('utf-8')
+    return {
+        'audio': encoded,
+        'audioMimeType': AUDIO_MIME_TYPES.get(clip[2], 'audio/mpeg')
+    }
+
+def get_audio_transport(session_id):
+    """セッションの音声転送方式（'base64' / 'url' / 'binary'）"""
+    transport = session_data.get(session_id, {}).get('audio_transport')
+    if transport in AUDIO_TRANSPORTS:
+        return transport
+    return AUDIO_DELIVERY_MODE
+
+def get_audio_lipsync(cache_key, clip=None):
+    """リップシンク情報（エンベロープと正確な長さ）を取得
+    音声ごとに1回だけ計算し、キャッシュする（音声パックはマニフェストに保存済み）
+    Returns: {'lipSync': {...}, 'audioDurationMs': int} or {}
+    """
+    if not LIPSYNC_ENVELOPE:
+        return {}
+    
+    envelope = lipsync_cache.get(cache_key)
+    if envelope is None and audio_pack:
+        envelope = audio_pack.manifest.get(cache_key, {}).get('lipsync')
+        if envelope:
+            lipsync_cache.put(cache_key, envelope)
+    
+    if envelope is None:
+        if clip is None:
+            clip = audio_cache.peek(cache_key) or (audio_pack and audio_pack.get(cache_key)) or \
+                   (audio_store and audio_store.get(cache_key))
+        if not clip:
+            return {}
+        try:
+            envelope = build_lipsync(clip[0], clip[1], LIPSYNC_FRAME_MS)
+        except Exception as e:
+            print(f"⚠️ リップシンク計算エラー: {e}")
+            envelope = None
+        if envelope is None:
+            lipsync_cache.count('failed')
+            return {}
+        lipsync_cache.count('computed')
+        lipsync_cache.put(cache_key, envelope)
+    
+    return {
+        'lipSync': {'frameMs': envelope['frameMs'], 'values': envelope['values']},
+        'audioDurationMs': envelope['durationMs']
+    }
+
+def get_audio_duration_ms(cache_key, clip=None):
+    """音声の正確な再生時間（ミリ秒）。ヘッダーから求め、音声と一緒にキャッシュする
+    （音声パックはマニフェストに保存済み）
+    Returns: int or None
+    """
+    duration_ms = audio_cache.get_duration_ms(cache_key)
+    if duration_ms is None and audio_pack:
+        meta = audio_pack.manifest.get(cache_key, {})
+        duration_ms = meta.get('duration_ms') or (meta.get('lipsync') or {}).get('durationMs')
+    if duration_ms is None:
+        if clip is None:
+            clip = (audio_pack and audio_pack.get(cache_key)) or (audio_store and audio_store.get(cache_key))
+        if clip:
+            duration_ms = get_duration_ms(clip[0], clip[1])
+    return duration_ms
+
+def build_audio_payload(text, language='ja', emotion_params='neutral', session_id=None, priority='live'):
+    """イベント送信用の音声フィールドを生成（リップシンク情報・再生時間 audioDurationMs を含む）
+    
+    - 'binary': 生バイトをSocket.IOのバイナリ添付として送る
+    - 'url':    音声ストアに保存し、ブラウザがキャッシュできる短いURLだけを返す
+    - 'base64': Base64をインラインで返す（旧クライアント向け）
+    """
+    payload, cache_key, clip = _build_audio_transport_payload(text, language, emotion_params, session_id, priority)
+    if cache_key:
+        payload.update(get_audio_lipsync(cache_key, clip))
+        duration_ms = get_audio_duration_ms(cache_key, clip)
+        if duration_ms:
+            payload['audioDurationMs'] = duration_ms
+    return payload
+
+def get_session_codecs(session_id):
+    """クライアントが再生できるコーデック（変換が無効・未通知の場合は空）"""
+    if not AUDIO_TRANSCODE or not FFMPEG_PATH:
+        return []
+    return session_data.get(session_id, {}).get('audio_codecs') or []
+
+def get_audio_variant(clip, codec):
+    """音声を指定形式に変換（形式ごとに1回だけ変換し、派生キーでキャッシュ）
+    Returns: (variant_key, audio_content, ext) or None
+    """
+    variant_key = hashlib.md5(f"{clip[0]}_{codec}".encode()).hexdigest()
+    
+    cached = audio_cache.get(variant_key) or (audio_store and audio_store.get(variant_key))
+    if cached:
+        transcode_stats['variant_hits'] += 1
+        return variant_key, cached[0], cached[1]
+    
+    def transcode_and_store():
+        converted = transcode(clip[1], codec)
+        if not converted:
+            transcode_stats['failed'] += 1
+            return None
+        transcode_stats['transcoded'] += 1
+        transcode_stats['bytes_in'] += len(clip[1])
+        transcode_stats['bytes_out'] += len(converted[0])
+        print(f"🔄 音声変換: {clip[0][:8]} {clip[2]} → {codec} ({len(clip[1])} → {len(converted[0])} バイト)")
+        if audio_store:
+            audio_store.put_async(variant_key, converted[0], converted[1])
+        audio_cache.put(variant_key, converted[0], converted[1])
+        return converted
+    
+    converted, _ = tts_single_flight.do(variant_key, transcode_and_store)
+    if not converted:
+        return None
+    return variant_key, converted[0], converted[1]
+
+def select_audio_variant(clip, session_id):
+    """クライアントに最適な形式の音声を選ぶ（変換できない場合は元の音声）
+    Returns: (key, audio_content, ext)
+    """
+    client_codecs = get_session_codecs(session_id)
+    if not client_codecs:
+        return clip
+    codec = negotiate_codec(client_codecs, clip[2], AUDIO_CODEC_PREFERENCE)
+    if not codec:
+        return clip
+    return get_audio_variant(clip, codec) or clip
+
+def _build_audio_transport_payload(text, language, emotion_params, session_id, priority='live'):
+    """Returns: (payload, cache_key or None, (audio_content, ext) or None)
+    リップシンク情報は元の音声から計算するため、cache_key と clip は変換前のものを返す
+    """
+    transport = get_audio_transport(session_id)
+    
+    if transport == 'binary':
+        clip = get_audio_clip(text, language, emotion_params, priority=priority)
+        if not clip:
+            return {'audio': None}, None, None
+        variant = select_audio_variant(clip, session_id)
+        return {
+            'audio': None,
+            'audioBinary': variant[1],
+            'audioMimeType': AUDIO_MIME_TYPES.get(variant[2], 'application/octet-stream')
+        }, clip[0], clip[1:]
+    
+    if transport == 'url' and audio_store and get_session_codecs(session_id):
+        clip = get_audio_clip(text, language, emotion_params, priority=priority)
+        if not clip:
+            return {'audio': None}, None, None
+        variant = select_audio_variant(clip, session_id)
+        servable = (audio_pack and audio_pack.contains(variant[0])) or audio_store.contains(variant[0])
+        if not servable:
+            return _inline_audio_payload(variant), clip[0], clip[1:]
+        return {'audio': None, 'audioUrl': f"/audio/{variant[0]}"}, clip[0], clip[1:]
+    
+    if transport == 'url' and audio_store:
+        cache_key = get_audio_cache_key(text, language, emotion_params)
+        if audio_pack and audio_pack.contains(cache_key):
+            return {'audio': None, 'audioUrl': f"/audio/{cache_key}"}, cache_key, None
+        clip = None
+        if not audio_store.contains(cache_key):
+            clip = get_audio_clip(text, language, emotion_params, priority=priority)
+            if not clip:
+                return {'audio': None}, None, None
+            # 感情違いで代替した場合は代替した音声のキーで配信する
+            cache_key = clip[0]
+            servable = (audio_pack and audio_pack.contains(cache_key)) or audio_store.contains(cache_key)
+            if not servable:
+                # ストアに保存できなかった場合はインラインで返す
+                return _inline_audio_payload(clip), cache_key, clip[1:]
+        return {'audio': None, 'audioUrl': f"/audio/{cache_key}"}, cache_key, clip[1:] if clip else None
+    
+    clip = get_audio_clip(text, language, emotion_params, priority=priority)
+    if not clip:
+        return {'audio': None}, None, None
+    return _inline_audio_payload(select_audio_variant(clip, session_id)), clip[0], clip[1:]
+
+def get_response_mode(session_id):
+    """セッションの応答モード（'sync' / 'text_first'）"""
+    mode = session_data.get(session_id, {}).get('response_mode')
+    if mode in RESPONSE_MODES:
+        return mode
+    return RESPONSE_MODE
+
+def is_audio_ready(text, language='ja', emotion_params='neutral'):
+    """合成せずに返せる音声があるか（感情違いの代替が有効ならそれも含む）"""
+    if has_cached_audio(get_audio_cache_key(text, language, emotion_params)):
+        return True
+    return AUDIO_EMOTION_FALLBACK and find_emotion_variant(text, language, emotion_params) is not None
+
+def build_pack_audio_payload(cache_key, session_id=None):
+    """音声パックの音声だけで音声フィールドを生成（合成・形式変換はしない）
+    Returns: payload or None（音声パックに無い場合）
+    """
+    packed = audio_pack and audio_pack.get(cache_key)
+    if not packed:
+        return None
+    transport = get_audio_transport(session_id)
+    if transport == 'url':
+        payload = {'audio': None, 'audioUrl': f"/audio/{cache_key}"}
+    elif transport == 'binary':
+        payload = {
+            'audio': None,
+            'audioBinary': packed[0],
+            'audioMimeType': AUDIO_MIME_TYPES.get(packed[1], 'application/octet-stream')
+        }
+    else:
+        payload = _inline_audio_payload((cache_key, packed[0], packed[1]))
+    payload.update(get_audio_lipsync(cache_key, packed))
+    duration_ms = get_audio_duration_ms(cache_key, packed)
+    if duration_ms:
+        payload['audioDurationMs'] = duration_ms
+    return payload
+
+def emit_thinking_filler(session_id, language, relationship_style):
+    """応答生成中の相づちを送信（音声パックにあるものからランダムに選ぶ。同じセッションで直前と同じものは避ける）"""
+    if not THINKING_FILLER_ENABLED:
+        return False
+    session_info = get_session_data(session_id)
+    pool = THINKING_FILLERS.get(language, THINKING_FILLERS['en'])
+    phrases = pool.get(relationship_style, pool['formal'])
+    candidates = [
+        (phrase, get_audio_cache_key(phrase, language, THINKING_FILLER_EMOTION))
+        for phrase in phrases
+        if phrase != session_info.get('last_filler')
+    ]
+    candidates = [(phrase, key) for phrase, key in candidates if audio_pack and audio_pack.contains(key)]
+    if not candidates:
+        filler_stats['unavailable'] += 1
+        return False
+    
+    phrase, cache_key = random.choice(candidates)
+    payload = build_pack_audio_payload(cache_key, session_id)
+    if not payload:
+        filler_stats['unavailable'] += 1
+        return False
+    session_info['last_filler'] = phrase
+    filler_stats['emitted'] += 1
+    socketio.emit('thinking', {
+        **payload,
+        'text': phrase,
+        'emotion': THINKING_FILLER_EMOTION,
+        'language': language
+    }, to=session_id)
+    return True
+
+def prepare_audio_payload(text, language='ja', emotion_params='neutral', session_id=None, priority='live'):
+    """イベント送信用の音声フィールド（text_firstモード対応）
+    
+    text_firstモードで音声が未合成の場合は合成を待たずに
+    {'audio': None, 'audioPending': True, 'messageId': ...} を返し、
+    合成完了後に同じ messageId で 'response_audio' イベントを送る。
+    """
+    if get_response_mode(session_id) != 'text_first' or is_audio_ready(text, language, emotion_params):
+        return build_audio_payload(text, language, emotion_params=emotion_params, session_id=session_id,
+                                   priority=priority)
+    
+    message_id = uuid.uuid4().hex
+    post_response_executor.submit(
+        _emit_deferred_audio, message_id, text, language, emotion_params, session_id, priority
+    )
+    return {'audio': None, 'audioPending': True, 'messageId': message_id}
+
+def _emit_deferred_audio(message_id, text, language, emotion_params, session_id, priority='live'):
+    """バックグラウンドで音声を合成し 'response_audio' を送信（失敗時も audio=None で送る）"""
+    try:
+        audio_payload = build_audio_payload(text, language, emotion_params=emotion_params, session_id=session_id,
+                                            priority=priority)
+    except Exception as e:
+        print(f"❌ 後送音声生成エラー: {e}")
+        audio_payload = {'audio': None}
+    
+    socketio.emit('response_audio', {'messageId': message_id, **audio_payload}, to=session_id)
+    print(f"🔊 後送音声送信: {message_id[:8]}")
+
+def run_parallel_steps(steps):
+    """互いに依存しない処理を並行実行し、ステップごとのタイムアウトで待ち合わせる
+    
+    期限はステップがワーカーで実行され始めた時点から数える（post_response_executor は全接続で共有のため、
+    混雑時の待ち行列の時間で実行前にタイムアウトしないようにする）。
+    待ち行列で同じ時間（timeout）待っても始まらないステップは取り消して default を返す。
+    
+    Args:
+        steps: {name: (fn, timeout_seconds, default)}
+    Returns:
+        (results, timings): タイムアウト・例外時は default を返す。timings はミリ秒
+    """
+    futures = {}
+    started = {}
+    step_starts = {}
+    for name, (fn, timeout, default) in steps.items():
+        started[name] = threading.Event()
+        def timed(fn=fn, name=name):
+            step_start = time.time()
+            step_starts[name] = step_start
+            started[name].set()
+            result = fn()
+            return result, (time.time() - step_start) * 1000
+        futures[name] = post_response_executor.submit(timed)
+    
+    queued_at = time.time()
+    results = {}
+    timings = {}
+    for name, future in futures.items():
+        _, timeout, default = steps[name]
+        event = started[name]
+        # 実行開始を待つ（待ち行列の時間はステップの期限に含めない）
+        if not event.wait(max(0, timeout - (time.time() - queued_at))) and future.cancel():
+            print(f"⏰ {name} が実行待ちのままタイムアウトしました ({timeout}秒)")
+            results[name] = default
+            timings[name] = None
+            continue
+        event.wait()
+        remaining = max(0, timeout - (time.time() - step_starts[name]))
+        try:
+            results[name], timings[name] = future.result(timeout=remaining)
+        except FutureTimeoutError:
+            print(f"⏰ {name} がタイムアウトしました ({timeout}秒)")
+            results[name] = default
+            timings[name] = None
+        except Exception as e:
+            print(f"❌ {name} の処理エラー: {e}")
+            results[name] = default
+            timings[name] = None
+    return results, timings
+
 # ====== カスタム応答調整 ======
 def adjust_response_style(response, language='ja', relationship_style='formal'):
     """関係性レベルに応じて応答スタイルを調整（正規表現対応版）"""
@@ -1084,7 +2068,18 @@ def print_cache_stats():
     """キャッシュ統計を表示"""
     print(f"📊 キャッシュ統計:")
     print(f"  - 会話キャッシュ: {len(conversation_cache)} エントリ")
-    print(f"  - 音声キャッシュ: {len(audio_cache)} エントリ")
+    cache_stats = audio_cache.get_stats()
+    print(f"  - 音声キャッシュ: {cache_stats['entries']} エントリ, {cache_stats['bytes']} バイト (ヒット率 {cache_stats['hit_rate']:.0%})")
+    if audio_store:
+        store_stats = audio_store.get_stats()
+        print(f"  - 音声ストア: {store_stats['entries']} エントリ, {store_stats['bytes']} バイト")
+    flight_stats = tts_single_flight.get_stats()
+    print(f"  - 音声合成の同時リクエスト統合: {flight_stats['coalesced']} / {flight_stats['calls']} 件")
+    if postprocess_stats['processed']:
+        stats = get_postprocess_stats()
+        print(f"  - 音声後処理: {stats['processed']} 件, 平均 {stats['avg_trimmed_ms']}ms / {stats['avg_bytes_saved']} バイト削減")
+    for engine, lookup_stats in get_audio_lookup_stats().items():
+        print(f"  - 音声ヒット率 ({engine}): {lookup_stats['hit_rate']:.0%}")
     print(f"  - アクティブセッション: {len(session_data)}")
     print(f"  - 登録訪問者: {len(visitor_data)}")
 
@@ -1105,25 +2100,98 @@ def health_check():
             'conversation': len(conversation_cache),
             'audio': len(audio_cache)
         },
+        'audio_cache': audio_cache.get_stats(),
+        'audio_store': audio_store.get_stats() if audio_store else None,
+        'audio_pack': audio_pack.get_stats() if audio_pack else None,
+        'tts_http_pool': tts_http_session.get_stats(),
+        'tts_engines': tts_registry.get_status(),
+        'tts_failover': tts_failover.get_stats(),
+        'tts_single_flight': tts_single_flight.get_stats(),
+        'audio_lookups': get_audio_lookup_stats(),
+        'audio_emotion_fallback': {'enabled': AUDIO_EMOTION_FALLBACK, **emotion_fallback_stats},
+        'thinking_filler': {'enabled': THINKING_FILLER_ENABLED, **filler_stats},
+        'speech_recognition': speech_processor.get_stats() if speech_processor else None,
+        'tts_scheduler': tts_scheduler.get_stats(),
+        'lipsync': {'enabled': LIPSYNC_ENVELOPE, **lipsync_cache.get_stats()},
+        'transcode': {
+            'enabled': AUDIO_TRANSCODE and bool(FFMPEG_PATH),
+            'preference': AUDIO_CODEC_PREFERENCE,
+            **transcode_stats
+        },
+        'audio_postprocess': get_postprocess_stats(),
+        'audio_fragments': {
+            'enabled': AUDIO_FRAGMENT_CACHE,
+            'segmented_synthesis': TTS_SEGMENTED_SYNTHESIS,
+            **fragment_stats
+        },
         'services': {
             'openai': client is not None,
             'rag': chatbot is not None,
-            'coefont': use_coe_font
+            'coefont': use_coe_font,
+            'tts_engines': tts_registry.names()
         }
     })
 
+@app.route('/audio/<audio_key>')
+def serve_audio(audio_key):
+    """音声ストアの音声を配信（ETag・Range対応）"""
+    if not AUDIO_KEY_PATTERN.match(audio_key):
+        return jsonify({'error': 'Audio not found'}), 404
+    
+    stored = audio_pack.get_path(audio_key) if audio_pack else None
+    if not stored and audio_store:
+        stored = audio_store.get_path(audio_key)
+        if not stored:
+            # ディスク書き込み待ちの音声はメモリから返す
+            pending = audio_store.get(audio_key)
+            if pending:
+                stored = (io.BytesIO(pending[0]), pending[1])
+    if not stored:
+        return jsonify({'error': 'Audio not found'}), 404
+    
+    path_or_file, ext = stored
+    # コンテンツアドレス型なので内容は不変 → キーをそのままETagにする
+    response = send_file(
+        path_or_file,
+        mimetype=AUDIO_MIME_TYPES[ext],
+        conditional=True,
+        etag=audio_key,
+        max_age=31536000
+    )
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.route('/api/tts/status')
+def tts_status():
+    """音声エンジンごとの状態（レイテンシ・エラー率・死活確認・言語ごとの選択順）
+    ?test=1 で全エンジンの死活確認をその場で実行
+    """
+    if request.args.get('test') == '1':
+        tts_registry.probe_all()
+    status = tts_registry.get_status()
+    status['selection'] = {
+        language: [engine.name for engine in tts_registry.select(language)]
+        for language in ('ja', 'en')
+    }
+    return jsonify(status)
+
 @app.route('/api/coefont/status')
 def coefont_status():
-    """CoeFont APIの状態を確認"""
+    """CoeFont APIの状態を確認（互換用。全エンジンの状態は /api/tts/status）"""
     status = {
         'enabled': use_coe_font,
         'configured': coe_font_client is not None,
-        'access_key_set': bool(coe_font_client.access_key),
-        'access_secret_set': bool(coe_font_client.access_secret),
-        'voice_id_set': bool(coe_font_client.coefont_id),
+        'access_key_set': False,
+        'access_secret_set': False,
+        'voice_id_set': False,
         'test_connection': False,
         'error_message': None
     }
+    if coe_font_client:
+        status.update({
+            key: value for key, value in coe_font_client.describe().items()
+            if key in ('access_key_set', 'access_secret_set', 'voice_id_set')
+        })
     
     # 接続テストを実行
     if use_coe_font:
@@ -1281,8 +2349,12 @@ def handle_connect():
     """WebSocket接続時の処理"""
     session_id = request.sid
     visitor_id = request.args.get('visitor_id', str(uuid.uuid4()))
+    # クライアントが対応している音声転送方式（未指定なら従来のBase64）
+    audio_transport = request.args.get('audio_transport')
+    response_mode = request.args.get('response_mode')
+    audio_codecs = parse_codecs(request.args.get('audio_codecs'))
     
-    print(f"🔗 新規接続: Session={session_id}, Visitor={visitor_id}")
+    print(f"🔗 新規接続: Session={session_id}, Visitor={visitor_id}, 音声転送={audio_transport or AUDIO_DELIVERY_MODE}")
     
     # セッションデータ初期化
     if session_id not in session_data:
@@ -1303,14 +2375,17 @@ def handle_connect():
             },
             'selected_suggestions': [],
             'current_emotion': 'neutral',
-            'relationship_style': 'formal'
+            'relationship_style': 'formal',
+            'audio_transport': audio_transport,
+            'response_mode': response_mode,
+            'audio_codecs': audio_codecs
         }
         
         # 初回接続の場合
         if session_data[session_id]['first_interaction']:
             try:
                 # 自己紹介メッセージ
-                intro_message = "はじめまして！手描き京友禅職人のレイです！私は糸目のりおきという工程を専門にしています。何でも質問してくださいね！"
+                intro_message = INTRO_MESSAGE
                 intro_emotion = 'start'  # Startモーション使用
                 
                 # 感情を検証
@@ -1318,23 +2393,25 @@ def handle_connect():
                 
                 # 音声生成
                 try:
-                    audio_data = generate_audio_by_language(
+                    audio_payload = prepare_audio_payload(
                         intro_message, 
                         'ja', 
-                        emotion_params=intro_emotion
+                        emotion_params=intro_emotion,
+                        session_id=session_id,
+                        priority='greeting'
                     )
                 except Exception as e:
                     print(f"❌ 挨拶音声生成エラー: {e}")
-                    audio_data = None
+                    audio_payload = {'audio': None}
                 
                 # 初回挨拶データ
                 greeting_data = {
                     'message': intro_message,
                     'emotion': intro_emotion,
-                    'audio': audio_data,
+                    **audio_payload,
                     'isGreeting': True,
                     'language': 'ja',
-                    'voice_engine': 'azure_speech' if use_azure_speech else ('coe_font' if use_coe_font else 'openai_tts'),
+                    'voice_engine': get_primary_engine_name('ja'),
                     'relationshipLevel': 'formal',
                     'mentalState': session_data[session_id]['mental_state']
                 }
@@ -1363,6 +2440,12 @@ def handle_connect():
         # 既存セッションの場合
         data = get_session_data(session_id)
         language = data["language"]
+        if audio_transport:
+            data['audio_transport'] = audio_transport
+        if response_mode:
+            data['response_mode'] = response_mode
+        if audio_codecs:
+            data['audio_codecs'] = audio_codecs
         
         # 訪問者の関係性レベルを確認
         visitor_info = None
@@ -1387,22 +2470,24 @@ def handle_connect():
         update_emotion_history(session_id, greeting_emotion)
         
         try:
-            audio_data = generate_audio_by_language(
+            audio_payload = prepare_audio_payload(
                 greeting_message, 
                 language, 
-                emotion_params=greeting_emotion
+                emotion_params=greeting_emotion,
+                session_id=session_id,
+                priority='greeting'
             )
         except Exception as e:
             print(f"❌ 挨拶音声生成エラー: {e}")
-            audio_data = None
+            audio_payload = {'audio': None}
         
         greeting_data = {
             'message': greeting_message,
             'emotion': greeting_emotion,
-            'audio': audio_data,
+            **audio_payload,
             'isGreeting': True,
             'language': language,
-            'voice_engine': 'azure_speech' if (use_azure_speech and language == 'ja') else ('coe_font' if (use_coe_font and language == 'ja') else 'openai_tts'),
+            'voice_engine': get_primary_engine_name(language),
             'relationshipLevel': relationship_style,
             'mentalState': data['mental_state']
         }
@@ -1424,6 +2509,9 @@ def handle_set_language(data):
     
     session_info = get_session_data(session_id)
     session_info['language'] = language
+    audio_codecs = parse_codecs(data.get('audioCodecs'))
+    if audio_codecs:
+        session_info['audio_codecs'] = audio_codecs
     
     # 関係性レベルを確認
     visitor_id = session_info.get('visitor_id')
@@ -1444,22 +2532,24 @@ def handle_set_language(data):
     greeting_emotion = "happy"
     
     try:
-        audio_data = generate_audio_by_language(
+        audio_payload = prepare_audio_payload(
             greeting_message, 
             language, 
-            emotion_params=greeting_emotion
+            emotion_params=greeting_emotion,
+            session_id=session_id,
+            priority='greeting'
         )
     except Exception as e:
         print(f"❌ 挨拶音声生成エラー: {e}")
-        audio_data = None
+        audio_payload = {'audio': None}
     
     greeting_data = {
         'message': greeting_message,
         'emotion': greeting_emotion,
-        'audio': audio_data,
+        **audio_payload,
         'isGreeting': True,
         'language': language,
-        'voice_engine': 'azure_speech' if (use_azure_speech and language == 'ja') else ('coe_font' if (use_coe_font and language == 'ja') else 'openai_tts'),
+        'voice_engine': get_primary_engine_name(language),
         'relationshipLevel': relationship_style,
         'mentalState': session_info['mental_state']
     }
@@ -1485,10 +2575,149 @@ def handle_disconnect():
         
         del session_data[session_id]
     
+    # 送信途中の音声ストリームを破棄（逐次変換中のFFmpegプロセスも終了させる）
+    with audio_streams_lock:
+        streams = audio_streams.pop(session_id, {})
+        finished_audio_streams.pop(session_id, None)
+    for stream in streams.values():
+        stream.abort()
+    
     print(f'🔌 クライアント切断: {session_id}')
     print_cache_stats()
 
 # ====== 音声メッセージハンドラー ======
+def handle_transcribed_audio(text, data, language):
+    """音声認識の結果をクライアントに返し、テキストメッセージとして処理する"""
+    if not text or text.strip() == "":
+        print("⚠️ 音声認識結果が空です")
+        emit('error', {
+            'message': '音声が認識できませんでした。もう一度お試しください。' if language == 'ja' else 'Could not recognize speech. Please try again.'
+        })
+        return
+    
+    print(f"✅ 音声認識成功: '{text}'")
+    
+    # 認識されたテキストをクライアントに送信（確認用）
+    emit('transcription', {
+        'text': text,
+        'language': language
+    })
+    
+    # テキストメッセージとして処理（既存のhandle_message()を再利用）
+    message_data = {
+        'message': text,
+        'language': language,
+        'visitorId': data.get('visitorId'),
+        'conversationHistory': data.get('conversationHistory', []),
+        'visitData': data.get('visitData', {}),
+        'interactionCount': data.get('interactionCount', 0),
+        'relationshipLevel': data.get('relationshipLevel', 'formal'),
+        'selectedSuggestions': data.get('selectedSuggestions', []),
+        'fromAudio': True  # 音声入力であることを示すフラグ
+    }
+    
+    # 既存のメッセージハンドラーを呼び出し
+    handle_message(message_data)
+
+def get_or_open_audio_stream(session_id, stream_id, mime_type=None):
+    """ストリームIDの音声ストリームを取得（未知のIDなら開始する）
+    音声認識まで終わったストリームID・切断済みのセッションは None
+    """
+    abandoned = []
+    with audio_streams_lock:
+        if session_id not in session_data or stream_id in finished_audio_streams[session_id]:
+            return None
+        streams = audio_streams[session_id]
+        stream = streams.get(stream_id)
+        if stream is None:
+            # 録音は1セッションにつき1つずつのため、audio_end が届かなかった以前のストリームは破棄する
+            # （audio_end 後に音声認識中のストリームは残す）
+            abandoned = [old for old in streams.values() if not old.closing]
+            for old in abandoned:
+                del streams[old.stream_id]
+            stream = speech_processor.open_stream(stream_id, mime_type)
+            streams[stream_id] = stream
+            print(f"🎙️ 音声ストリーム開始: {stream_id} ({mime_type or '形式不明'}, 逐次変換: {'あり' if stream.decoder else 'なし'})")
+    for old_stream in abandoned:
+        print(f"🗑️ 終了しなかった音声ストリームを破棄: {old_stream.stream_id}")
+        old_stream.abort()
+    return stream
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(data):
+    """録音中の音声の断片を受信（MediaRecorderのtimeslice単位）
+    data: {streamId, seq, chunk(バイナリ), mimeType}
+    """
+    stream_id = data.get('streamId')
+    chunk = data.get('chunk')
+    if not stream_id or chunk is None or speech_processor is None:
+        # 音声認識が使えない場合は audio_end でまとめて通知する
+        return
+    
+    stream = get_or_open_audio_stream(request.sid, stream_id, data.get('mimeType'))
+    if stream is None:
+        print(f"⚠️ 終了済みの音声ストリームへの断片を破棄: {stream_id}")
+        return
+    
+    try:
+        stream.append(int(data.get('seq', 0)), chunk)
+    except AudioTooLargeError as e:
+        print(f"❌ {e}")
+        emit('error', {
+            'message': '録音が長すぎます。短く区切ってお話しください。' if data.get('language', 'ja') == 'ja' else 'The recording is too long. Please speak in shorter segments.'
+        })
+
+@socketio.on('audio_end')
+def handle_audio_end(data):
+    """録音終了。受信済みの断片（デコード済みのWAV）で音声認識してメッセージ処理
+    data: {streamId, chunks(断片の総数), language, visitorId, conversationHistory, ...}
+    """
+    session_id = request.sid
+    stream_id = data.get('streamId')
+    language = data.get('language', 'ja')
+    
+    if speech_processor is None:
+        print("❌ 音声認識が初期化されていません")
+        emit('error', {
+            'message': '音声認識機能は現在利用できません。テキストで入力してください。' if language == 'ja' else 'Speech recognition is currently unavailable. Please type your message.'
+        })
+        return
+    
+    # 断片より先に audio_end が届いた場合もここでストリームを開始し、断片の到着を待つ
+    stream = get_or_open_audio_stream(session_id, stream_id, data.get('mimeType')) if stream_id else None
+    if stream is None:
+        print(f"❌ 音声ストリームが見つかりません: {stream_id}")
+        emit('error', {
+            'message': '音声データを受信できませんでした。' if language == 'ja' else 'Failed to receive audio data.'
+        })
+        return
+    stream.closing = True
+    
+    try:
+        if stream.rejected:
+            # 上限超過は audio_chunk の時点で通知済み
+            return
+        print(f"🎤 音声ストリーム終了: Session={session_id}, 断片={data.get('chunks', 0)}")
+        text = speech_processor.transcribe_stream(stream, int(data.get('chunks', 0)), language)
+        handle_transcribed_audio(text, data, language)
+    except Exception as e:
+        print(f"❌ 音声認識エラー: {e}")
+        import traceback
+        traceback.print_exc()
+        stream.abort()
+        
+        emit('error', {
+            'message': '音声認識に失敗しました。もう一度お試しください。' if language == 'ja' else 'Speech recognition failed. Please try again.'
+        })
+    finally:
+        # 音声認識が終わってから登録を外す（それまでに届いた断片はこのストリームに入る）
+        with audio_streams_lock:
+            streams = audio_streams.get(session_id)
+            if streams and streams.get(stream_id) is stream:
+                del streams[stream_id]
+            if session_id in session_data:
+                finished_audio_streams[session_id].append(stream_id)
+
 @socketio.on('audio_message')
 def handle_audio_message(data):
     """音声入力からテキストへ変換してメッセージ処理"""
@@ -1512,37 +2741,7 @@ def handle_audio_message(data):
         try:
             print("🔄 音声認識開始...")
             text = speech_processor.transcribe_audio(audio_base64, language)
-            
-            if not text or text.strip() == "":
-                print("⚠️ 音声認識結果が空です")
-                emit('error', {
-                    'message': '音声が認識できませんでした。もう一度お試しください。' if language == 'ja' else 'Could not recognize speech. Please try again.'
-                })
-                return
-            
-            print(f"✅ 音声認識成功: '{text}'")
-            
-            # 認識されたテキストをクライアントに送信（確認用）
-            emit('transcription', {
-                'text': text,
-                'language': language
-            })
-            
-            # テキストメッセージとして処理（既存のhandle_message()を再利用）
-            message_data = {
-                'message': text,
-                'language': language,
-                'visitorId': data.get('visitorId'),
-                'conversationHistory': data.get('conversationHistory', []),
-                'visitData': data.get('visitData', {}),
-                'interactionCount': data.get('interactionCount', 0),
-                'relationshipLevel': data.get('relationshipLevel', 'formal'),
-                'selectedSuggestions': data.get('selectedSuggestions', []),
-                'fromAudio': True  # 音声入力であることを示すフラグ
-            }
-            
-            # 既存のメッセージハンドラーを呼び出し
-            handle_message(message_data)
+            handle_transcribed_audio(text, data, language)
             
         except Exception as transcription_error:
             print(f"❌ 音声認識エラー: {transcription_error}")
@@ -1629,6 +2828,9 @@ def handle_message(data):
         else:
             print(f"🤖 新規応答生成: {message[:50]}...")
             
+            # 応答を待つ間の無音を埋める相づち（音声パックのみ・即時）
+            emit_thinking_filler(session_id, language, relationship_style)
+            
             # RAG応答生成
             if chatbot:
                 # 感情分析(ユーザーメッセージから)
@@ -1694,44 +2896,49 @@ def handle_message(data):
         # 感情履歴を更新(🎯 重要)
         update_emotion_history(session_id, emotion, mental_state)
         
-        # 音声生成
-        try:
-            audio_data = generate_audio_by_language(response, language, emotion_params=emotion)
-            if audio_data:
-                print(f"🔊 音声データ準備完了: {len(audio_data)} バイト")
-            else:
-                print("⚠️ 音声データが生成されませんでした")
-        except Exception as e:
-            print(f"❌ 音声生成エラー: {e}")
-            audio_data = None
-        
-        # サジェスチョン生成
-        suggestions = generate_prioritized_suggestions(
-            session_info, visitor_info, relationship_style, language
-        )
+        # 音声生成・サジェスチョン生成・メディア取得は互いに独立しているので並行実行
+        def load_media():
+            from modules.static_qa_data import get_qa_media
+            return get_qa_media(message)  # 元の質問を使用
+        
+        results, step_timings = run_parallel_steps({
+            'audio': (
+                lambda: prepare_audio_payload(response, language, emotion_params=emotion, session_id=session_id),
+                POST_RESPONSE_TIMEOUTS['audio'], {'audio': None}
+            ),
+            'suggestions': (
+                lambda: generate_prioritized_suggestions(session_info, visitor_info, relationship_style, language),
+                POST_RESPONSE_TIMEOUTS['suggestions'], []
+            ),
+            'media': (load_media, POST_RESPONSE_TIMEOUTS['media'], None)
+        })
+        audio_payload = results['audio']
+        suggestions = results['suggestions']
+        media_data = results['media']
+        
+        if audio_payload.get('audioUrl'):
+            print(f"🔊 音声データ準備完了: {audio_payload['audioUrl']}")
+        elif audio_payload.get('audioBinary'):
+            print(f"🔊 音声データ準備完了: {len(audio_payload['audioBinary'])} バイト (バイナリ)")
+        elif audio_payload.get('audio'):
+            print(f"🔊 音声データ準備完了: {len(audio_payload['audio'])} バイト")
+        elif audio_payload.get('audioPending'):
+            print(f"🔊 テキスト先行送信（音声は後送）: {audio_payload['messageId'][:8]}")
+        else:
+            print("⚠️ 音声データが生成されませんでした")
+        if media_data:
+            print(f"📷 メディアデータ取得: images={len(media_data.get('images', []))}, videos={len(media_data.get('videos', []))}")
         
-        # 処理時間計測
+        # 処理時間計測（並行処理の待ち合わせ後＝クリティカルパス）
         processing_time = time.time() - start_time
         
-        # メディアデータの取得（元の質問から独立取得）
-        media_data = None
-        try:
-            from modules.static_qa_data import get_qa_media
-            media_data = get_qa_media(message)  # 元の質問を使用
-            if media_data:
-                print(f"📷 メディアデータ取得: images={len(media_data.get('images', []))}, videos={len(media_data.get('videos', []))}")
-        except ImportError as e:
-            print(f"⚠️ メディアモジュールのインポートエラー: {e}")
-        except Exception as e:
-            print(f"⚠️ メディア取得エラー: {e}")
-        
         # レスポンスデータの構築
         response_data = {
             'message': response,
             'emotion': emotion,
-            'audio': audio_data,
+            **audio_payload,
             'language': language,
-            'voice_engine': 'azure_speech' if (use_azure_speech and language == 'ja') else ('coe_font' if (use_coe_font and language == 'ja') else 'openai_tts'),
+            'voice_engine': get_primary_engine_name(language),
             'processingTime': round(processing_time, 2),
             'suggestions': suggestions,
             'relationshipLevel': relationship_style,
@@ -1749,6 +2956,9 @@ def handle_message(data):
         
         # 統計出力
         print(f"⏱️ 処理時間: {processing_time:.2f}秒")
+        print("⏱️ 後処理: " + ", ".join(
+            f"{name}={'timeout' if ms is None else f'{ms:.0f}ms'}" for name, ms in step_timings.items()
+        ))
         print(f"🎭 感情: {emotion}")
         print(f"💬 関係性: {relationship_style}")
         print(f"📊 インタラクション数: {session_info['interaction_count']}")
@@ -1772,25 +2982,20 @@ def handle_request_quiz_proposal(data):
     language = data.get('language', 'ja')
     
     # 提案メッセージ
-    proposal_text = {
-        'ja': '理解度レベルがMAXになりました！クイズに挑戦して全問正解したら素敵なプレゼントがもらえるよ！クイズに挑戦しますか？',
-        'en': 'Your understanding level is MAX! Challenge the quiz and get a special present if you answer all correctly! Will you try?'
-    }
-    
-    message = proposal_text.get(language, proposal_text['ja'])
+    message = QUIZ_PROPOSAL_TEXT.get(language, QUIZ_PROPOSAL_TEXT['ja'])
     emotion = 'happy'
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params=emotion)
+        audio_payload = prepare_audio_payload(message, language, emotion_params=emotion, session_id=session_id, priority='quiz')
     except Exception as e:
         print(f"❌ クイズ提案音声生成エラー: {e}")
-        audio_data = None
+        audio_payload = {'audio': None}
     
     emit('quiz_proposal', {
         'message': message,
         'emotion': emotion,
-        'audio': audio_data
+        **audio_payload
     })
     
     print(f"🎯 クイズ提案送信: Session={session_id}, Language={language}")
@@ -1841,16 +3046,10 @@ def handle_quiz_answer(data):
     question_data = QUIZ_DATA[language][question_index]
     
     if is_correct:
-        result_text = {
-            'ja': 'すごい！正解です！',
-            'en': 'Amazing! Correct!'
-        }
+        result_text = QUIZ_RESULT_TEXT['correct']
         emotion = 'surprise'
     else:
-        result_text = {
-            'ja': 'あぁ、惜しいです！',
-            'en': 'Oh, so close!'
-        }
+        result_text = QUIZ_RESULT_TEXT['incorrect']
         emotion = 'sad'
     
     result_message = result_text.get(language, result_text['ja'])
@@ -1859,10 +3058,10 @@ def handle_quiz_answer(data):
     # 音声生成（結果+解説）
     audio_text = f"{result_message} {explanation}"
     try:
-        audio_data = generate_audio_by_language(audio_text, language, emotion_params=emotion)
+        audio_payload = prepare_audio_payload(audio_text, language, emotion_params=emotion, session_id=session_id, priority='quiz')
     except Exception as e:
         print(f"❌ 回答結果音声生成エラー: {e}")
-        audio_data = None
+        audio_payload = {'audio': None}
     
     # 🎯 修正: 次の処理タイプを判定（クライアント側で遅延処理するため）
     has_next_question = current_question < len(QUIZ_DATA[language])
@@ -1875,7 +3074,7 @@ def handle_quiz_answer(data):
         'explanation': explanation,
         'resultMessage': result_message,
         'emotion': emotion,
-        'audio': audio_data,
+        **audio_payload,
         'hasNextQuestion': has_next_question,
         'nextQuestionIndex': current_question if has_next_question else None,
         'isFinalResult': not has_next_question,
@@ -1891,24 +3090,19 @@ def handle_quiz_declined():
     session_info = get_session_data(session_id)
     language = session_info.get('language', 'ja')
     
-    decline_text = {
-        'ja': 'わかった！また挑戦したくなったら声をかけてね！',
-        'en': 'Okay! Let me know when you want to try!'
-    }
-    
-    message = decline_text.get(language, decline_text['ja'])
+    message = QUIZ_DECLINE_TEXT.get(language, QUIZ_DECLINE_TEXT['ja'])
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params='neutral')
+        audio_payload = prepare_audio_payload(message, language, emotion_params='neutral', session_id=session_id, priority='quiz')
     except Exception as e:
         print(f"❌ 辞退メッセージ音声生成エラー: {e}")
-        audio_data = None
+        audio_payload = {'audio': None}
     
     emit('response', {
         'message': message,
         'emotion': 'neutral',
-        'audio': audio_data,
+        **audio_payload,
         'language': language
     })
     
@@ -1921,24 +3115,19 @@ def handle_quiz_quit():
     session_info = get_session_data(session_id)
     language = session_info.get('language', 'ja')
     
-    quit_text = {
-        'ja': 'わかった！準備ができたらまた挑戦してね！',
-        'en': 'Okay! Come back when you\'re ready!'
-    }
-    
-    message = quit_text.get(language, quit_text['ja'])
+    message = QUIZ_QUIT_TEXT.get(language, QUIZ_QUIT_TEXT['ja'])
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params='neutral')
+        audio_payload = prepare_audio_payload(message, language, emotion_params='neutral', session_id=session_id, priority='quiz')
     except Exception as e:
         print(f"❌ 中断メッセージ音声生成エラー: {e}")
-        audio_data = None
+        audio_payload = {'audio': None}
     
     emit('response', {
         'message': message,
         'emotion': 'neutral',
-        'audio': audio_data,
+        **audio_payload,
         'language': language
     })
     
@@ -2010,14 +3199,14 @@ def send_quiz_question(session_id, language, question_index):
         return
     
     question_data = QUIZ_DATA[language][question_index]
-    question_text = f"問題{question_index + 1}: {question_data['question']}" if language == 'ja' else f"Question {question_index + 1}: {question_data['question']}"
+    question_text = format_quiz_question_text(language, question_index)
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(question_text, language, emotion_params='neutraltalking')
+        audio_payload = prepare_audio_payload(question_text, language, emotion_params='neutraltalking', session_id=session_id, priority='quiz')
     except Exception as e:
         print(f"❌ 問題音声生成エラー: {e}")
-        audio_data = None
+        audio_payload = {'audio': None}
     
     # 🎯 修正: イベント名を統一（クライアント側で同じハンドラが処理）
     event_name = 'next_quiz_question' if question_index > 0 else 'quiz_question'
@@ -2029,7 +3218,7 @@ def send_quiz_question(session_id, language, question_index):
         'options': question_data['options'],
         'totalQuestions': len(QUIZ_DATA[language]),
         'correct': question_data['correct'],
-        'audio': audio_data
+        **audio_payload
     })
 
 def send_quiz_final_result(session_id, language, score):
@@ -2041,10 +3230,7 @@ def send_quiz_final_result(session_id, language, score):
     
     if all_correct:
         # 全問正解（🎯 修正: メッセージ文言を仕様に合わせる）
-        result_text = {
-            'ja': 'コングラチュレーション！おめでとうございます！全問正解したあなたに特別なプレゼントです！',
-            'en': 'Congratulations! Perfect score! Here\'s a special present for you!'
-        }
+        result_text = QUIZ_PERFECT_TEXT
         emotion = 'happy'
         
         # 訪問者データを更新 - Masterレベルに昇格
@@ -2057,20 +3243,17 @@ def send_quiz_final_result(session_id, language, score):
         
     else:
         # 不正解あり
-        result_text = {
-            'ja': f'{score}/3問正解でした。再度挑戦しますか？',
-            'en': f'You got {score}/3 correct. Try again?'
-        }
+        result_text = {lang: text.format(score=score) for lang, text in QUIZ_SCORE_TEXT.items()}
         emotion = 'neutral'
     
     message = result_text.get(language, result_text['ja'])
     
     # 音声生成
     try:
-        audio_data = generate_audio_by_language(message, language, emotion_params=emotion)
+        audio_payload = prepare_audio_payload(message, language, emotion_params=emotion, session_id=session_id, priority='quiz')
     except Exception as e:
         print(f"❌ 最終結果音声生成エラー: {e}")
-        audio_data = None
+        audio_payload = {'audio': None}
     
     # クイズセッションをクリア
     if session_id in quiz_sessions:
@@ -2080,12 +3263,159 @@ def send_quiz_final_result(session_id, language, score):
     emit('quiz_final_result', {
         'message': message,
         'emotion': emotion,
-        'audio': audio_data,
+        **audio_payload,
         'allCorrect': all_correct
     })
     
     print(f"🏆 クイズ完了: Session={session_id}, Score={score}/3")
 
+# ====== 音声パック事前合成コマンド ======
+def iter_fixed_utterances():
+    """サーバーが話す定型セリフを列挙
+    Yields: (text, language, emotion)
+    """
+    # 初回接続の自己紹介
+    yield INTRO_MESSAGE, 'ja', validate_emotion('start')
+    
+    for language in QUIZ_DATA:
+        # 再接続・言語切り替え時の挨拶
+        for greeting in RELATIONSHIP_GREETINGS.get(language, {}).values():
+            yield greeting, language, 'happy'
+        
+        # クイズ
+        yield QUIZ_PROPOSAL_TEXT[language], language, 'happy'
+        for question_index, question_data in enumerate(QUIZ_DATA[language]):
+            yield format_quiz_question_text(language, question_index), language, 'neutraltalking'
+            yield f"{QUIZ_RESULT_TEXT['correct'][language]} {question_data['explanation']}", language, 'surprise'
+            yield f"{QUIZ_RESULT_TEXT['incorrect'][language]} {question_data['explanation']}", language, 'sad'
+        yield QUIZ_DECLINE_TEXT[language], language, 'neutral'
+        
+        # 応答生成中の相づち
+        for phrases in THINKING_FILLERS.get(language, {}).values():
+            for phrase in phrases:
+                yield phrase, language, THINKING_FILLER_EMOTION
+        yield QUIZ_QUIT_TEXT[language], language, 'neutral'
+        yield QUIZ_PERFECT_TEXT[language], language, 'happy'
+        for score in range(len(QUIZ_DATA[language])):
+            yield QUIZ_SCORE_TEXT[language].format(score=score), language, 'neutral'
+
+@app.cli.command('prerender-audio')
+@click.option('--force', is_flag=True, help='既存の音声も再合成する')
+@click.option('--all-emotions', is_flag=True, help='各セリフを全感情で合成する')
+def prerender_audio_command(force, all_emotions):
+    """定型セリフを事前合成して音声パックに保存
+
+    使い方: flask --app application prerender-audio
+    """
+    pack = audio_pack or AudioPack(os.getenv('AUDIO_PACK_DIR', os.path.join('data', 'audio_pack')))
+    previous = dict(pack.manifest)
+    pack.manifest = {}
+    
+    rendered = reused = failed = 0
+    for text, language, emotion in iter_fixed_utterances():
+        # 言語の本来のエンジンのみで合成する（障害時に別の声がパックに焼き込まれないよう、フェイルオーバーしない）
+        engine = get_preferred_engine_name(language)
+        if not engine:
+            failed += 1
+            continue
+        emotions = VALID_EMOTIONS if all_emotions else [emotion]
+        for emotion_params in emotions:
+            cache_key = get_audio_cache_key(text, language, emotion_params)
+            if cache_key in pack.manifest:
+                continue
+            
+            # 別のエンジンで作られた（またはエンジンの記録が無い）音声は再合成する
+            if (not force and cache_key in previous and pack.contains(cache_key)
+                    and previous[cache_key].get('engine') == engine):
+                pack.manifest[cache_key] = previous[cache_key]
+                reused += 1
+                continue
+            
+            try:
+                result = postprocess_synthesized_audio(
+                    synthesize_audio(text, language, emotion_params, priority='prefetch', engine=engine)
+                )
+            except Exception as e:
+                print(f"❌ 事前合成エラー: {text[:20]}... ({e})")
+                result = None
+            
+            if not result:
+                print(f"⏭️ {engine} で合成できないためスキップ: {text[:20]}...")
+                failed += 1
+                continue
+            
+            meta = {'text': text, 'language': language, 'emotion': emotion_params, 'engine': engine}
+            duration_ms = get_duration_ms(result[0], result[1])
+            if duration_ms:
+                meta['duration_ms'] = duration_ms
+            lipsync = build_lipsync(result[0], result[1], LIPSYNC_FRAME_MS)
+            if lipsync:
+                meta['lipsync'] = lipsync
+            pack.add(cache_key, result[0], result[1], **meta)
+            rendered += 1
+    
+    pack.save()
+    print(f"📦 音声パック作成完了: 合成={rendered}, 再利用={reused}, 失敗={failed} ({pack.root_dir})")
+
+@app.cli.command('benchmark-audio-decoders')
+@click.option('--file', 'audio_path', type=click.Path(exists=True), help='デコードする音声ファイル（省略時はFFmpegで3秒のWebM/Opusを生成）')
+@click.option('--iterations', default=20, show_default=True, help='バックエンドごとのデコード回数')
+@click.option('--interval-ms', default=0, show_default=True, help='デコードの間隔（全バックエンド共通。0で連続）')
+def benchmark_audio_decoders_command(audio_path, iterations, interval_ms):
+    """音声認識用デコーダーのバックエンドを比較（pyav / pool / spawn）
+
+    既定では連続してデコードする（プールの補充が追いつかない場合の遅延も計測に含める）。
+    使い方: flask --app application benchmark-audio-decoders --iterations 50
+    """
+    from modules.audio_decoder import DECODER_BACKENDS, AV_AVAILABLE, FFMPEG_PATH as DECODER_FFMPEG_PATH
+    from modules.tts_resilience import percentile
+    
+    if audio_path:
+        with open(audio_path, 'rb') as f:
+            audio_data = f.read()
+    else:
+        if not DECODER_FFMPEG_PATH:
+            print("❌ FFmpegが無いため、--file で音声ファイルを指定してください")
+            return
+        import subprocess
+        audio_data = subprocess.run(
+            [DECODER_FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'sine=frequency=440:duration=3',
+             '-c:a', 'libopus', '-b:a', '32k', '-f', 'webm', 'pipe:1'],
+            stdout=subprocess.PIPE, check=True
+        ).stdout
+    print(f"🎧 入力: {len(audio_data)} バイト, {iterations} 回")
+    
+    for name, backend in DECODER_BACKENDS.items():
+        if name == 'pyav' and not AV_AVAILABLE:
+            print(f"  - {name}: PyAV未インストールのためスキップ")
+            continue
+        if name != 'pyav' and not DECODER_FFMPEG_PATH:
+            print(f"  - {name}: FFmpegが無いためスキップ")
+            continue
+        decoder = backend(sample_rate=16000)
+        timings = []
+        try:
+            decoder.decode_to_wav(audio_data)  # ウォームアップ（プールはここで起動）
+            if name == 'pool':
+                time.sleep(0.5)  # 計測開始時点でプールが満ちている状態にする（計測中は待たない）
+            misses_before = decoder.get_stats().get('pool_misses', 0)
+            for _ in range(iterations):
+                start = time.perf_counter()
+                decoder.decode_to_wav(audio_data)
+                timings.append((time.perf_counter() - start) * 1000)
+                if interval_ms:
+                    time.sleep(interval_ms / 1000)
+            pool_misses = decoder.get_stats().get('pool_misses', 0) - misses_before
+        except Exception as e:
+            print(f"  - {name}: 失敗 ({e})")
+            continue
+        finally:
+            decoder.close()
+        # プールが空でその場で起動した回数（補充が追いつかなかった回数）
+        misses = f", プール切れ {pool_misses}/{iterations} 回" if name == 'pool' else ''
+        print(f"  - {name}: 平均 {sum(timings) / len(timings):.1f}ms, "
+              f"p50 {percentile(timings, 50):.1f}ms, p95 {percentile(timings, 95):.1f}ms{misses}")
+
 # ====== システム初期化（モジュールロード時に実行） ======
 # Gunicorn経由でも確実に実行されるように、モジュールレベルで初期化
 initialize_system()
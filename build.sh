@@ -49,6 +49,17 @@ mkdir -p data/chroma_db
 mkdir -p uploads
 mkdir -p static/media/thumbnails
 
+# ====================================================
+# 6.5 定型セリフの音声パック作成（任意）
+# ====================================================
+# PRERENDER_AUDIO=true の場合、挨拶・クイズなどの定型セリフを事前合成する
+# （既存のパックにある音声は再合成しない）
+if [ "${PRERENDER_AUDIO}" = "true" ]; then
+    echo "📦 音声パックを作成中..."
+    mkdir -p data/audio_pack
+    flask --app application prerender-audio || echo "⚠️ 音声パック作成に失敗しました（起動は継続可能）"
+fi
+
 # ====================================================
 # 7. 権限設定
 # ====================================================
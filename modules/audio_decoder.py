@@ -0,0 +1,330 @@
+# audio_decoder.py - 音声認識用の音声デコードのバックエンド（PyAV / 起動済みFFmpegプール / 都度起動FFmpeg）
+import io
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+import time
+import wave
+
+try:
+    import av  # 任意: PyAV（libavのバインディング）
+    AV_AVAILABLE = True
+except ImportError:
+    av = None
+    AV_AVAILABLE = False
+
+FFMPEG_PATH = shutil.which('ffmpeg')
+
+
+class DecodeError(Exception):
+    """デコード失敗（タイムアウトを含む）"""
+
+
+def fix_wav_header(wav_data):
+    """パイプ出力のWAVはFFmpegがヘッダーのサイズを書き戻せないため、実際の長さで補正する"""
+    if len(wav_data) < 12 or wav_data[:4] != b'RIFF' or wav_data[8:12] != b'WAVE':
+        return wav_data
+    fixed = bytearray(wav_data)
+    struct.pack_into('<I', fixed, 4, len(fixed) - 8)
+    offset = 12
+    while offset + 8 <= len(fixed):
+        chunk_id = bytes(fixed[offset:offset + 4])
+        chunk_size = struct.unpack_from('<I', fixed, offset + 4)[0]
+        if chunk_id == b'data':
+            struct.pack_into('<I', fixed, offset + 4, len(fixed) - offset - 8)
+            break
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return bytes(fixed)
+
+
+class DecoderBackend:
+    """音声（WebM/Ogg/MP3など）を指定の周波数・モノラル・16bitのWAVに変換する
+
+    decode_to_wav(audio_data) → WAVバイト列。失敗時は DecodeError を送出する。
+    max_seconds=None なら長さを制限しない。
+    """
+
+    name = None
+
+    def __init__(self, sample_rate=16000, max_seconds=60, timeout=15):
+        self.sample_rate = sample_rate
+        self.max_seconds = max_seconds
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.stats = {'decodes': 0, 'failures': 0, 'total_ms': 0.0}
+
+    def _decode(self, audio_data):
+        raise NotImplementedError
+
+    def decode_to_wav(self, audio_data):
+        start = time.perf_counter()
+        try:
+            wav_data = self._decode(audio_data)
+        except Exception:
+            with self.lock:
+                self.stats['failures'] += 1
+            raise
+        with self.lock:
+            self.stats['decodes'] += 1
+            self.stats['total_ms'] += (time.perf_counter() - start) * 1000
+        return wav_data
+
+    def close(self):
+        pass
+
+    def get_stats(self):
+        with self.lock:
+            decodes = self.stats['decodes']
+            return {
+                'backend': self.name,
+                'decodes': decodes,
+                'failures': self.stats['failures'],
+                'avg_ms': round(self.stats['total_ms'] / decodes, 1) if decodes else 0
+            }
+
+
+class SpawnFFmpegDecoder(DecoderBackend):
+    """リクエストごとにFFmpegを起動（標準入出力のパイプのみ使用）"""
+
+    name = 'spawn'
+
+    def _command(self):
+        limit = ['-t', str(self.max_seconds)] if self.max_seconds else []
+        return [
+            FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', *limit,
+            '-ar', str(self.sample_rate), '-ac', '1', '-c:a', 'pcm_s16le', '-f', 'wav', 'pipe:1'
+        ]
+
+    def _decode(self, audio_data):
+        if not FFMPEG_PATH:
+            raise DecodeError("FFmpegが見つかりません")
+        try:
+            result = subprocess.run(self._command(), input=audio_data, stdout=subprocess.PIPE,
+                                    stderr=subprocess.PIPE, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise DecodeError(f"FFmpeg変換タイムアウト ({self.timeout}秒)")
+        except OSError as e:
+            raise DecodeError(f"FFmpeg起動エラー: {e}")
+        if result.returncode != 0 or not result.stdout:
+            raise DecodeError(f"FFmpeg変換失敗: {result.stderr.decode('utf-8', 'ignore')[:200]}")
+        return fix_wav_header(result.stdout)
+
+
+class FFmpegPoolDecoder(SpawnFFmpegDecoder):
+    """起動済みのFFmpegプロセスをプールしておき、リクエスト時は入力を流すだけにする
+
+    FFmpegは1プロセスで1入力しか扱えないため、使ったプロセスは終了させ、
+    バックグラウンドで次のプロセスを起動して補充する（プロセス起動の待ち時間を応答から外す）。
+    プロセスは最初のデコード時に起動する（音声認識を使わないワーカーやCLIでは起動しない）。
+    """
+
+    name = 'pool'
+
+    def __init__(self, pool_size=2, **options):
+        super().__init__(**options)
+        self.pool_size = pool_size
+        self.idle = queue.Queue()
+        self.refill_requests = queue.Queue()
+        self.closed = False
+        self.started = False
+        self.stats['pool_misses'] = 0
+
+    def _start(self):
+        """補充スレッドを起動し、プールを満たす（初回のみ）"""
+        with self.lock:
+            if self.started or self.closed:
+                return
+            self.started = True
+        for _ in range(self.pool_size):
+            self.refill_requests.put(True)
+        threading.Thread(target=self._refill_loop, name='ffmpeg-pool', daemon=True).start()
+
+    def _spawn(self):
+        return subprocess.Popen(self._command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+
+    def _refill_loop(self):
+        while not self.closed:
+            self.refill_requests.get()
+            if self.closed:
+                break
+            try:
+                self.idle.put(self._spawn())
+            except OSError as e:
+                print(f"⚠️ FFmpegプロセス起動エラー: {e}")
+                time.sleep(1)
+                self.refill_requests.put(True)
+
+    def _acquire(self):
+        """起動済みのプロセスを取得（無ければその場で起動）。取得した分は補充を依頼する"""
+        self._start()
+        try:
+            process = self.idle.get_nowait()
+        except queue.Empty:
+            process = None
+        if process is not None and process.poll() is None:
+            self.refill_requests.put(True)
+            return process
+        if process is not None:
+            self.refill_requests.put(True)
+        with self.lock:
+            self.stats['pool_misses'] += 1
+        return self._spawn()
+
+    def _decode(self, audio_data):
+        if not FFMPEG_PATH:
+            raise DecodeError("FFmpegが見つかりません")
+        try:
+            process = self._acquire()
+        except OSError as e:
+            raise DecodeError(f"FFmpeg起動エラー: {e}")
+        try:
+            stdout, stderr = process.communicate(input=audio_data, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.communicate()
+            raise DecodeError(f"FFmpeg変換タイムアウト ({self.timeout}秒)")
+        if process.returncode != 0 or not stdout:
+            raise DecodeError(f"FFmpeg変換失敗: {stderr.decode('utf-8', 'ignore')[:200]}")
+        return fix_wav_header(stdout)
+
+    def close(self):
+        self.closed = True
+        self.refill_requests.put(False)
+        while True:
+            try:
+                process = self.idle.get_nowait()
+            except queue.Empty:
+                break
+            process.kill()
+            process.communicate()
+
+    def get_stats(self):
+        stats = super().get_stats()
+        with self.lock:
+            stats['pool_misses'] = self.stats['pool_misses']
+        stats['pool_size'] = self.pool_size
+        stats['idle'] = self.idle.qsize()
+        return stats
+
+
+class PyAVDecoder(DecoderBackend):
+    """PyAV（libav）でプロセス内でデコード・リサンプリングする"""
+
+    name = 'pyav'
+
+    def _decode(self, audio_data):
+        if not AV_AVAILABLE:
+            raise DecodeError("PyAVがインストールされていません")
+        max_samples = int(self.max_seconds * self.sample_rate) if self.max_seconds else None
+        deadline = time.monotonic() + self.timeout
+        resampler = av.AudioResampler(format='s16', layout='mono', rate=self.sample_rate)
+        chunks = []
+        sample_count = 0
+        try:
+            with av.open(io.BytesIO(audio_data), mode='r') as container:
+                stream = next(s for s in container.streams if s.type == 'audio')
+                for frame in container.decode(stream):
+                    for resampled in resampler.resample(frame):
+                        chunks.append(bytes(resampled.planes[0])[:resampled.samples * 2])
+                        sample_count += resampled.samples
+                    if max_samples and sample_count >= max_samples:
+                        break
+                    if time.monotonic() > deadline:
+                        raise DecodeError(f"デコードタイムアウト ({self.timeout}秒)")
+                for resampled in resampler.resample(None):
+                    chunks.append(bytes(resampled.planes[0])[:resampled.samples * 2])
+        except (av.error.FFmpegError, StopIteration) as e:
+            raise DecodeError(f"PyAVデコード失敗: {e}")
+
+        pcm = b''.join(chunks)
+        if max_samples:
+            pcm = pcm[:max_samples * 2]
+        if not pcm:
+            raise DecodeError("音声データがありません")
+        buffer = io.BytesIO()
+        with wave.open(buffer, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.sample_rate)
+            wav.writeframes(pcm)
+        return buffer.getvalue()
+
+
+class StreamingFFmpegDecoder:
+    """録音中に届いた断片を順にFFmpegへ流し込み、録音終了時にはWAVがほぼ出来上がっている状態にする
+
+    feed() は断片を標準入力に書き込むだけで、標準出力は別スレッドで読み続ける。
+    """
+
+    def __init__(self, command, timeout=15):
+        self.timeout = timeout
+        self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL)
+        self.output = bytearray()
+        self.failed = False
+        self.reader = threading.Thread(target=self._read_loop, name='ffmpeg-stream-reader', daemon=True)
+        self.reader.start()
+
+    def _read_loop(self):
+        while True:
+            data = self.process.stdout.read(65536)
+            if not data:
+                break
+            self.output.extend(data)
+
+    def feed(self, data):
+        if self.failed:
+            return
+        try:
+            self.process.stdin.write(data)
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.failed = True
+
+    def finish(self):
+        """入力を閉じて残りのデコードを待つ
+        Returns: WAVバイト列。Raises: DecodeError
+        """
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        self.reader.join(self.timeout)
+        if self.reader.is_alive():
+            self.abort()
+            raise DecodeError(f"FFmpeg変換タイムアウト ({self.timeout}秒)")
+        returncode = self.process.wait()
+        if self.failed or returncode != 0 or not self.output:
+            raise DecodeError("FFmpegのストリーミング変換に失敗しました")
+        return fix_wav_header(bytes(self.output))
+
+    def abort(self):
+        if self.process.poll() is None:
+            self.process.kill()
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+DECODER_BACKENDS = {
+    'pyav': PyAVDecoder,
+    'pool': FFmpegPoolDecoder,
+    'spawn': SpawnFFmpegDecoder
+}
+
+
+def create_decoder(name='auto', **options):
+    """デコーダーを作成（'auto': PyAV → FFmpegプール → 都度起動 の順に利用可能なもの）"""
+    if name == 'auto':
+        name = 'pyav' if AV_AVAILABLE else 'pool'
+    if name == 'pyav' and not AV_AVAILABLE:
+        print("⚠️ PyAVが利用できないため、FFmpegプールでデコードします")
+        name = 'pool'
+    backend = DECODER_BACKENDS.get(name, SpawnFFmpegDecoder)
+    if backend is not FFmpegPoolDecoder:
+        options.pop('pool_size', None)
+    return backend(**options)
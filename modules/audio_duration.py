@@ -0,0 +1,186 @@
+# audio_duration.py - 音声ファイルのヘッダーから正確な再生時間を求める（外部プロセス不要）
+import struct
+
+# MPEGオーディオのビットレート表（kbps）: (バージョン区分, レイヤー) → 表
+MP3_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# バージョンビット → サンプリング周波数表（0b01 は予約）
+MP3_SAMPLE_RATES = {
+    0b11: (44100, 48000, 32000),  # MPEG1
+    0b10: (22050, 24000, 16000),  # MPEG2
+    0b00: (11025, 12000, 8000),   # MPEG2.5
+}
+ADTS_SAMPLE_RATES = (96000, 88200, 64000, 48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000, 7350)
+
+
+def wav_duration_ms(data):
+    """RIFF/WAVE の fmt チャンクのバイトレートと data チャンクの長さから計算"""
+    if len(data) < 12 or data[:4] != b'RIFF' or data[8:12] != b'WAVE':
+        return None
+    byte_rate = None
+    offset = 12
+    while offset + 8 <= len(data):
+        chunk_id = data[offset:offset + 4]
+        chunk_size = struct.unpack_from('<I', data, offset + 4)[0]
+        body = offset + 8
+        if chunk_id == b'fmt ' and body + 16 <= len(data):
+            byte_rate = struct.unpack_from('<I', data, body + 8)[0]
+        elif chunk_id == b'data':
+            if not byte_rate:
+                return None
+            # ストリーミング出力ではサイズが不定（0 / 0xFFFFFFFF）のことがあるため実データ長で補正
+            size = len(data) - body if chunk_size in (0, 0xFFFFFFFF) else min(chunk_size, len(data) - body)
+            return int(round(size * 1000 / byte_rate))
+        offset = body + chunk_size + (chunk_size & 1)
+    return None
+
+
+def _skip_id3v2(data):
+    if len(data) >= 10 and data[:3] == b'ID3':
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        footer = 10 if data[5] & 0x10 else 0
+        return 10 + size + footer
+    return 0
+
+
+def _parse_mp3_header(data, offset):
+    """MPEGフレームヘッダーを解析
+    Returns: (フレーム長, フレームあたりのサンプル数, サンプリング周波数) or None
+    """
+    if offset + 4 > len(data) or data[offset] != 0xFF or (data[offset + 1] & 0xE0) != 0xE0:
+        return None
+    version_bits = (data[offset + 1] >> 3) & 0x03
+    layer_bits = (data[offset + 1] >> 1) & 0x03
+    bitrate_index = data[offset + 2] >> 4
+    rate_index = (data[offset + 2] >> 2) & 0x03
+    padding = (data[offset + 2] >> 1) & 0x01
+    if version_bits == 0b01 or layer_bits == 0 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    layer = 4 - layer_bits
+    mpeg1 = version_bits == 0b11
+    bitrate = MP3_BITRATES[(1 if mpeg1 else 2, layer)][bitrate_index] * 1000
+    sample_rate = MP3_SAMPLE_RATES[version_bits][rate_index]
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+    samples = 1152 if (layer == 2 or mpeg1) else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+
+
+def mp3_duration_ms(data):
+    """MP3のフレームを先頭から数えて計算（VBRでも正確）
+
+    先頭のXing/Info/VBRIフレームは音声を含まないため数えない。
+    """
+    offset = _skip_id3v2(data)
+    total_samples = 0
+    sample_rate = None
+    first = True
+    while offset + 4 <= len(data):
+        header = _parse_mp3_header(data, offset)
+        if header is None:
+            if data[offset:offset + 3] == b'TAG':
+                break
+            # 同期が外れた場合は次の同期ワードを探す
+            next_sync = data.find(b'\xff', offset + 1)
+            if next_sync < 0:
+                break
+            offset = next_sync
+            continue
+        frame_length, samples, sample_rate = header
+        if frame_length <= 0:
+            break
+        frame = data[offset:offset + min(frame_length, 64)]
+        if not (first and (b'Xing' in frame or b'Info' in frame or b'VBRI' in frame)):
+            total_samples += samples
+        first = False
+        offset += frame_length
+    if not sample_rate:
+        return None
+    return int(round(total_samples * 1000 / sample_rate))
+
+
+def ogg_duration_ms(data):
+    """最後のOggページのグラニュール位置から計算（Opus / Vorbis）"""
+    if data[:4] != b'OggS':
+        return None
+    head = data[:512]
+    opus = head.find(b'OpusHead')
+    vorbis = head.find(b'\x01vorbis')
+    if opus >= 0 and opus + 12 <= len(data):
+        sample_rate = 48000
+        pre_skip = struct.unpack_from('<H', data, opus + 10)[0]
+    elif vorbis >= 0 and vorbis + 16 <= len(data):
+        sample_rate = struct.unpack_from('<I', data, vorbis + 12)[0]
+        pre_skip = 0
+    else:
+        return None
+    last_page = data.rfind(b'OggS')
+    if last_page < 0 or last_page + 14 > len(data) or not sample_rate:
+        return None
+    granule = struct.unpack_from('<q', data, last_page + 6)[0]
+    if granule < 0:
+        return None
+    return int(round(max(0, granule - pre_skip) * 1000 / sample_rate))
+
+
+def adts_duration_ms(data):
+    """AAC（ADTS）のフレームを数えて計算（1ブロック1024サンプル）"""
+    offset = _skip_id3v2(data)
+    total_samples = 0
+    sample_rate = None
+    while offset + 7 <= len(data):
+        if data[offset] != 0xFF or (data[offset + 1] & 0xF6) != 0xF0:
+            break
+        rate_index = (data[offset + 2] >> 2) & 0x0F
+        if rate_index >= len(ADTS_SAMPLE_RATES):
+            break
+        sample_rate = ADTS_SAMPLE_RATES[rate_index]
+        frame_length = ((data[offset + 3] & 0x03) << 11) | (data[offset + 4] << 3) | (data[offset + 5] >> 5)
+        blocks = (data[offset + 6] & 0x03) + 1
+        if frame_length < 7:
+            break
+        total_samples += 1024 * blocks
+        offset += frame_length
+    if not sample_rate:
+        return None
+    return int(round(total_samples * 1000 / sample_rate))
+
+
+def flac_duration_ms(data):
+    """FLACのSTREAMINFO（総サンプル数とサンプリング周波数）から計算"""
+    if len(data) < 26 or data[:4] != b'fLaC':
+        return None
+    info = data[8:26]
+    sample_rate = (info[10] << 12) | (info[11] << 4) | (info[12] >> 4)
+    total_samples = ((info[13] & 0x0F) << 32) | struct.unpack_from('>I', info, 14)[0]
+    if not sample_rate or not total_samples:
+        return None
+    return int(round(total_samples * 1000 / sample_rate))
+
+
+DURATION_PARSERS = {
+    'wav': wav_duration_ms,
+    'mp3': mp3_duration_ms,
+    'ogg': ogg_duration_ms,
+    'aac': adts_duration_ms,
+    'flac': flac_duration_ms,
+}
+
+
+def get_duration_ms(audio_content, ext):
+    """音声の再生時間（ミリ秒）。未対応の形式・解析できない場合は None"""
+    parser = DURATION_PARSERS.get(ext)
+    if not parser or not audio_content:
+        return None
+    try:
+        return parser(audio_content)
+    except (struct.error, IndexError, ZeroDivisionError):
+        return None
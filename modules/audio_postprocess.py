@@ -0,0 +1,108 @@
+# audio_postprocess.py - 合成音声の前後の無音の除去と音量の正規化
+import subprocess
+
+import numpy as np
+
+from modules.audio_stitch import decode_wav, encode_wav
+from modules.transcode import FFMPEG_PATH, EXT_TO_CODEC, transcode
+
+
+def find_voiced_range(samples, sample_rate, threshold_db=-45, frame_ms=10, keep_ms=50):
+    """前後の無音を除いた範囲（フレーム単位のRMSがしきい値を超える区間 + 前後に keep_ms）
+
+    samples: float32配列[フレーム, チャンネル]（-1.0〜1.0）
+    Returns: (start, end) or None（全体が無音）
+    """
+    frame_size = max(1, int(sample_rate * frame_ms / 1000))
+    frame_count = len(samples) // frame_size
+    if frame_count == 0:
+        return None
+    mono = samples[:frame_count * frame_size].mean(axis=1)
+    rms = np.sqrt(np.mean(mono.reshape(frame_count, frame_size) ** 2, axis=1))
+    voiced = np.flatnonzero(20 * np.log10(rms + 1e-9) > threshold_db)
+    if len(voiced) == 0:
+        return None
+    keep = int(sample_rate * keep_ms / 1000)
+    start = max(0, voiced[0] * frame_size - keep)
+    end = min(len(samples), (voiced[-1] + 1) * frame_size + keep)
+    return start, end
+
+
+def normalize_loudness(samples, sample_rate, target_dbfs=-20, peak_dbfs=-1, threshold_db=-45, frame_ms=10):
+    """発話部分のRMSを target_dbfs に揃える（ピークが peak_dbfs を超えない範囲で）"""
+    frame_size = max(1, int(sample_rate * frame_ms / 1000))
+    frame_count = len(samples) // frame_size
+    if frame_count == 0:
+        return samples
+    mono = samples[:frame_count * frame_size].mean(axis=1).reshape(frame_count, frame_size)
+    frame_power = np.mean(mono ** 2, axis=1)
+    voiced_power = frame_power[10 * np.log10(frame_power + 1e-18) > threshold_db]
+    if len(voiced_power) == 0:
+        return samples
+
+    current_dbfs = 10 * np.log10(np.mean(voiced_power))
+    gain = 10 ** ((target_dbfs - current_dbfs) / 20)
+    peak = np.max(np.abs(samples))
+    if peak > 0:
+        gain = min(gain, 10 ** (peak_dbfs / 20) / peak)
+    return samples * gain
+
+
+def process_pcm(samples, sample_rate, trim=True, normalize=True, **options):
+    """Returns: (処理後のfloat32配列, 除去した長さ(ms))"""
+    trimmed_ms = 0
+    if trim:
+        voiced = find_voiced_range(samples, sample_rate, options.get('threshold_db', -45),
+                                   keep_ms=options.get('keep_ms', 50))
+        if voiced:
+            start, end = voiced
+            trimmed_ms = (len(samples) - (end - start)) * 1000 / sample_rate
+            samples = samples[start:end]
+    if normalize:
+        samples = normalize_loudness(samples, sample_rate, options.get('target_dbfs', -20),
+                                     options.get('peak_dbfs', -1), options.get('threshold_db', -45))
+    return samples, trimmed_ms
+
+
+def _decode_with_ffmpeg(audio_content):
+    """圧縮形式を16bit PCMのWAVにデコード（標準入出力のパイプのみ使用）"""
+    try:
+        result = subprocess.run(
+            [FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-c:a', 'pcm_s16le', '-f', 'wav', 'pipe:1'],
+            input=audio_content, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10
+        )
+    except (subprocess.SubprocessError, OSError):
+        return None
+    if result.returncode != 0 or not result.stdout:
+        return None
+    return result.stdout
+
+
+def postprocess_audio(audio_content, ext, reencode=False, **options):
+    """合成音声の前後の無音を除き、音量を正規化する
+
+    WAV（16bit PCM）はそのまま処理する。圧縮形式は reencode=True かつ FFmpegがある場合のみ、
+    デコード → 処理 → 同じ形式に再エンコードする。
+    Returns: (audio_content, ext, 除去した長さ(ms)) or None（処理できない場合）
+    """
+    wav_content = audio_content
+    if ext != 'wav':
+        if not reencode or not FFMPEG_PATH or ext not in EXT_TO_CODEC:
+            return None
+        wav_content = _decode_with_ffmpeg(audio_content)
+        if not wav_content:
+            return None
+
+    decoded = decode_wav(wav_content)
+    if decoded is None:
+        return None
+    params, samples = decoded
+    processed, trimmed_ms = process_pcm(samples.astype(np.float32) / 32768.0, params[1], **options)
+    output = encode_wav(np.clip(np.round(processed * 32768.0), -32768, 32767), params)
+
+    if ext != 'wav':
+        converted = transcode(output, EXT_TO_CODEC[ext])
+        if not converted:
+            return None
+        output = converted[0]
+    return output, ext, trimmed_ms
@@ -0,0 +1,88 @@
+# audio_stitch.py - 文単位の音声断片をPCMで連結する
+import io
+import re
+import wave
+
+import numpy as np
+
+# 文末（日本語の句点・感嘆符・疑問符。閉じ括弧の直前では切らない。英語は直後に空白がある場合のみ）
+SENTENCE_BOUNDARY = re.compile(r'(?<=[。！？!?])(?![」』）)!?！？])\s*|(?<=\.)\s+|\n+')
+
+
+def split_sentences(text, min_chars=4):
+    """テキストを文に分割（短すぎる断片は直前の文に含める）"""
+    sentences = []
+    for part in SENTENCE_BOUNDARY.split(text or ''):
+        part = part.strip()
+        if not part:
+            continue
+        if sentences and len(part) < min_chars:
+            sentences[-1] = f"{sentences[-1]}{part}"
+        else:
+            sentences.append(part)
+    return sentences
+
+
+def decode_wav(audio_content):
+    """WAV（16bit PCM）を読み込む
+
+    Returns: ((チャンネル数, サンプリング周波数), int16配列[フレーム, チャンネル]) or None
+    """
+    try:
+        with wave.open(io.BytesIO(audio_content), 'rb') as wav:
+            if wav.getsampwidth() != 2 or wav.getcomptype() != 'NONE':
+                return None
+            channels = wav.getnchannels()
+            framerate = wav.getframerate()
+            frames = wav.readframes(wav.getnframes())
+    except (wave.Error, EOFError):
+        return None
+    samples = np.frombuffer(frames, dtype='<i2').reshape(-1, channels)
+    return (channels, framerate), samples
+
+
+def encode_wav(samples, params):
+    """int16配列をWAVバイト列に変換"""
+    channels, framerate = params
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(framerate)
+        wav.writeframes(samples.astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def stitch_wav(clips, gap_ms=250, fade_ms=5):
+    """WAVの断片を文の間の無音（gap_ms）を挟んでつなぐ
+
+    断片は前後の無音を除いてあるため、重ねずに文の間の間（ま）を入れる。
+    つなぎ目のクリックノイズを防ぐため、各断片の端だけ fade_ms でフェードする。
+    全ての断片が同じ形式（16bit PCM・同じチャンネル数と周波数）の場合のみ連結できる。
+    Returns: WAVバイト列 or None（連結できない場合）
+    """
+    decoded = [decode_wav(clip) for clip in clips]
+    if not decoded or any(item is None for item in decoded):
+        return None
+    params = decoded[0][0]
+    if any(item[0] != params for item in decoded):
+        return None
+
+    channels, framerate = params
+    fade = int(framerate * fade_ms / 1000)
+    gap = np.zeros((int(framerate * gap_ms / 1000), channels), dtype=np.float32)
+    parts = []
+    for index, (_, samples) in enumerate(decoded):
+        samples = samples.astype(np.float32)
+        edge = min(fade, len(samples) // 2)
+        if edge > 0:
+            ramp = np.linspace(0.0, 1.0, edge, dtype=np.float32)[:, None]
+            if index > 0:
+                samples[:edge] *= ramp
+            if index < len(decoded) - 1:
+                samples[-edge:] *= ramp[::-1]
+        if index > 0:
+            parts.append(gap)
+        parts.append(samples)
+
+    return encode_wav(np.clip(np.round(np.concatenate(parts)), -32768, 32767), params)
@@ -0,0 +1,419 @@
+# audio_store.py - 合成音声のディスク永続化ストア
+import os
+import json
+import base64
+import queue
+import re
+import threading
+from collections import OrderedDict
+
+from modules.audio_duration import get_duration_ms
+
+# 拡張子 → MIMEタイプ
+AUDIO_MIME_TYPES = {
+    'wav': 'audio/wav',
+    'mp3': 'audio/mpeg',
+    'ogg': 'audio/ogg',
+    'webm': 'audio/webm',
+    'm4a': 'audio/mp4',
+    'aac': 'audio/aac',
+    'flac': 'audio/flac'
+}
+
+# キャッシュキー（md5の16進表記）の形式
+AUDIO_KEY_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class AudioMemoryCache:
+    """スレッドセーフなバイト上限付きLRUキャッシュ（メモリ）
+
+    音声は生バイトで保持し、Base64はインライン送信で必要になった時に
+    1回だけエンコードして保持する（Base64分も上限に含める）。
+    再生時間もヘッダーから1回だけ求めて音声と一緒に保持する。
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        # cache_key -> [audio_content, ext, base64文字列 or None, 再生時間(ms) or None]。先頭が最も古い
+        self.entries = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'rejected': 0, 'encodes': 0}
+
+    @staticmethod
+    def _entry_size(entry):
+        return len(entry[0]) + (len(entry[2]) if entry[2] else 0)
+
+    def _evict(self):
+        """バイト上限を超えた分を最も長く使われていない順に削除（ロック保持中に呼ぶ）"""
+        while self.total_bytes > self.max_bytes and self.entries:
+            _, entry = self.entries.popitem(last=False)
+            self.total_bytes -= self._entry_size(entry)
+            self.stats['evictions'] += 1
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.entries
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
+
+    def get(self, key):
+        """Returns: (audio_content, ext) or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0], entry[1]
+
+    def peek(self, key):
+        """統計・LRU順序を更新せずに取得
+        Returns: (audio_content, ext) or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            return (entry[0], entry[1]) if entry else None
+
+    def get_base64(self, key):
+        """Base64文字列を取得（初回のみエンコード）
+        Returns: str or None
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] is not None:
+                return entry[2]
+            audio_content = entry[0]
+
+        encoded = base64.b64encode(audio_content).decode('utf-8')
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[2] is None and entry[0] is audio_content:
+                entry[2] = encoded
+                self.entries.move_to_end(key)
+                self.total_bytes += len(encoded)
+                self.stats['encodes'] += 1
+                self._evict()
+        return encoded
+
+    def get_duration_ms(self, key):
+        """再生時間（ミリ秒）を取得（初回のみヘッダーを解析）
+        Returns: int or None（キャッシュに無い・解析できない場合）
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[3] is not None:
+                return entry[3]
+            audio_content, ext = entry[0], entry[1]
+
+        duration_ms = get_duration_ms(audio_content, ext)
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] is audio_content:
+                entry[3] = duration_ms
+        return duration_ms
+
+    def put(self, key, audio_content, ext):
+        size = len(audio_content)
+        with self.lock:
+            if size > self.max_bytes:
+                self.stats['rejected'] += 1
+                return False
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.total_bytes -= self._entry_size(old)
+            self.entries[key] = [audio_content, ext, None, None]
+            self.total_bytes += size
+            self._evict()
+        return True
+
+    def get_stats(self):
+        with self.lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else 0,
+                **self.stats
+            }
+
+
+class AudioStore:
+    """コンテンツアドレス型の音声ストア（バイト上限付きLRU）
+
+    音声は ``<root>/<cache_key>.<ext>`` として保存される。
+    LRU順序はファイルの更新時刻で永続化するため、再起動後も維持される。
+    """
+
+    def __init__(self, root_dir, max_bytes=200 * 1024 * 1024):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        # cache_key -> (拡張子, バイト数)。先頭が最も古い
+        self.index = OrderedDict()
+        self.stats = {'hits': 0, 'misses': 0, 'writes': 0, 'evictions': 0}
+        # 書き込み待ちの音声（バックグラウンドで書き込む）: cache_key -> (audio_content, ext)
+        self.pending = {}
+        self.write_queue = queue.Queue()
+        self.writer_thread = None
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self):
+        """既存ファイルを更新時刻順に読み込む"""
+        entries = []
+        for filename in os.listdir(self.root_dir):
+            key, _, ext = filename.partition('.')
+            if not AUDIO_KEY_PATTERN.match(key) or ext not in AUDIO_MIME_TYPES:
+                continue
+            path = os.path.join(self.root_dir, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, key, ext, stat.st_size))
+
+        for _, key, ext, size in sorted(entries):
+            self.index[key] = (ext, size)
+            self.total_bytes += size
+
+        self._evict()
+        print(f"💽 音声ストア読み込み: {len(self.index)} 件, {self.total_bytes} バイト ({self.root_dir})")
+
+    def _path(self, key, ext):
+        return os.path.join(self.root_dir, f"{key}.{ext}")
+
+    def _evict(self):
+        """バイト上限を超えた分を古い順に削除（ロック保持中に呼ぶ）"""
+        while self.total_bytes > self.max_bytes and self.index:
+            key, (ext, size) = self.index.popitem(last=False)
+            self.total_bytes -= size
+            self.stats['evictions'] += 1
+            try:
+                os.unlink(self._path(key, ext))
+            except OSError:
+                pass
+
+    def _touch(self, key, ext):
+        """LRU順序を更新（ロック保持中に呼ぶ）"""
+        self.index.move_to_end(key)
+        try:
+            os.utime(self._path(key, ext))
+        except OSError:
+            pass
+
+    def contains(self, key):
+        with self.lock:
+            return key in self.index or key in self.pending
+
+    def get(self, key):
+        """音声を取得（ファイルの読み込みはロックの外で行う）
+        Returns: (audio_content, ext) or None
+        """
+        with self.lock:
+            if key in self.pending:
+                self.stats['hits'] += 1
+                return self.pending[key]
+            entry = self.index.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            ext, _ = entry
+            self._touch(key, ext)
+        try:
+            with open(self._path(key, ext), 'rb') as f:
+                audio_content = f.read()
+        except OSError:
+            # ファイルが外部から消された場合（読み込み中に上書き・削除されたエントリは残す）
+            with self.lock:
+                if self.index.get(key) is entry:
+                    self.index.pop(key)
+                    self.total_bytes -= entry[1]
+                self.stats['misses'] += 1
+            return None
+        with self.lock:
+            self.stats['hits'] += 1
+        return audio_content, ext
+
+    def get_path(self, key):
+        """HTTP配信用にファイルパスを取得（書き込み待ちの場合は None）
+        Returns: (path, ext) or None
+        """
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            ext, _ = entry
+            self._touch(key, ext)
+            return self._path(key, ext), ext
+
+    def put(self, key, audio_content, ext):
+        """音声を保存（一時ファイル経由でアトミックに書き込む）"""
+        if not AUDIO_KEY_PATTERN.match(key) or ext not in AUDIO_MIME_TYPES:
+            raise ValueError(f"不正な音声キー/形式: {key}.{ext}")
+        size = len(audio_content)
+        if size > self.max_bytes:
+            return False
+
+        path = self._path(key, ext)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(audio_content)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            old = self.index.pop(key, None)
+            if old is not None:
+                self.total_bytes -= old[1]
+                if old[0] != ext:
+                    try:
+                        os.unlink(self._path(key, old[0]))
+                    except OSError:
+                        pass
+            self.index[key] = (ext, size)
+            self.total_bytes += size
+            self.stats['writes'] += 1
+            self._evict()
+        return True
+
+    def put_async(self, key, audio_content, ext):
+        """リクエスト処理を止めないよう、書き込みをバックグラウンドで行う"""
+        if not AUDIO_KEY_PATTERN.match(key) or ext not in AUDIO_MIME_TYPES:
+            raise ValueError(f"不正な音声キー/形式: {key}.{ext}")
+        item = (audio_content, ext)
+        with self.lock:
+            self.pending[key] = item
+            if self.writer_thread is None:
+                self.writer_thread = threading.Thread(target=self._writer_loop, daemon=True)
+                self.writer_thread.start()
+        # 同じキーの書き込みが重なった場合に区別できるよう、内容のオブジェクトごとキューに入れる
+        self.write_queue.put((key, item))
+
+    def _writer_loop(self):
+        while True:
+            key, item = self.write_queue.get()
+            with self.lock:
+                # より新しい内容が書き込み待ちなら、そちらの書き込みに任せる
+                if self.pending.get(key) is not item:
+                    continue
+            try:
+                self.put(key, item[0], item[1])
+            except Exception as e:
+                print(f"⚠️ 音声ストア書き込みエラー: {e}")
+            finally:
+                with self.lock:
+                    # 書き込み中に新しい内容が登録された場合は残す
+                    if self.pending.get(key) is item:
+                        del self.pending[key]
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.index),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'pending_writes': len(self.pending),
+                **self.stats
+            }
+
+
+class AudioPack:
+    """事前合成した定型セリフの音声パック（起動時にメモリへ読み込む）
+
+    ``<root>/manifest.json`` にキャッシュキーとファイル名・元テキストを記録する。
+    パックの音声は削除対象にならない。
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self.manifest = {}
+        self.clips = {}
+
+    def _manifest_path(self):
+        return os.path.join(self.root_dir, self.MANIFEST_NAME)
+
+    def load(self):
+        """マニフェストと音声を読み込む"""
+        manifest_path = self._manifest_path()
+        if not os.path.exists(manifest_path):
+            print(f"ℹ️ 音声パックが見つかりません: {manifest_path}")
+            return 0
+
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f).get('entries', {})
+
+        total_bytes = 0
+        for key, entry in self.manifest.items():
+            try:
+                with open(os.path.join(self.root_dir, entry['file']), 'rb') as f:
+                    audio_content = f.read()
+            except OSError as e:
+                print(f"⚠️ 音声パックの読み込みに失敗: {entry['file']} ({e})")
+                continue
+            self.clips[key] = (audio_content, entry['file'].rsplit('.', 1)[-1])
+            total_bytes += len(audio_content)
+
+        print(f"📦 音声パック読み込み: {len(self.clips)} 件, {total_bytes} バイト ({self.root_dir})")
+        return len(self.clips)
+
+    def contains(self, key):
+        return key in self.clips
+
+    def get(self, key):
+        """Returns: (audio_content, ext) or None"""
+        return self.clips.get(key)
+
+    def get_path(self, key):
+        """Returns: (path, ext) or None"""
+        entry = self.manifest.get(key)
+        if entry is None or key not in self.clips:
+            return None
+        return os.path.join(self.root_dir, entry['file']), self.clips[key][1]
+
+    def add(self, key, audio_content, ext, **meta):
+        """音声をパックに追加（save() でマニフェストを書き出す）"""
+        if not AUDIO_KEY_PATTERN.match(key) or ext not in AUDIO_MIME_TYPES:
+            raise ValueError(f"不正な音声キー/形式: {key}.{ext}")
+        os.makedirs(self.root_dir, exist_ok=True)
+        filename = f"{key}.{ext}"
+        with open(os.path.join(self.root_dir, filename), 'wb') as f:
+            f.write(audio_content)
+        self.manifest[key] = {'file': filename, **meta}
+        self.clips[key] = (audio_content, ext)
+
+    def save(self):
+        """マニフェストを書き出し、参照されなくなったパックの音声を削除"""
+        os.makedirs(self.root_dir, exist_ok=True)
+        with open(self._manifest_path(), 'w', encoding='utf-8') as f:
+            json.dump({'version': 1, 'entries': self.manifest}, f, ensure_ascii=False, indent=2)
+
+        # パックの音声（<キャッシュキー>.<音声の拡張子> の通常ファイル）のみ削除対象にする
+        # （AUDIO_PACK_DIR に他のファイル・ディレクトリがあっても消さない）
+        referenced = {entry['file'] for entry in self.manifest.values()}
+        for filename in os.listdir(self.root_dir):
+            if filename in referenced:
+                continue
+            key, _, ext = filename.partition('.')
+            path = os.path.join(self.root_dir, filename)
+            if AUDIO_KEY_PATTERN.match(key) and ext in AUDIO_MIME_TYPES and os.path.isfile(path):
+                os.unlink(path)
+
+    def get_stats(self):
+        return {
+            'entries': len(self.clips),
+            'bytes': sum(len(audio_content) for audio_content, _ in self.clips.values())
+        }
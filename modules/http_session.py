@@ -0,0 +1,92 @@
+# http_session.py - 音声合成APIとのKeep-Alive接続プール
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class PooledHTTPSession:
+    """スレッド間で接続プールを共有するHTTPセッション
+
+    requests.Session はスレッドごとに作成し（Cookie等の状態を共有しない）、
+    urllib3の接続プールを持つ HTTPAdapter だけを全スレッドで共有する。
+    これにより、合成のたびにTCP+TLS接続を張り直さずに済む。
+    """
+
+    def __init__(self, pool_maxsize=4, pool_connections=4, connect_timeout=3.05, read_timeout=20):
+        self.pool_maxsize = pool_maxsize
+        self.timeout = (connect_timeout, read_timeout)
+        self.adapter = HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=0
+        )
+        self.local = threading.local()
+
+    def _get_session(self):
+        session = getattr(self.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', self.adapter)
+            session.mount('http://', self.adapter)
+            self.local.session = session
+        return session
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return self._get_session().request(method, url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def prewarm(self, url, headers=None, connections=1):
+        """接続を事前に確立してプールに入れておく（起動直後の初回合成を速くする）
+
+        Returns: 成功した接続数
+        """
+        def warm(_):
+            try:
+                response = self.get(url, headers=headers)
+                response.close()
+                return True
+            except requests.RequestException as e:
+                print(f"⚠️ 接続プリウォーム失敗: {url} ({e})")
+                return False
+
+        connections = max(1, min(connections, self.pool_maxsize))
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            return sum(executor.map(warm, range(connections)))
+
+    def get_stats(self):
+        """ホストごとの接続プール統計
+
+        - requests: プール経由のリクエスト数
+        - new_connections: 新規に張った接続数（プールミス）
+        - reused: 既存接続を再利用したリクエスト数（プールヒット）
+        """
+        pools = self.adapter.poolmanager.pools
+        stats = {}
+        for pool_key in list(pools.keys()):
+            pool = pools.get(pool_key)
+            if pool is None:
+                continue
+            requests_count = pool.num_requests
+            new_connections = pool.num_connections
+            stats[f"{pool.scheme}://{pool.host}:{pool.port}"] = {
+                'requests': requests_count,
+                'new_connections': new_connections,
+                'reused': max(0, requests_count - new_connections),
+                'idle_connections': pool.pool.qsize() if pool.pool else 0
+            }
+
+        return {
+            'pool_maxsize': self.pool_maxsize,
+            'timeout': {'connect': self.timeout[0], 'read': self.timeout[1]},
+            'hosts': stats,
+            'hits': sum(host['reused'] for host in stats.values()),
+            'misses': sum(host['new_connections'] for host in stats.values())
+        }
@@ -0,0 +1,125 @@
+# lipsync.py - 音声からリップシンク用の口の開き具合（RMSエンベロープ）を計算
+import io
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.io import wavfile
+
+FFMPEG_PATH = shutil.which('ffmpeg')
+
+# 圧縮形式をデコードする際のサンプリング周波数（口の動きには十分）
+DECODE_SAMPLE_RATE = 16000
+
+
+def decode_to_mono(audio_content, ext):
+    """音声をモノラルのfloat32配列（-1.0〜1.0）に変換
+
+    WAVはそのまま読み込み、それ以外はFFmpegでPCMにデコードする。
+    Returns: (samples, sample_rate) or None
+    """
+    if ext == 'wav':
+        try:
+            sample_rate, data = wavfile.read(io.BytesIO(audio_content))
+        except ValueError:
+            return None
+        if data.dtype.kind == 'i':
+            samples = data.astype(np.float32) / float(np.iinfo(data.dtype).max)
+        elif data.dtype.kind == 'u':
+            samples = (data.astype(np.float32) - 128.0) / 128.0
+        else:
+            samples = data.astype(np.float32)
+    else:
+        if not FFMPEG_PATH:
+            return None
+        try:
+            result = subprocess.run(
+                [FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0',
+                 '-f', 's16le', '-ac', '1', '-ar', str(DECODE_SAMPLE_RATE), 'pipe:1'],
+                input=audio_content, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=10
+            )
+        except (subprocess.SubprocessError, OSError):
+            return None
+        if result.returncode != 0 or not result.stdout:
+            return None
+        sample_rate = DECODE_SAMPLE_RATE
+        samples = np.frombuffer(result.stdout, dtype='<i2').astype(np.float32) / 32767.0
+
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    return samples, sample_rate
+
+
+def compute_envelope(samples, sample_rate, frame_ms=40, dynamic_range_db=40):
+    """フレームごとのRMSを口の開き具合（0〜100の整数）に変換
+
+    RMSをdB化し、発話の大きい部分（95パーセンタイル）を100、
+    そこから dynamic_range_db 下を0として正規化する。
+    """
+    frame_size = max(1, int(sample_rate * frame_ms / 1000))
+    frame_count = int(np.ceil(len(samples) / frame_size))
+    if frame_count == 0:
+        return []
+
+    padded = np.zeros(frame_count * frame_size, dtype=np.float32)
+    padded[:len(samples)] = samples
+    rms = np.sqrt(np.mean(padded.reshape(frame_count, frame_size) ** 2, axis=1))
+    level_db = 20 * np.log10(rms + 1e-9)
+
+    ceiling = np.percentile(level_db, 95)
+    floor = ceiling - dynamic_range_db
+    openness = np.clip((level_db - floor) / dynamic_range_db, 0.0, 1.0)
+    return np.round(openness * 100).astype(np.int16).tolist()
+
+
+def build_lipsync(audio_content, ext, frame_ms=40):
+    """リップシンク情報を生成
+
+    Returns: {'frameMs', 'durationMs', 'values'} or None（デコードできない場合）
+    """
+    decoded = decode_to_mono(audio_content, ext)
+    if decoded is None:
+        return None
+    samples, sample_rate = decoded
+    return {
+        'frameMs': frame_ms,
+        'durationMs': int(round(len(samples) * 1000 / sample_rate)),
+        'values': compute_envelope(samples, sample_rate, frame_ms)
+    }
+
+
+class LipSyncCache:
+    """音声キャッシュキー → リップシンク情報（件数上限付きLRU）"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'computed': 0, 'failed': 0}
+
+    def get(self, key):
+        with self.lock:
+            envelope = self.entries.get(key)
+            if envelope is None:
+                self.stats['misses'] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return envelope
+
+    def put(self, key, envelope):
+        with self.lock:
+            self.entries[key] = envelope
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'ffmpeg': bool(FFMPEG_PATH), **self.stats}
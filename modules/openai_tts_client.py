@@ -3,29 +3,76 @@ import os
 import base64
 from openai import OpenAI
 
-class OpenAITTSClient:
-    def __init__(self):
-        self.client = OpenAI()
-        
-        # かわいい女性の声を固定で使用
-        self.voice = "nova"  # 明るく元気な女性の声
-        self.speed = 1.15   # 少し速めで若々しい印象
-    
+from modules.tts_engines import TTSEngine
+
+# OpenAI TTSの出力形式 → 保存時の拡張子（opus はOggコンテナ、aac はADTS）
+OPENAI_TTS_AUDIO_EXTS = {'mp3': 'mp3', 'opus': 'ogg', 'aac': 'aac', 'flac': 'flac', 'wav': 'wav'}
+
+# generate_audio（従来の呼び出し口）の声・モデル。エンジンとしての設定とは別に、従来の音声を維持する
+LEGACY_MODEL = "tts-1-hd"  # 高品質モデル
+LEGACY_VOICE = "nova"      # 明るく元気な女性の声
+LEGACY_SPEED = 1.15        # 少し速めで若々しい印象
+
+class OpenAITTSClient(TTSEngine):
+    """OpenAI TTS（全言語対応。感情による声の変化なし）"""
+
+    name = 'openai_tts'
+
+    def __init__(self, client=None, model="tts-1", voices=None, default_voice="alloy",
+                 response_format="mp3", speed=1.0):
+        # 再試行は呼び出し側（tts_scheduler）が行うため、SDK側の自動再試行は無効にする
+        self.client = (client or OpenAI()).with_options(max_retries=0)
+        self.model = model
+        # 言語ごとの声（未指定の言語は default_voice）
+        self.voices = voices or {'en': 'nova'}
+        self.default_voice = default_voice
+        self.speed = speed
+        if response_format not in OPENAI_TTS_AUDIO_EXTS:
+            print(f"⚠️ 未対応のOpenAI TTS出力形式: {response_format} → mp3")
+            response_format = 'mp3'
+        self.response_format = response_format
+
+    @property
+    def audio_ext(self):
+        return OPENAI_TTS_AUDIO_EXTS[self.response_format]
+
+    def synthesize(self, text, language, emotion='neutral'):
+        """Returns: (audio_content, ext)"""
+        print(f"🎤 OpenAI TTSで音声生成中... (言語: {language})")
+        response = self.client.audio.speech.create(
+            model=self.model,
+            voice=self.voices.get(language, self.default_voice),
+            input=text,
+            response_format=self.response_format,
+            speed=self.speed
+        )
+        print(f"✅ OpenAI TTS音声生成成功 ({self.response_format})")
+        return response.content, self.audio_ext
+
+    def probe(self):
+        """モデル情報の取得で死活確認（音声は合成しない）"""
+        self.client.with_options(timeout=5).models.retrieve(self.model)
+        return True
+
+    def describe(self):
+        return {'audio_ext': self.audio_ext, 'model': self.model, 'response_format': self.response_format}
+
     def generate_audio(self, text, voice=None, emotion_params=None):
-        """テキストから音声を生成"""
+        """テキストから音声を生成（data URL）
+        従来どおり常に同じ声（LEGACY_*）・MP3で生成する（感情による変化なし）
+        """
         try:
-            # 常に同じ声を使用（感情による変化なし）
             response = self.client.audio.speech.create(
-                model="tts-1-hd",  # 高品質モデル
-                voice=self.voice,
+                model=LEGACY_MODEL,
+                voice=LEGACY_VOICE,
                 input=text,
-                speed=self.speed
+                speed=LEGACY_SPEED
             )
-            
+
             # 音声データをBase64エンコード
             audio_data = base64.b64encode(response.content).decode('utf-8')
             return f"data:audio/mp3;base64,{audio_data}"
-            
+
         except Exception as e:
             print(f"音声生成中にエラーが発生しました: {e}")
-            return None
\ No newline at end of file
+            return None
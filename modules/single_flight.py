@@ -0,0 +1,71 @@
+# single_flight.py - 同一キーの同時リクエストを1回の処理にまとめる
+import threading
+
+
+class _Flight:
+    """実行中の1回分の処理"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """同じキーの処理が実行中なら、後続の呼び出しはその完了を待って結果を共有する
+
+    例: 展示開始直後に多数の端末が同時接続し、同じ挨拶音声を一斉に要求した場合でも
+    音声合成APIの呼び出しは1回で済む。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.stats = {'calls': 0, 'executed': 0, 'coalesced': 0, 'errors': 0}
+
+    def do(self, key, fn):
+        """key ごとに fn を1回だけ実行し、同時に呼んだ全員に同じ結果を返す
+
+        Returns: (result, shared) - shared は他の呼び出しの結果を共有した場合 True
+        Raises: fn が送出した例外（待っていた呼び出しにも同じ例外を送出）
+        """
+        with self.lock:
+            self.stats['calls'] += 1
+            flight = self.flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.stats['coalesced'] += 1
+                leader = False
+            else:
+                flight = _Flight()
+                self.flights[key] = flight
+                self.stats['executed'] += 1
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = fn()
+        except Exception as e:
+            flight.error = e
+            with self.lock:
+                self.stats['errors'] += 1
+            raise
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+            flight.done.set()
+        return flight.result, False
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                'in_flight': len(self.flights),
+                'waiting': sum(flight.waiters for flight in self.flights.values()),
+                **self.stats
+            }
@@ -1,38 +1,310 @@
 # speech_processor.py - 音声認識処理モジュール（Python 3.13対応版）
 import os
 import base64
-import tempfile
 import wave
 import io
-import subprocess
+import threading
 from openai import OpenAI
 
-# FFmpegのパスを確認
-def find_ffmpeg():
-    try:
-        # ffmpegコマンドの存在を確認
-        subprocess.run(['ffmpeg', '-version'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return True
-    except (subprocess.SubprocessError, FileNotFoundError):
-        print("⚠️ FFmpegが見つかりません。PATH環境変数にFFmpegのbinディレクトリが含まれているか確認してください。")
-        return False
+from modules.audio_duration import get_duration_ms, wav_duration_ms
+from modules.audio_decoder import FFMPEG_PATH, AV_AVAILABLE, DecodeError, SpawnFFmpegDecoder, StreamingFFmpegDecoder, create_decoder
+
+# アップロード音声の上限（バイト）と、デコードのタイムアウト（秒）・最大の長さ（秒）
+MAX_AUDIO_BYTES = int(float(os.getenv('SPEECH_MAX_AUDIO_MB', '10')) * 1024 * 1024)
+FFMPEG_TIMEOUT = float(os.getenv('SPEECH_FFMPEG_TIMEOUT', '15'))
+MAX_AUDIO_SECONDS = float(os.getenv('SPEECH_MAX_SECONDS', '60'))
+# Whisper APIが受け付ける形式はそのまま送る（false なら常にWAVに変換）
+SPEECH_PASSTHROUGH = os.getenv('SPEECH_PASSTHROUGH', 'true').lower() == 'true'
+# Whisper APIのアップロード上限
+WHISPER_MAX_BYTES = 25 * 1024 * 1024
+# デコードのバックエンド: auto / pyav（プロセス内）/ pool（起動済みFFmpeg）/ spawn（都度起動）
+SPEECH_DECODER = os.getenv('SPEECH_DECODER', 'auto').lower()
+SPEECH_DECODER_POOL_SIZE = int(os.getenv('SPEECH_DECODER_POOL_SIZE', '2'))
+# ストリーミングアップロードで、録音終了後に未着の断片を待つ最大秒数
+SPEECH_STREAM_CHUNK_WAIT = float(os.getenv('SPEECH_STREAM_CHUNK_WAIT', '5'))
+
+# data: URL のMIMEタイプ → 拡張子
+MIME_TO_FORMAT = {
+    'audio/webm': 'webm',
+    'video/webm': 'webm',
+    'audio/ogg': 'ogg',
+    'audio/wav': 'wav',
+    'audio/wave': 'wav',
+    'audio/x-wav': 'wav',
+    'audio/mpeg': 'mp3',
+    'audio/mp3': 'mp3',
+    'audio/mp4': 'mp4',
+    'audio/x-m4a': 'm4a',
+    'audio/aac': 'aac',
+    'audio/flac': 'flac'
+}
+
+# FFmpegのパスを確認（プロセスは起動しない）
+FFMPEG_AVAILABLE = FFMPEG_PATH is not None
+if not FFMPEG_AVAILABLE:
+    print("⚠️ FFmpegが見つかりません。PATH環境変数にFFmpegのbinディレクトリが含まれているか確認してください。")
+
+
+def sniff_audio_format(audio_data, mime_type=None):
+    """先頭のマジックバイトからコンテナ形式を判定（判定できなければ data: URL のMIMEタイプ）
+    Returns: 'webm' / 'ogg' / 'wav' / 'mp3' / 'flac' / 'mp4' / 'aac' など or None
+    """
+    head = audio_data[:64]
+    if head[:4] == b'\x1a\x45\xdf\xa3':
+        # EBML（WebM / Matroska）。Matroska はWhisper APIが受け付けないため変換する
+        return 'webm' if b'webm' in audio_data[:64] else 'mkv'
+    if head[:4] == b'OggS':
+        return 'ogg'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'wav'
+    if head[:4] == b'fLaC':
+        return 'flac'
+    if head[4:8] == b'ftyp':
+        return 'm4a' if head[8:11] == b'M4A' else 'mp4'
+    if head[:3] == b'ID3':
+        return 'mp3'
+    if len(head) >= 2 and head[0] == 0xFF:
+        if (head[1] & 0xF6) == 0xF0:
+            return 'aac'
+        if (head[1] & 0xE0) == 0xE0:
+            return 'mp3'
+    if mime_type:
+        return MIME_TO_FORMAT.get(mime_type.split(';')[0].strip().lower())
+    return None
+
+
+class AudioTooLargeError(ValueError):
+    """アップロード音声がサイズ上限を超えている"""
+
+
+class DecoderUnavailableError(DecodeError):
+    """変換が必要な形式だが、FFmpeg・PyAVのどちらも無い"""
+
+
+# 変換が必要な音声を受け取ったが、デコーダーが無い場合の応答
+DECODER_UNAVAILABLE_MESSAGE = "音声認識機能は現在利用できません。FFmpegをインストールしてください。テキストで入力してください。"
+
+
+class AudioUploadStream:
+    """録音中に分割して届く音声（audio_chunk）をセッションごとに組み立てる
+
+    Socket.IOのイベントは別スレッドで処理され順不同で届くことがあるため、
+    連番（seq）で並べ直してから連結する。decoder があれば届いた順にデコードも進める。
+    """
+
+    def __init__(self, stream_id, mime_type=None, decoder=None, max_bytes=MAX_AUDIO_BYTES):
+        self.stream_id = stream_id
+        self.mime_type = mime_type
+        self.decoder = decoder
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.pending = {}
+        self.next_seq = 0
+        self.rejected = False
+        # audio_end を受信済み（音声認識の完了待ち）
+        self.closing = False
+        self.finished = False
+        self.cond = threading.Condition()
+
+    def append(self, seq, data):
+        """断片を追加（上限を超えたら AudioTooLargeError）"""
+        with self.cond:
+            if self.rejected or self.finished or seq < self.next_seq or seq in self.pending:
+                return
+            self.pending[seq] = bytes(data)
+            while self.next_seq in self.pending:
+                chunk = self.pending.pop(self.next_seq)
+                if len(self.buffer) + len(chunk) > self.max_bytes:
+                    # 以降の断片は無視する（エラーの通知は1回だけ）
+                    self.rejected = True
+                    self.pending.clear()
+                    self.abort()
+                    raise AudioTooLargeError(f"音声データが大きすぎます: {len(self.buffer) + len(chunk)} バイト (上限 {self.max_bytes})")
+                self.buffer.extend(chunk)
+                if self.decoder:
+                    self.decoder.feed(chunk)
+                self.next_seq += 1
+            self.cond.notify_all()
+
+    def finish(self, total_chunks, timeout=SPEECH_STREAM_CHUNK_WAIT):
+        """全ての断片が揃うまで待って、録音全体のバイト列とデコード済みのWAV（あれば）を返す
+        Returns: (audio_data, wav_data or None)
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: self.next_seq >= total_chunks, timeout=timeout)
+            if self.next_seq < total_chunks:
+                print(f"⚠️ 音声の断片が揃いませんでした: {self.next_seq}/{total_chunks}")
+            # 以降に届いた断片は無視する（デコーダーの入力はこの後閉じる）
+            self.finished = True
+            audio_data = bytes(self.buffer)
+        wav_data = None
+        if self.decoder:
+            try:
+                wav_data = self.decoder.finish()
+            except DecodeError as e:
+                print(f"⚠️ ストリーミング変換失敗（まとめて変換し直します）: {e}")
+        return audio_data, wav_data
+
+    def abort(self):
+        if self.decoder:
+            self.decoder.abort()
 
-FFMPEG_AVAILABLE = find_ffmpeg()
 
 class SpeechProcessor:
     def __init__(self):
         self.client = OpenAI()
-        self.supported_formats = ['webm', 'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'wav', 'ogg']
-        self.ffmpeg_available = FFMPEG_AVAILABLE
-        print(f"🎤 SpeechProcessor初期化完了 (FFmpeg利用可能: {self.ffmpeg_available})")
+        # Whisper APIがそのまま受け付ける形式
+        self.supported_formats = ['webm', 'mp3', 'mp4', 'mpeg', 'mpga', 'm4a', 'wav', 'ogg', 'flac']
+        self.ffmpeg_available = FFMPEG_AVAILABLE or AV_AVAILABLE
+        # 音声認識用のデコーダー（16kHzモノラルのWAVに変換）
+        self.decoder = create_decoder(
+            SPEECH_DECODER, sample_rate=16000, max_seconds=MAX_AUDIO_SECONDS,
+            timeout=FFMPEG_TIMEOUT, pool_size=SPEECH_DECODER_POOL_SIZE
+        )
+        # 経路ごとの件数とバイト数（passthrough: そのまま送信 / transcoded: WAVに変換）
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            'passthrough': 0, 'transcoded': 0,
+            'passthrough_bytes': 0, 'transcoded_bytes_in': 0, 'transcoded_bytes_out': 0,
+            'formats': {}
+        }
+        print(f"🎤 SpeechProcessor初期化完了 (FFmpeg利用可能: {FFMPEG_AVAILABLE}, デコーダー: {self.decoder.name})")
+    
+    def _record_path(self, path, audio_format, bytes_in, bytes_out=0):
+        with self.stats_lock:
+            self.stats[path] += 1
+            formats = self.stats['formats']
+            formats[audio_format or 'unknown'] = formats.get(audio_format or 'unknown', 0) + 1
+            if path == 'passthrough':
+                self.stats['passthrough_bytes'] += bytes_in
+            else:
+                self.stats['transcoded_bytes_in'] += bytes_in
+                self.stats['transcoded_bytes_out'] += bytes_out
+    
+    def get_stats(self):
+        """経路ごとの件数・バイト数と、そのまま送ったことで削減できた推定バイト数
+        （変換した音声のWAV/元データのサイズ比から推定）
+        """
+        with self.stats_lock:
+            stats = {**self.stats, 'formats': dict(self.stats['formats'])}
+        ratio = stats['transcoded_bytes_out'] / stats['transcoded_bytes_in'] if stats['transcoded_bytes_in'] else None
+        stats['bytes_saved_estimate'] = int(stats['passthrough_bytes'] * (ratio - 1)) if ratio and ratio > 1 else None
+        stats['passthrough_enabled'] = SPEECH_PASSTHROUGH
+        stats['decoder'] = self.decoder.get_stats()
+        return stats
+    
+    def convert_to_wav(self, audio_data):
+        """16kHzモノラルのWAVに変換（一時ファイルなし）
+        Raises: AudioTooLargeError（上限超過）, DecodeError（変換失敗・タイムアウト）
+        """
+        if len(audio_data) > MAX_AUDIO_BYTES:
+            raise AudioTooLargeError(f"音声データが大きすぎます: {len(audio_data)} バイト (上限 {MAX_AUDIO_BYTES})")
+        return self.decoder.decode_to_wav(audio_data)
+    
+    def needs_transcode(self, mime_type):
+        """MIMEタイプから、Whisper APIに送る前にWAVへの変換が必要か判定"""
+        audio_format = MIME_TO_FORMAT.get((mime_type or '').split(';')[0].strip().lower())
+        return not (SPEECH_PASSTHROUGH and audio_format in self.supported_formats)
+    
+    def open_stream(self, stream_id, mime_type=None):
+        """ストリーミングアップロードを開始
+        変換が必要な形式なら、録音中からFFmpegでデコードを進める
+        ※ SPEECH_PASSTHROUGH=true（既定）では、ブラウザの録音形式（WebM/Ogg/MP4）は変換不要のため
+          断片を連結するだけで、逐次変換は SPEECH_PASSTHROUGH=false または未対応の形式の場合のみ
+        """
+        decoder = None
+        if self.needs_transcode(mime_type) and FFMPEG_PATH:
+            try:
+                command = SpawnFFmpegDecoder(sample_rate=16000, max_seconds=MAX_AUDIO_SECONDS)._command()
+                decoder = StreamingFFmpegDecoder(command, timeout=FFMPEG_TIMEOUT)
+            except OSError as e:
+                print(f"⚠️ ストリーミング変換を開始できません: {e}")
+        return AudioUploadStream(stream_id, mime_type, decoder)
+    
+    def transcribe_stream(self, stream, total_chunks, language='ja'):
+        """ストリーミングアップロードされた音声をテキストに変換（録音終了後はWhisper APIの呼び出しのみ）"""
+        try:
+            audio_data, wav_data = stream.finish(total_chunks)
+            if not audio_data:
+                print("❌ 音声データが空です")
+                return None
+            print(f"🎤 音声認識開始 (ストリーミング, {len(audio_data)} バイト, 言語: {language})")
+            return self._transcribe_file(self.prepare_upload(audio_data, stream.mime_type, wav_data), language)
+        except AudioTooLargeError as e:
+            print(f"❌ {e}")
+            return None
+        except DecoderUnavailableError as e:
+            print(f"⚠️ FFmpegが利用できないため、音声処理ができません: {e}")
+            return DECODER_UNAVAILABLE_MESSAGE
+        except DecodeError as e:
+            print(f"❌ 音声変換エラー: {e}")
+            return "音声の変換に失敗しました。FFmpegの設定を確認してください。"
+        except Exception as e:
+            print(f"❌ 音声認識エラー: {type(e).__name__}: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+    
+    def _transcribe_file(self, audio_file, language):
+        """OpenAI Whisper APIで音声認識"""
+        print("🔄 Whisper APIに送信中...")
+        
+        transcript = self.client.audio.transcriptions.create(
+            model="whisper-1",
+            file=audio_file,
+            language=language,
+            response_format="text",
+            prompt="京友禅、のりおき、職人、染色、着物"  # ドメイン特有の単語をヒントとして提供
+        )
+        
+        # Whisper APIはテキストを直接返す
+        text = transcript.strip() if isinstance(transcript, str) else str(transcript).strip()
+        
+        print(f"✅ 音声認識成功: '{text}'")
+        
+        # 空の結果チェック
+        if not text or text == "":
+            print("⚠️ 音声認識結果が空です")
+            return None
+        
+        return text
+    
+    def prepare_upload(self, audio_data, mime_type=None, wav_data=None):
+        """Whisper APIに送る音声を用意（対応形式はそのまま、それ以外はWAVに変換）
+        wav_data: 変換済みのWAV（ストリーミングアップロードで録音中にデコードしたもの）
+        Returns: ファイル名付きの BytesIO
+        """
+        if len(audio_data) > MAX_AUDIO_BYTES:
+            raise AudioTooLargeError(f"音声データが大きすぎます: {len(audio_data)} バイト (上限 {MAX_AUDIO_BYTES})")
+        
+        audio_format = sniff_audio_format(audio_data, mime_type)
+        if SPEECH_PASSTHROUGH and audio_format in self.supported_formats and len(audio_data) <= WHISPER_MAX_BYTES:
+            print(f"⏩ 変換せずに送信: {audio_format} ({len(audio_data)} バイト)")
+            self._record_path('passthrough', audio_format, len(audio_data))
+            upload, name = audio_data, f'speech.{audio_format}'
+        elif wav_data:
+            # 録音中にデコード済み（ストリーミングアップロード）
+            self._record_path('transcoded', audio_format, len(audio_data), len(wav_data))
+            upload, name = wav_data, 'speech.wav'
+        else:
+            if not self.ffmpeg_available:
+                raise DecoderUnavailableError(f"{audio_format or '不明な形式'} の変換にはFFmpegが必要です")
+            # WebMなどからWAVに変換（メモリ上で完結）
+            print(f"🔄 WAVに変換中... (形式: {audio_format or '不明'}, デコーダー: {self.decoder.name})")
+            upload = self.convert_to_wav(audio_data)
+            print(f"✅ WAV変換成功: {len(upload)} バイト")
+            self._record_path('transcoded', audio_format, len(audio_data), len(upload))
+            name = 'speech.wav'
+        
+        # ファイル名の拡張子でWhisper APIに形式を判定させる
+        audio_file = io.BytesIO(upload)
+        audio_file.name = name
+        return audio_file
     
     def transcribe_audio(self, audio_base64, language='ja'):
-        """Base64エンコードされた音声データをテキストに変換"""
-        # FFmpegが利用できない場合
-        if not self.ffmpeg_available:
-            print("⚠️ FFmpegが利用できないため、音声処理ができません。")
-            return "音声認識機能は現在利用できません。FFmpegをインストールしてください。テキストで入力してください。"
-            
+        """Base64エンコードされた音声データをテキストに変換
+        Whisper APIが受け付ける形式はFFmpegが無くてもそのまま送る（変換が必要な場合のみデコーダーを使う）
+        """
         try:
             print(f"🎤 音声認識開始 (言語: {language})")
             
@@ -42,11 +314,13 @@ class SpeechProcessor:
                 return None
             
             # データURLスキームの処理
+            mime_type = None
             if audio_base64.startswith('data:'):
                 # data:audio/webm;base64,xxxxx の形式から実際のデータを抽出
                 try:
                     header, data = audio_base64.split(',', 1)
                     audio_base64 = data
+                    mime_type = header[5:].split(';base64')[0]
                     print(f"📊 データURLヘッダー: {header}")
                 except Exception as e:
                     print(f"❌ データURL解析エラー: {e}")
@@ -60,55 +334,18 @@ class SpeechProcessor:
                 print(f"❌ Base64デコードエラー: {e}")
                 return None
             
-            # 一時ファイルを作成して音声データを保存
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_webm:
-                temp_webm.write(audio_data)
-                temp_webm_path = temp_webm.name
-                print(f"📁 一時ファイル作成: {temp_webm_path}")
-            
             try:
-                # WAVファイルとして一時保存するパス
-                temp_wav_path = tempfile.mktemp(suffix='.wav')
-                
-                # FFmpegを使用してWebMからWAVに変換
-                print(f"🔄 FFmpegでWAVに変換中...")
-                subprocess.run([
-                    'ffmpeg', 
-                    '-i', temp_webm_path, 
-                    '-ar', '16000',  # Whisper APIの推奨サンプルレート
-                    '-ac', '1',      # モノラル
-                    '-y',            # 既存ファイルを上書き
-                    temp_wav_path
-                ], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                
-                print(f"✅ WAV変換成功: {temp_wav_path}")
+                audio_file = self.prepare_upload(audio_data, mime_type)
+                return self._transcribe_file(audio_file, language)
                 
-                # OpenAI Whisper APIで音声認識
-                with open(temp_wav_path, 'rb') as audio_file:
-                    print("🔄 Whisper APIに送信中...")
-                    
-                    transcript = self.client.audio.transcriptions.create(
-                        model="whisper-1",
-                        file=audio_file,
-                        language=language,
-                        response_format="text",
-                        prompt="京友禅、のりおき、職人、染色、着物"  # ドメイン特有の単語をヒントとして提供
-                    )
-                    
-                    # Whisper APIはテキストを直接返す
-                    text = transcript.strip() if isinstance(transcript, str) else str(transcript).strip()
-                    
-                    print(f"✅ 音声認識成功: '{text}'")
-                    
-                    # 空の結果チェック
-                    if not text or text == "":
-                        print("⚠️ 音声認識結果が空です")
-                        return None
-                    
-                    return text
-                    
-            except subprocess.SubprocessError as e:
-                print(f"❌ FFmpeg実行エラー: {e}")
+            except AudioTooLargeError as e:
+                print(f"❌ {e}")
+                return None
+            except DecoderUnavailableError as e:
+                print(f"⚠️ FFmpegが利用できないため、音声処理ができません: {e}")
+                return DECODER_UNAVAILABLE_MESSAGE
+            except DecodeError as e:
+                print(f"❌ 音声変換エラー: {e}")
                 return "音声の変換に失敗しました。FFmpegの設定を確認してください。"
             except Exception as e:
                 print(f"❌ 音声処理エラー: {type(e).__name__}: {e}")
@@ -120,18 +357,6 @@ class SpeechProcessor:
                     print(f"API応答: {e.response}")
                 
                 return None
-                
-            finally:
-                # 一時ファイルのクリーンアップ
-                try:
-                    if os.path.exists(temp_webm_path):
-                        os.unlink(temp_webm_path)
-                        print(f"🗑️ 一時ファイル削除: {temp_webm_path}")
-                    if 'temp_wav_path' in locals() and os.path.exists(temp_wav_path):
-                        os.unlink(temp_wav_path)
-                        print(f"🗑️ 一時ファイル削除: {temp_wav_path}")
-                except Exception as e:
-                    print(f"⚠️ 一時ファイル削除エラー: {e}")
                     
         except Exception as e:
             print(f"❌ 音声認識エラー: {type(e).__name__}: {e}")
@@ -141,10 +366,6 @@ class SpeechProcessor:
     
     def validate_audio_data(self, audio_base64):
         """音声データの妥当性を検証"""
-        # FFmpegが利用できない場合
-        if not self.ffmpeg_available:
-            return False
-            
         try:
             # データURLスキームの確認
             if audio_base64.startswith('data:'):
@@ -171,11 +392,7 @@ class SpeechProcessor:
             return False
     
     def get_audio_duration(self, audio_base64):
-        """音声の長さを取得"""
-        # FFmpegが利用できない場合
-        if not self.ffmpeg_available:
-            return 0
-            
+        """音声の長さを取得（秒。SPEECH_MAX_SECONDS で切り詰めない）"""
         try:
             if audio_base64.startswith('data:'):
                 _, data = audio_base64.split(',', 1)
@@ -183,25 +400,15 @@ class SpeechProcessor:
             
             audio_data = base64.b64decode(audio_base64)
             
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.webm') as temp_file:
-                temp_file.write(audio_data)
-                temp_path = temp_file.name
-            
-            try:
-                # FFmpegを使って長さを取得
-                result = subprocess.run([
-                    'ffprobe', 
-                    '-v', 'error', 
-                    '-show_entries', 'format=duration', 
-                    '-of', 'default=noprint_wrappers=1:nokey=1', 
-                    temp_path
-                ], capture_output=True, text=True, check=True)
-                
-                duration = float(result.stdout.strip())
-                return duration
-            finally:
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
+            # ヘッダーから求められる形式（WAV / MP3 / Ogg / FLAC / AAC）はデコードしない
+            duration_ms = get_duration_ms(audio_data, sniff_audio_format(audio_data))
+            if duration_ms is None:
+                # WebMなどは長さの上限なしでWAVに変換してから求める（一時ファイル・ffprobeなし）
+                if not self.ffmpeg_available:
+                    return 0
+                decoder = SpawnFFmpegDecoder(sample_rate=16000, max_seconds=None, timeout=FFMPEG_TIMEOUT)
+                duration_ms = wav_duration_ms(decoder.decode_to_wav(audio_data))
+            return duration_ms / 1000 if duration_ms else 0
                     
         except Exception as e:
             print(f"❌ 音声長さ取得エラー: {e}")
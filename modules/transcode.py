@@ -0,0 +1,70 @@
+# transcode.py - クライアントが再生できる形式への音声変換（FFmpeg）
+import shutil
+import subprocess
+
+FFMPEG_PATH = shutil.which('ffmpeg')
+
+# コーデック名 → (拡張子, FFmpegの出力オプション)
+AUDIO_CODECS = {
+    'opus-ogg': ('ogg', ['-c:a', 'libopus', '-b:a', '32k', '-f', 'ogg']),
+    'opus-webm': ('webm', ['-c:a', 'libopus', '-b:a', '32k', '-f', 'webm']),
+    'aac': ('aac', ['-c:a', 'aac', '-b:a', '64k', '-f', 'adts']),
+    'mp3': ('mp3', ['-c:a', 'libmp3lame', '-b:a', '64k', '-f', 'mp3']),
+    'wav': ('wav', ['-c:a', 'pcm_s16le', '-f', 'wav'])
+}
+
+# 拡張子 → コーデック名（合成音声の元の形式の判定用）
+EXT_TO_CODEC = {
+    'ogg': 'opus-ogg',
+    'webm': 'opus-webm',
+    'aac': 'aac',
+    'mp3': 'mp3',
+    'wav': 'wav'
+}
+
+
+def parse_codecs(value):
+    """クライアントが送ったコーデック一覧（カンマ区切りまたはリスト）を正規化"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(',')
+    return [codec.strip().lower() for codec in value if codec and codec.strip().lower() in AUDIO_CODECS]
+
+
+def negotiate_codec(client_codecs, source_ext, preference):
+    """クライアントに送る形式を決める
+
+    - 元が圧縮形式でクライアントが再生できるなら変換しない（非可逆→非可逆の劣化を避ける）
+    - それ以外は preference の順にクライアントが対応している形式を選ぶ
+    Returns: 変換先のコーデック名 or None（変換不要）
+    """
+    source_codec = EXT_TO_CODEC.get(source_ext)
+    if source_codec and source_codec != 'wav' and source_codec in client_codecs:
+        return None
+    for codec in preference:
+        if codec in client_codecs and codec in AUDIO_CODECS:
+            return None if codec == source_codec else codec
+    return None
+
+
+def transcode(audio_content, codec, timeout=15):
+    """FFmpegで音声を変換（標準入出力のパイプのみ使用）
+
+    Returns: (audio_content, ext) or None（FFmpegが無い・失敗時）
+    """
+    if not FFMPEG_PATH or codec not in AUDIO_CODECS:
+        return None
+    ext, output_args = AUDIO_CODECS[codec]
+    try:
+        result = subprocess.run(
+            [FFMPEG_PATH, '-hide_banner', '-loglevel', 'error', '-i', 'pipe:0', '-vn', *output_args, 'pipe:1'],
+            input=audio_content, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout
+        )
+    except (subprocess.SubprocessError, OSError) as e:
+        print(f"⚠️ 音声変換エラー ({codec}): {e}")
+        return None
+    if result.returncode != 0 or not result.stdout:
+        print(f"⚠️ 音声変換失敗 ({codec}): {result.stderr.decode('utf-8', 'ignore')[:200]}")
+        return None
+    return result.stdout, ext
@@ -0,0 +1,211 @@
+# tts_engines.py - 音声エンジンの共通インターフェース・レジストリ・SLOに基づくエンジン選択
+import threading
+import time
+from collections import deque
+
+from modules.tts_resilience import percentile
+
+
+class TTSEngine:
+    """音声エンジンの共通インターフェース
+
+    各エンジンは name / languages / audio_ext を持ち、
+    synthesize(text, language, emotion) → (audio_content, ext) を実装する。
+    失敗時は例外を送出する（HTTPエラーは TTSProviderError）。
+    """
+
+    name = None
+    # 対応言語（None は全言語）
+    languages = None
+    # 出力形式の拡張子（'wav' / 'mp3' / 'ogg' など）
+    audio_ext = None
+
+    def supports(self, language):
+        return self.languages is None or language in self.languages
+
+    def synthesize(self, text, language, emotion='neutral'):
+        raise NotImplementedError
+
+    def probe(self):
+        """死活確認（音声を合成しない軽いリクエスト）。Returns: True/False"""
+        return self.test_connection()
+
+    def test_connection(self):
+        return True
+
+    def describe(self):
+        """状態表示用の設定情報（認証情報そのものは含めない）"""
+        return {'audio_ext': self.audio_ext}
+
+
+class EngineStats:
+    """エンジンごとの直近のレイテンシ・エラー率（実際の合成）と死活確認の結果"""
+
+    def __init__(self, window_size=50):
+        self.outcomes = deque(maxlen=window_size)   # True=成功, False=失敗
+        self.latencies = deque(maxlen=window_size)  # 成功時のレイテンシ(ms)
+        self.probe_ok = None
+        self.probe_latency_ms = None
+        self.probed_at = None
+        self.counts = {'calls': 0, 'failures': 0, 'probes': 0, 'probe_failures': 0}
+
+    def snapshot(self):
+        return {
+            'window_calls': len(self.outcomes),
+            'error_rate': round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0,
+            'p50_ms': percentile(list(self.latencies), 50),
+            'p95_ms': percentile(list(self.latencies), 95),
+            'probe_ok': self.probe_ok,
+            'probe_latency_ms': self.probe_latency_ms,
+            'probed_at': self.probed_at,
+            **self.counts
+        }
+
+
+class SLOPolicy:
+    """SLO（p95レイテンシ・エラー率）を満たすエンジンを優先順に選ぶ
+
+    - SLOを満たすエンジン（計測数が min_calls 未満なら満たすとみなす）を登録順に並べる
+    - 満たさないエンジンは後ろに回し、エラー率・p95の小さい順に並べる
+    - 死活確認に失敗しているエンジンは最後に回す（他に無ければ使う）
+    """
+
+    def __init__(self, p95_ms=6000, max_error_rate=0.2, min_calls=5):
+        self.p95_ms = p95_ms
+        self.max_error_rate = max_error_rate
+        self.min_calls = min_calls
+
+    def meets_slo(self, stats):
+        if stats['probe_ok'] is False:
+            return False
+        if stats['window_calls'] < self.min_calls:
+            return True
+        if stats['error_rate'] > self.max_error_rate:
+            return False
+        return stats['p95_ms'] is None or stats['p95_ms'] <= self.p95_ms
+
+    def order(self, candidates):
+        """candidates: [(engine, stats), ...]（登録順）→ 選択順の [engine, ...]"""
+        healthy = [engine for engine, stats in candidates if self.meets_slo(stats)]
+        degraded = sorted(
+            ((engine, stats) for engine, stats in candidates if not self.meets_slo(stats)),
+            key=lambda item: (item[1]['probe_ok'] is False, item[1]['error_rate'], item[1]['p95_ms'] or 0)
+        )
+        return healthy + [engine for engine, _ in degraded]
+
+
+class TTSEngineRegistry:
+    """音声エンジンの登録・計測・選択
+
+    実際の合成結果は record() で、バックグラウンドの死活確認は start_probe() で記録し、
+    select(language) で言語に対応するエンジンを policy の順に返す。
+    """
+
+    def __init__(self, policy=None, window_size=50):
+        self.policy = policy or SLOPolicy()
+        self.window_size = window_size
+        self.engines = {}
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.probe_thread = None
+        self.probe_interval = 0
+
+    def register(self, engine):
+        with self.lock:
+            self.engines[engine.name] = engine
+            self.stats.setdefault(engine.name, EngineStats(self.window_size))
+        print(f"🧩 音声エンジン登録: {engine.name}")
+
+    def get(self, name):
+        with self.lock:
+            return self.engines.get(name)
+
+    def names(self):
+        with self.lock:
+            return list(self.engines)
+
+    def record(self, name, latency_ms, ok):
+        """実際の合成の結果を記録"""
+        with self.lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                return
+            stats.counts['calls'] += 1
+            stats.outcomes.append(ok)
+            if ok:
+                stats.latencies.append(latency_ms)
+            else:
+                stats.counts['failures'] += 1
+
+    def select(self, language):
+        """言語に対応するエンジンを選択順に返す"""
+        with self.lock:
+            candidates = [
+                (engine, self.stats[name].snapshot())
+                for name, engine in self.engines.items()
+                if engine.supports(language)
+            ]
+        return self.policy.order(candidates)
+
+    def probe_all(self):
+        """全エンジンの死活確認"""
+        for name in self.names():
+            engine = self.get(name)
+            start = time.time()
+            try:
+                ok = bool(engine.probe())
+            except Exception as e:
+                print(f"⚠️ 音声エンジン死活確認エラー ({name}): {e}")
+                ok = False
+            latency_ms = round((time.time() - start) * 1000, 1)
+            with self.lock:
+                stats = self.stats[name]
+                if stats.probe_ok is not False and not ok:
+                    print(f"🩺 音声エンジン {name} が応答しません")
+                stats.probe_ok = ok
+                stats.probe_latency_ms = latency_ms
+                stats.probed_at = time.time()
+                stats.counts['probes'] += 1
+                if not ok:
+                    stats.counts['probe_failures'] += 1
+
+    def start_probe(self, interval):
+        """interval 秒ごとに死活確認を行うデーモンスレッドを起動（0以下なら起動しない）"""
+        if interval <= 0 or self.probe_thread:
+            return
+        self.probe_interval = interval
+
+        def loop():
+            while True:
+                self.probe_all()
+                time.sleep(interval)
+
+        self.probe_thread = threading.Thread(target=loop, name='tts-engine-probe', daemon=True)
+        self.probe_thread.start()
+        print(f"🩺 音声エンジン死活確認を開始 ({interval}秒ごと)")
+
+    def get_status(self, language=None):
+        """エンジンごとの状態（language 指定時はその言語での選択順も含める）"""
+        with self.lock:
+            engines = dict(self.engines)
+            snapshots = {name: stats.snapshot() for name, stats in self.stats.items()}
+        status = {
+            'policy': {
+                'p95_ms': self.policy.p95_ms,
+                'max_error_rate': self.policy.max_error_rate,
+                'min_calls': self.policy.min_calls
+            },
+            'probe_interval': self.probe_interval,
+            'engines': {
+                name: {
+                    'languages': list(engine.languages) if engine.languages else 'all',
+                    'meets_slo': self.policy.meets_slo(snapshots[name]),
+                    **engine.describe(),
+                    **snapshots[name]
+                }
+                for name, engine in engines.items()
+            }
+        }
+        if language:
+            status['selection'] = {language: [engine.name for engine in self.select(language)]}
+        return status
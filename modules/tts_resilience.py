@@ -0,0 +1,263 @@
+# tts_resilience.py - 音声エンジンのサーキットブレーカーとヘッジ付きフェイルオーバー
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+
+def percentile(values, p):
+    """分位点（最近傍法）。値が無ければ None"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class CircuitBreaker:
+    """音声エンジンごとのサーキットブレーカー
+
+    直近 window_size 回の呼び出し結果を保持し、
+    - エラー率が error_rate_threshold 以上
+    - または成功時レイテンシのp95が p95_threshold_ms 以上
+    になったら OPEN にして open_seconds の間は呼び出しを止める。
+    その後 HALF_OPEN で1回だけ試し、成功すれば CLOSED に戻す。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, window_size=20, min_calls=5, error_rate_threshold=0.5,
+                 p95_threshold_ms=8000, open_seconds=30):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate_threshold = error_rate_threshold
+        self.p95_threshold_ms = p95_threshold_ms
+        self.open_seconds = open_seconds
+
+        self.state = self.CLOSED
+        self.opened_at = 0
+        self.trial_in_flight = False
+        self.outcomes = deque(maxlen=window_size)   # True=成功, False=失敗
+        self.latencies = deque(maxlen=window_size)  # 成功時のレイテンシ(ms)
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'failures': 0, 'rejected': 0, 'trips': 0}
+
+    def allow_request(self):
+        """呼び出してよいか（HALF_OPENでは試行を1回だけ許可）"""
+        with self.lock:
+            if self.state == self.OPEN:
+                if time.time() - self.opened_at < self.open_seconds:
+                    self.stats['rejected'] += 1
+                    return False
+                self.state = self.HALF_OPEN
+                self.trial_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                if self.trial_in_flight:
+                    self.stats['rejected'] += 1
+                    return False
+                self.trial_in_flight = True
+            return True
+
+    def record_success(self, latency_ms):
+        with self.lock:
+            self.stats['calls'] += 1
+            self.outcomes.append(True)
+            self.latencies.append(latency_ms)
+            if self.state == self.HALF_OPEN:
+                self._close()
+            else:
+                self._evaluate()
+
+    def record_failure(self):
+        with self.lock:
+            self.stats['calls'] += 1
+            self.stats['failures'] += 1
+            self.outcomes.append(False)
+            if self.state == self.HALF_OPEN:
+                self._trip('試行失敗')
+            else:
+                self._evaluate()
+
+    def p95_ms(self):
+        with self.lock:
+            return percentile(list(self.latencies), 95)
+
+    def _evaluate(self):
+        """ロック保持中に呼ぶ"""
+        if self.state != self.CLOSED or len(self.outcomes) < self.min_calls:
+            return
+        error_rate = self.outcomes.count(False) / len(self.outcomes)
+        if error_rate >= self.error_rate_threshold:
+            self._trip(f"エラー率 {error_rate:.0%}")
+            return
+        p95 = percentile(list(self.latencies), 95)
+        if p95 is not None and len(self.latencies) >= self.min_calls and p95 >= self.p95_threshold_ms:
+            self._trip(f"p95 {p95:.0f}ms")
+
+    def _trip(self, reason):
+        self.state = self.OPEN
+        self.opened_at = time.time()
+        self.trial_in_flight = False
+        self.stats['trips'] += 1
+        print(f"🔌 サーキットブレーカー OPEN: {self.name} ({reason})")
+
+    def _close(self):
+        self.state = self.CLOSED
+        self.trial_in_flight = False
+        self.outcomes.clear()
+        self.latencies.clear()
+        print(f"✅ サーキットブレーカー CLOSED: {self.name}")
+
+    def get_stats(self):
+        with self.lock:
+            latencies = list(self.latencies)
+            return {
+                'state': self.state,
+                'window_calls': len(self.outcomes),
+                'error_rate': round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0,
+                'p50_ms': percentile(latencies, 50),
+                'p95_ms': percentile(latencies, 95),
+                **self.stats
+            }
+
+
+class EngineFailover:
+    """優先順位付きの音声エンジンを、ブレーカーとヘッジを使って呼び出す
+
+    ヘッジ有効時は、主エンジンがp95由来の待ち時間内に応答しなければ
+    次のエンジンを並行して起動し、先に成功した方の結果を使う。
+
+    acquire(name) はレート制限のトークン・同時実行枠を確保するコンテキストマネージャ。
+    その待ち時間はブレーカーのレイテンシにもヘッジの待ち時間にも含めない（計測はエンジンの呼び出しのみ）。
+    再試行はここで行う: 失敗したら次のエンジンへ移り、残りのエンジンが無い場合だけ
+    retry_delay(name, error, attempt) が返す秒数だけ待って同じエンジンを再試行する（None なら諦める）。
+    """
+
+    def __init__(self, breaker_options=None, hedge_enabled=False, hedge_default_ms=3000,
+                 hedge_min_ms=500, max_workers=8):
+        self.breaker_options = breaker_options or {}
+        self.hedge_enabled = hedge_enabled
+        self.hedge_default_ms = hedge_default_ms
+        self.hedge_min_ms = hedge_min_ms
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='tts-failover')
+        self.breakers = {}
+        self.lock = threading.Lock()
+        self.stats = {'failovers': 0, 'retries': 0, 'hedges_started': 0, 'hedges_won': 0}
+
+    def breaker(self, name):
+        with self.lock:
+            if name not in self.breakers:
+                self.breakers[name] = CircuitBreaker(name, **self.breaker_options)
+            return self.breakers[name]
+
+    def hedge_budget_ms(self, name):
+        """ヘッジ開始までの待ち時間（主エンジンのp95、サンプルが無ければ既定値）"""
+        p95 = self.breaker(name).p95_ms()
+        if p95 is None:
+            return self.hedge_default_ms
+        return max(self.hedge_min_ms, p95)
+
+    def _timed_call(self, name, fn, acquire=None, started=None):
+        breaker = self.breaker(name)
+        try:
+            with (acquire(name) if acquire else nullcontext()):
+                if started:
+                    started.set()
+                start = time.time()
+                try:
+                    result = fn()
+                except Exception:
+                    breaker.record_failure()
+                    raise
+                breaker.record_success((time.time() - start) * 1000)
+                return result
+        finally:
+            if started:
+                started.set()
+
+    def _count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def call(self, engines, acquire=None, retry_delay=None):
+        """engines: [(name, fn), ...] を優先順に試す
+
+        Returns: (engine_name, result)
+        Raises: 全エンジンが失敗した場合は最後の例外
+        """
+        pending = list(engines)
+        last_error = RuntimeError("利用可能な音声エンジンがありません")
+        first_attempt = True
+        attempts = {}
+
+        while pending:
+            name, fn = pending.pop(0)
+            if not self.breaker(name).allow_request():
+                print(f"⏭️ {name} はサーキットブレーカーで遮断中")
+                continue
+            if not first_attempt and name not in attempts:
+                self._count('failovers')
+            first_attempt = False
+
+            started = threading.Event()
+            future = self.executor.submit(self._timed_call, name, fn, acquire, started)
+            racing = {future: name}
+
+            if self.hedge_enabled and pending:
+                # ヘッジの待ち時間はトークン・同時実行枠を確保して呼び出しを始めてから数える
+                started.wait()
+                done, _ = wait([future], timeout=self.hedge_budget_ms(name) / 1000.0)
+                if not done:
+                    hedge = self._start_hedge(pending, acquire)
+                    if hedge:
+                        racing[hedge[0]] = hedge[1]
+
+            while racing:
+                done, _ = wait(list(racing), return_when=FIRST_COMPLETED)
+                for finished in done:
+                    finished_name = racing.pop(finished)
+                    try:
+                        result = finished.result()
+                    except Exception as e:
+                        print(f"❌ 音声エンジン失敗: {finished_name} ({e})")
+                        last_error = e
+                        if not pending and not racing and retry_delay:
+                            attempt = attempts.get(finished_name, 0)
+                            delay = retry_delay(finished_name, e, attempt)
+                            if delay is not None:
+                                attempts[finished_name] = attempt + 1
+                                self._count('retries')
+                                print(f"🔁 {finished_name} を {delay:.2f}秒後に再試行 ({attempt + 1})")
+                                time.sleep(delay)
+                                pending.append((finished_name, dict(engines)[finished_name]))
+                        continue
+                    if finished_name != name:
+                        self._count('hedges_won')
+                        print(f"🏁 ヘッジ側が先に完了: {finished_name}")
+                    return finished_name, result
+
+        raise last_error
+
+    def _start_hedge(self, pending, acquire=None):
+        """次に使えるエンジンを並行起動（pending から取り除く）"""
+        while pending:
+            name, fn = pending.pop(0)
+            if self.breaker(name).allow_request():
+                self._count('hedges_started')
+                print(f"🪢 ヘッジ開始: {name}")
+                return self.executor.submit(self._timed_call, name, fn, acquire), name
+        return None
+
+    def get_stats(self):
+        with self.lock:
+            breakers = dict(self.breakers)
+            stats = dict(self.stats)
+        return {
+            'hedge_enabled': self.hedge_enabled,
+            **stats,
+            'engines': {name: breaker.get_stats() for name, breaker in breakers.items()}
+        }
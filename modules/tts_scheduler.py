@@ -0,0 +1,193 @@
+# tts_scheduler.py - 音声合成APIのレート制限対応・優先度付きスケジューラー
+import heapq
+import itertools
+import random
+import threading
+import time
+
+# 優先度クラス（先頭ほど優先）
+PRIORITY_CLASSES = ('live', 'greeting', 'quiz', 'prefetch')
+
+# 再試行するHTTPステータス
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class TTSProviderError(Exception):
+    """音声合成APIのエラー（HTTPステータスとRetry-Afterを保持）"""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def _status_code(error):
+    return getattr(error, 'status_code', None)
+
+
+def _retry_after_seconds(error):
+    """Retry-After（秒）を取得（TTSProviderError または OpenAI SDKの例外）"""
+    value = getattr(error, 'retry_after', None)
+    if value is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+        value = headers.get('retry-after')
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_rate_limits(value):
+    """'azure_speech=10/20,openai_tts=5/10' → {'azure_speech': (10.0, 20), ...}（毎秒/バースト）"""
+    limits = {}
+    for item in (value or '').split(','):
+        name, _, spec = item.strip().partition('=')
+        if not name or not spec:
+            continue
+        rate, _, burst = spec.partition('/')
+        try:
+            limits[name] = (float(rate), int(burst or max(1, float(rate))))
+        except ValueError:
+            print(f"⚠️ レート制限の設定が不正です: {item}")
+    return limits
+
+
+class TokenBucket:
+    """トークンバケット（rate: 毎秒の補充数, burst: 最大保持数）"""
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_take(self):
+        """トークンを1つ取る。取れなければ次のトークンまでの秒数を返す（取れたら0）"""
+        now = time.monotonic()
+        self._refill(now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def drain(self):
+        """429を受けた時に手持ちのトークンを捨てて送信を控える"""
+        self._refill(time.monotonic())
+        self.tokens = min(self.tokens, 0)
+
+
+class TTSScheduler:
+    """プロバイダーごとのトークンバケットと優先度キューで音声合成APIの呼び出しを制御
+
+    - 同じプロバイダーの待ち行列は優先度順（同じ優先度なら到着順）にトークンを受け取る
+    - 429/5xx はジッター付き指数バックオフで再試行する（Retry-Afterがあればそれに従う）
+    """
+
+    def __init__(self, rate_limits=None, default_rate=10, default_burst=20,
+                 max_retries=3, backoff_base=0.5, backoff_max=8.0):
+        self.rate_limits = rate_limits or {}
+        self.default_rate = default_rate
+        self.default_burst = default_burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.cond = threading.Condition()
+        self.buckets = {}
+        self.queues = {}
+        self.sequence = itertools.count()
+        self.stats = {}
+
+    def _provider(self, provider):
+        """プロバイダーのバケット・キュー・統計を用意（ロック保持中に呼ぶ）"""
+        if provider not in self.buckets:
+            rate, burst = self.rate_limits.get(provider, (self.default_rate, self.default_burst))
+            self.buckets[provider] = TokenBucket(rate, burst)
+            self.queues[provider] = []
+            self.stats[provider] = {
+                'requests': 0, 'retries': 0, 'rate_limited': 0, 'server_errors': 0, 'failures': 0,
+                'max_queue_depth': 0,
+                'wait_ms': {name: {'count': 0, 'total': 0.0, 'max': 0.0} for name in PRIORITY_CLASSES}
+            }
+        return self.buckets[provider], self.queues[provider], self.stats[provider]
+
+    def acquire(self, provider, priority='live'):
+        """トークンを受け取るまで待つ（優先度順）"""
+        if priority not in PRIORITY_CLASSES:
+            priority = 'live'
+        start = time.monotonic()
+        with self.cond:
+            bucket, queue, stats = self._provider(provider)
+            ticket = (PRIORITY_CLASSES.index(priority), next(self.sequence))
+            heapq.heappush(queue, ticket)
+            stats['max_queue_depth'] = max(stats['max_queue_depth'], len(queue))
+
+            while True:
+                if queue[0] == ticket:
+                    wait_seconds = bucket.try_take()
+                    if wait_seconds == 0:
+                        heapq.heappop(queue)
+                        self.cond.notify_all()
+                        break
+                    self.cond.wait(timeout=wait_seconds)
+                else:
+                    self.cond.wait()
+
+            waited_ms = (time.monotonic() - start) * 1000
+            wait_stats = stats['wait_ms'][priority]
+            wait_stats['count'] += 1
+            wait_stats['total'] += waited_ms
+            wait_stats['max'] = max(wait_stats['max'], waited_ms)
+            stats['requests'] += 1
+
+    def record_error(self, provider, error):
+        """API呼び出しの失敗を記録（429なら手持ちのトークンを捨てる）"""
+        status = _status_code(error)
+        with self.cond:
+            bucket, _, stats = self._provider(provider)
+            if status == 429:
+                stats['rate_limited'] += 1
+                bucket.drain()
+            elif status is not None and status >= 500:
+                stats['server_errors'] += 1
+
+    def retry_delay(self, provider, error, attempt):
+        """再試行までの秒数（429/5xx のみ。Retry-Afterがあればそれに従う。上限は backoff_max）。再試行しない場合は None"""
+        status = _status_code(error)
+        with self.cond:
+            _, _, stats = self._provider(provider)
+            if status not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                stats['failures'] += 1
+                return None
+            stats['retries'] += 1
+        delay = _retry_after_seconds(error)
+        if delay is None:
+            # フルジッター付き指数バックオフ
+            delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        # 長いRetry-Afterで応答スレッドが止まらないよう上限を設ける
+        return min(delay, self.backoff_max)
+
+    def get_stats(self):
+        with self.cond:
+            result = {}
+            for provider, stats in self.stats.items():
+                bucket = self.buckets[provider]
+                result[provider] = {
+                    'rate_per_sec': bucket.rate,
+                    'burst': bucket.burst,
+                    'queue_depth': len(self.queues[provider]),
+                    **{key: value for key, value in stats.items() if key != 'wait_ms'},
+                    'wait_ms': {
+                        name: {
+                            'count': wait['count'],
+                            'avg': round(wait['total'] / wait['count'], 1) if wait['count'] else 0,
+                            'max': round(wait['max'], 1)
+                        }
+                        for name, wait in stats['wait_ms'].items()
+                    }
+                }
+            return result
@@ -0,0 +1,57 @@
+# tts_text.py - 音声合成の入力の正規化（同じ音声になる入力を同じキャッシュキーにまとめる）
+# ※ 正規化したテキストはキャッシュキーにのみ使い、音声エンジンには元のテキストを送る
+import re
+
+# 音声エンジンで同じ表現（Azureのstyle/styledegree・CoeFontのパラメータ）になる感情の別名
+EMOTION_ALIASES = {
+    'surprised': 'surprise',
+    'neutraltalking': 'neutral',
+    'responseready': 'neutral'
+}
+
+# 感情によって音声が変わる言語（それ以外の言語はOpenAI TTSのみで、感情は音声に影響しない）
+EMOTION_SENSITIVE_LANGUAGES = ('ja',)
+
+# 全角英数記号（！〜～）→ 半角、全角スペース → 半角スペース
+# NFKC は "㎡" → "m2"、"①" → "1" のように読みが変わる変換を含むため使わない
+FULLWIDTH_ASCII = {code: code - 0xFEE0 for code in range(0xFF01, 0xFF5F)}
+FULLWIDTH_ASCII[0x3000] = ' '
+
+WHITESPACE = re.compile(r'\s+')
+# 同じ記号の連続（"!!" → "!"、"。。" → "。"）
+# 長音（ー・~）や "..." は間の長さが変わるため対象外
+REPEATED_PUNCTUATION = re.compile(r'([!?。、,])\1+')
+
+
+def canonicalize_tts_text(text):
+    """合成する音声が変わらない表記揺れをまとめる（キャッシュキー用）
+
+    - 全角英数記号を半角に統一（"！" → "!"、"Ａ" → "A"）
+    - 空白の連続を1つにし、前後の空白を除く
+    - 同じ記号の連続を1つにする
+    """
+    text = (text or '').translate(FULLWIDTH_ASCII)
+    text = WHITESPACE.sub(' ', text).strip()
+    return REPEATED_PUNCTUATION.sub(r'\1', text)
+
+
+def canonicalize_emotion(emotion, language='ja'):
+    """音声が同じになる感情を1つにまとめる"""
+    if language not in EMOTION_SENSITIVE_LANGUAGES:
+        return 'neutral'
+    emotion = (emotion or 'neutral').strip().lower()
+    return EMOTION_ALIASES.get(emotion, emotion)
+
+
+def canonicalize_tts_params(language, emotion):
+    """言語と感情のみ正規化（合成時に使う。テキストは変更しない）
+    Returns: (language, emotion)
+    """
+    language = (language or 'ja').strip().lower()
+    return language, canonicalize_emotion(emotion, language)
+
+
+def canonicalize_tts_request(text, language, emotion):
+    """キャッシュキー用の正規化。Returns: (text, language, emotion)"""
+    language = (language or 'ja').strip().lower()
+    return canonicalize_tts_text(text), language, canonicalize_emotion(emotion, language)
@@ -492,7 +492,8 @@
     
     let audioState = {
         recorder: null,
-        chunks: [],
+        // 作成したBlob URL（再生されなかった音声も含めて解放するために保持）
+        blobUrls: new Set(),
         isRecording: false,
         audioContext: null,
         analyser: null,
@@ -845,7 +846,20 @@
             const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
             const socketUrl = `${protocol}//${window.location.host}`;
             
+            const query = {
+                // Blob URLが使える環境では音声をバイナリで受け取る
+                audio_transport: supportsBinaryAudio() ? 'binary' : 'base64',
+                // 再生できる音声形式（サーバーが最適な形式に変換して送る）
+                audio_codecs: detectAudioCodecs().join(',')
+            };
+            // テキストを先に受け取り、音声は response_audio で後から受け取る（設定した場合のみ）
+            const responseMode = getResponseModeSetting();
+            if (responseMode) {
+                query.response_mode = responseMode;
+            }
+            
             socket = io(socketUrl, {
+                query: query,
                 transports: ['polling', 'websocket'],
                 upgrade: true,
                 reconnection: true,
@@ -861,20 +875,22 @@
             socket.on('connect', handleSocketConnect);
             socket.on('current_language', handleLanguageUpdate);
             socket.on('language_changed', handleLanguageUpdate);
-            socket.on('greeting', handleGreetingMessage);
-            socket.on('response', handleResponseMessage);
+            socket.on('greeting', withAudioSource(handleGreetingMessage));
+            socket.on('response', withAudioSource(handleResponseMessage));
+            socket.on('response_audio', withAudioSource(handleResponseAudio));
+            socket.on('thinking', withAudioSource(handleThinkingFiller));
             socket.on('transcription', handleTranscription);
             socket.on('error', handleErrorMessage);
-            socket.on('context_aware_response', handleContextAwareResponse);
+            socket.on('context_aware_response', withAudioSource(handleContextAwareResponse));
             socket.on('conversation_start', handleConversationStart);
             socket.on('unity_conversation_end', handleConversationEnd);
             // 🎯 新規追加: クイズ用Socket.IOイベントリスナー
-            socket.on('quiz_proposal', handleQuizProposal);
-            socket.on('quiz_question', handleQuizQuestion);
-            socket.on('quiz_answer_result', handleQuizAnswerResult);
-            socket.on('quiz_final_result', handleQuizFinalResult);
+            socket.on('quiz_proposal', withAudioSource(handleQuizProposal));
+            socket.on('quiz_question', withAudioSource(handleQuizQuestion));
+            socket.on('quiz_answer_result', withAudioSource(handleQuizAnswerResult));
+            socket.on('quiz_final_result', withAudioSource(handleQuizFinalResult));
             // 🎯 追加: 次の問題リクエストのレスポンス（同じハンドラを再利用）
-            socket.on('next_quiz_question', handleQuizQuestion);
+            socket.on('next_quiz_question', withAudioSource(handleQuizQuestion));
             // 🎯 新規追加: stage3サジェスチョンのレスポンス
             socket.on('stage3_suggestions', (data) => {
                 console.log('📋 stage3サジェスチョンを受信:', data.suggestions);
@@ -890,6 +906,221 @@
         }
     }
     
+    /**
+     * サーバーからの音声フィールドを再生可能なソースに正規化
+     * （URL配信の場合は audioUrl を data.audio に設定する）
+     */
+    function withAudioSource(handler) {
+        return function(data) {
+            if (data && !data.audio && data.audioBinary) {
+                // バイナリ添付 → Blob URL（再生終了時、または次の音声が届いた時に解放）
+                const blob = new Blob([data.audioBinary], { type: data.audioMimeType || 'audio/mpeg' });
+                data.audio = URL.createObjectURL(blob);
+                data.audioBinary = null;
+                // 再生されずに終わった以前の音声（スキップ・中断・未再生）を解放
+                revokeUnusedAudioSources(data.audio);
+                audioState.blobUrls.add(data.audio);
+            } else if (data && !data.audio && data.audioUrl) {
+                data.audio = data.audioUrl;
+            } else if (data && data.audio && data.audioMimeType && !isAudioUrl(data.audio)) {
+                // Base64 → 正しいMIMEタイプのdata URI（WAV/Ogg/MP3が混在するため）
+                data.audio = `data:${data.audioMimeType};base64,${data.audio}`;
+            }
+            if (data && data.audioPending) {
+                // 後送音声の待ち合わせを先に登録しておく
+                waitForAudio(data);
+            }
+            return handler(data);
+        };
+    }
+    
+    /**
+     * 後送音声（text_firstモード）の待ち合わせ
+     * messageId → resolve。テキストより先に届いた音声は arrived に保持する
+     */
+    const deferredAudio = {
+        waiting: new Map(),
+        arrived: new Map(),
+        timeoutMs: 30000
+    };
+    
+    function handleResponseAudio(data) {
+        const messageId = data.messageId;
+        if (!messageId) return;
+        
+        const resolve = deferredAudio.waiting.get(messageId);
+        if (resolve) {
+            deferredAudio.waiting.delete(messageId);
+            resolve(data);
+        } else {
+            deferredAudio.arrived.set(messageId, data);
+            setTimeout(() => deferredAudio.arrived.delete(messageId), deferredAudio.timeoutMs);
+        }
+    }
+    
+    /**
+     * イベントの音声を取得（後送の場合は response_audio の到着を待つ）
+     * 後送された lipSync / audioDurationMs は元のイベントデータにコピーする
+     * @returns {Promise<string|null>}
+     */
+    function waitForAudio(data) {
+        if (data.audio || !data.audioPending || !data.messageId) {
+            return Promise.resolve(data.audio || null);
+        }
+        // 同じイベントで複数回呼ばれても待ち合わせは1つにする
+        if (data.audioPromise) {
+            return data.audioPromise;
+        }
+        
+        const applyAudio = (audioData) => {
+            if (audioData) {
+                data.lipSync = audioData.lipSync || null;
+                data.audioDurationMs = audioData.audioDurationMs || null;
+            }
+            return audioData ? (audioData.audio || null) : null;
+        };
+        
+        if (deferredAudio.arrived.has(data.messageId)) {
+            const audioData = deferredAudio.arrived.get(data.messageId);
+            deferredAudio.arrived.delete(data.messageId);
+            data.audioPromise = Promise.resolve(applyAudio(audioData));
+            return data.audioPromise;
+        }
+        
+        data.audioPromise = new Promise(resolve => {
+            const onAudio = (audioData) => resolve(applyAudio(audioData));
+            deferredAudio.waiting.set(data.messageId, onAudio);
+            setTimeout(() => {
+                if (deferredAudio.waiting.get(data.messageId) === onAudio) {
+                    deferredAudio.waiting.delete(data.messageId);
+                    console.warn('⏰ 後送音声がタイムアウトしました:', data.messageId);
+                    resolve(null);
+                }
+            }, deferredAudio.timeoutMs);
+        });
+        return data.audioPromise;
+    }
+    
+    function hasAudio(data) {
+        return !!(data && (data.audio || data.audioPending));
+    }
+    
+    /**
+     * 音声が届いたら会話（リップシンク）を開始
+     */
+    function startConversationWhenReady(emotion, data) {
+        if (data.audio || !data.audioPending) {
+            startConversation(emotion, data.audio, data.lipSync);
+            return;
+        }
+        
+        console.log('⏳ 音声の到着待ち:', data.messageId);
+        sendEmotionToAvatar(emotion, false, 'awaiting_audio');
+        waitForAudio(data).then(audio => {
+            data.audio = audio;
+            data.audioPending = false;
+            startConversation(emotion, audio, data.lipSync);
+        });
+    }
+    
+    /**
+     * 応答生成中の相づち（事前合成の短い音声）を再生
+     * 再生中の音声があれば割り込まない。応答の音声が届いたら startConversation が停止する
+     * サーバーへの会話終了通知（conversation_ended）は送らない
+     */
+    function handleThinkingFiller(data) {
+        if (!data || !data.audio || isAudioPlaying() || !appState.isWaitingResponse) {
+            releaseAudioSource({ src: data && data.audio });
+            return;
+        }
+        
+        console.log('💭 相づち再生:', data.text);
+        const audio = new Audio(data.audio);
+        audio.muted = audioState.isMuted;
+        unityState.activeAudioElement = audio;
+        
+        const finish = () => {
+            releaseAudioSource(audio);
+            // 応答の音声に切り替わっていなければ、考えている様子のまま口を閉じる
+            if (unityState.activeAudioElement === audio) {
+                unityState.activeAudioElement = null;
+                sendEmotionToAvatar(data.emotion || 'responseready', false, 'thinking_end');
+            }
+        };
+        audio.onended = finish;
+        audio.onerror = finish;
+        audio.onplay = () => {
+            sendLipSyncToUnity(data.lipSync, null, audio);
+        };
+        
+        sendEmotionToAvatar(data.emotion || 'responseready', true, 'thinking');
+        audio.play().catch(error => {
+            console.warn('相づちの再生に失敗:', error);
+            finish();
+        });
+    }
+    
+    /**
+     * ブラウザが再生できる音声コーデックを優先度の高い順に列挙
+     */
+    function detectAudioCodecs() {
+        const probe = typeof Audio !== 'undefined' ? new Audio() : null;
+        if (!probe || typeof probe.canPlayType !== 'function') {
+            return [];
+        }
+        
+        const candidates = [
+            ['opus-ogg', 'audio/ogg; codecs="opus"'],
+            ['opus-webm', 'audio/webm; codecs="opus"'],
+            ['aac', 'audio/aac'],
+            ['mp3', 'audio/mpeg'],
+            ['wav', 'audio/wav']
+        ];
+        return candidates
+            .filter(([, mimeType]) => probe.canPlayType(mimeType) !== '')
+            .map(([codec]) => codec);
+    }
+    
+    // 応答モードの設定（?response_mode=text_first または localStorage の response_mode）
+    // 未設定の場合は送らず、サーバーの既定（RESPONSE_MODE）に従う
+    function getResponseModeSetting() {
+        const value = new URLSearchParams(window.location.search).get('response_mode') ||
+                      localStorage.getItem('response_mode');
+        return ['sync', 'text_first'].includes(value) ? value : null;
+    }
+    
+    function supportsBinaryAudio() {
+        return typeof Blob !== 'undefined' &&
+               typeof URL !== 'undefined' &&
+               typeof URL.createObjectURL === 'function';
+    }
+    
+    function isAudioUrl(audioData) {
+        // 生のBase64（MP3は "//" で始まることがある）と区別するため接頭辞で判定
+        return /^(data:|blob:|https?:|\/audio\/)/.test(audioData);
+    }
+    
+    function releaseAudioSource(audio) {
+        if (audio && audio.src && audio.src.startsWith('blob:')) {
+            URL.revokeObjectURL(audio.src);
+            audioState.blobUrls.delete(audio.src);
+        }
+    }
+    
+    /**
+     * 再生中の音声と keep 以外のBlob URLを解放
+     * （音声が差し替えられた・新しいメッセージが届いた時に、再生されなかった音声のURLが残らないようにする）
+     */
+    function revokeUnusedAudioSources(keep = null) {
+        const playing = unityState.activeAudioElement && unityState.activeAudioElement.src;
+        audioState.blobUrls.forEach(url => {
+            if (url !== keep && url !== playing) {
+                URL.revokeObjectURL(url);
+                audioState.blobUrls.delete(url);
+            }
+        });
+    }
+    
     // ====== 音声システムの初期化 ======
     function initializeAudioSystem() {
         console.log('🎵 音声システムを初期化中...');
@@ -1120,7 +1351,7 @@
         appState.currentLanguage = language;
         
         if (socket && socket.connected) {
-            socket.emit('set_language', { language: language });
+            socket.emit('set_language', { language: language, audioCodecs: detectAudioCodecs() });
         }
         
         updateUILanguage(language);
@@ -1818,6 +2049,9 @@
     }
     
     // ====== 音声録音 ======
+    // 録音中に音声を送る間隔（ミリ秒）。サーバー側は届いた断片から順に変換を進める
+    const VOICE_CHUNK_TIMESLICE_MS = 250;
+    
     function toggleVoiceRecording() {
         if (location.protocol !== 'https:' && location.hostname !== 'localhost') {
             showError('安全な接続(HTTPS)が必要です。HTTPSでアクセスしてください。');
@@ -1838,19 +2072,37 @@
         
         navigator.mediaDevices.getUserMedia({ audio: true })
             .then(function(stream) {
-                audioState.recorder = new MediaRecorder(stream);
-                audioState.chunks = [];
+                const recorder = new MediaRecorder(stream);
+                const streamId = `${socket.id}-${Date.now()}`;
+                const mimeType = recorder.mimeType || 'audio/webm';
+                // 断片の送信（ArrayBufferへの変換）が終わるのを待ってから audio_end を送る
+                const pendingChunks = [];
+                let seq = 0;
+                
+                audioState.recorder = recorder;
                 
-                audioState.recorder.ondataavailable = function(e) {
-                    audioState.chunks.push(e.data);
+                // 録音中から断片を送信（サーバーは順番どおりに並べ直して逐次変換する）
+                recorder.ondataavailable = function(e) {
+                    if (!e.data || e.data.size === 0) return;
+                    const chunkSeq = seq++;
+                    pendingChunks.push(e.data.arrayBuffer().then(buffer => {
+                        socket.emit('audio_chunk', {
+                            streamId: streamId,
+                            seq: chunkSeq,
+                            chunk: buffer,
+                            mimeType: mimeType,
+                            language: appState.currentLanguage
+                        });
+                    }));
                 };
                 
-                audioState.recorder.onstop = function() {
-                    const audioBlob = new Blob(audioState.chunks, { type: 'audio/webm' });
+                recorder.onstop = function() {
+                    stream.getTracks().forEach(track => track.stop());
                     
-                    convertBlobToBase64(audioBlob).then(base64data => {
-                        socket.emit('audio_message', { 
-                            audio: base64data,
+                    Promise.all(pendingChunks).then(() => {
+                        socket.emit('audio_end', {
+                            streamId: streamId,
+                            chunks: seq,
                             language: appState.currentLanguage,
                             visitorId: visitorManager.visitorId,
                             conversationHistory: conversationMemory.getRecentContext(5),
@@ -1860,11 +2112,9 @@
                             selectedSuggestions: visitorManager.getSelectedSuggestions()
                         });
                     });
-                    
-                    stream.getTracks().forEach(track => track.stop());
                 };
                 
-                audioState.recorder.start();
+                recorder.start(VOICE_CHUNK_TIMESLICE_MS);
                 
                 if (domElements.voiceButton) {
                     domElements.voiceButton.textContent = '■';
@@ -1964,6 +2214,32 @@
         }
     }
     
+    /**
+     * 口の開き具合（リップシンクのエンベロープ）をUnityに送る
+     * 'lipsync' メッセージはUnity側（WebGLBridge）に対応する受信処理が必要なため、
+     * ?unity_lipsync=1 または localStorage の unity_lipsync=true で有効にした場合のみ送る
+     * （既定では送らず、従来どおり emotion メッセージの talking で口を動かす）
+     */
+    function isUnityLipSyncEnabled() {
+        const value = new URLSearchParams(window.location.search).get('unity_lipsync') ||
+                      localStorage.getItem('unity_lipsync');
+        return value === '1' || value === 'true';
+    }
+    
+    function sendLipSyncToUnity(lipSync, conversationId, audio) {
+        if (!lipSync || !lipSync.values || lipSync.values.length === 0 || !isUnityLipSyncEnabled()) {
+            return false;
+        }
+        return sendMessageToUnity({
+            type: 'lipsync',
+            conversationId: conversationId,
+            frameMs: lipSync.frameMs,
+            values: lipSync.values,
+            offsetMs: Math.round(audio.currentTime * 1000),
+            timestamp: Date.now()
+        });
+    }
+    
     function sendMessageToUnity(messageData) {
         if (!unityState.instance) {
             console.warn('Unity インスタンスが見つかりません - 再取得を試行');
@@ -2075,10 +2351,12 @@
     }
     
     // ====== 会話フロー制御 ======
-    function startConversation(emotion, audioData) {
+    function startConversation(emotion, audioData, lipSync = null) {
         console.log('🎬 会話開始:', emotion);
         
         stopAllAudio();
+        // 差し替えられた音声のBlob URLを解放（これから再生する音声は残す）
+        revokeUnusedAudioSources(audioData);
         
         const conversationId = 'conv_' + Date.now() + '_' + Math.random().toString(36).substring(2, 9);
         
@@ -2090,7 +2368,7 @@
         sendEmotionToAvatar(emotion, true, 'conversation_start', conversationId);
         
         if (audioData && !isAudioPlaying()) {
-            playAudioWithLipSync(audioData, emotion);
+            playAudioWithLipSync(audioData, emotion, lipSync);
         } else if (!audioData) {
             const endTimer = setTimeout(() => {
                 endConversation();
@@ -2113,6 +2391,7 @@
         if (unityState.activeAudioElement) {
             unityState.activeAudioElement.pause();
             unityState.activeAudioElement.currentTime = 0;
+            releaseAudioSource(unityState.activeAudioElement);
             unityState.activeAudioElement = null;
         }
         
@@ -2131,8 +2410,8 @@
         console.log('🔇 すべての音声を停止しました');
     }
     
-    function playAudioWithLipSync(audioData, emotion) {
-        const audioSrc = audioData.startsWith('data:') ? 
+    function playAudioWithLipSync(audioData, emotion, lipSync = null) {
+        const audioSrc = isAudioUrl(audioData) ? 
             audioData : `data:audio/mp3;base64,${audioData}`;
         const audio = new Audio(audioSrc);
         audio.muted = audioState.isMuted;
@@ -2149,6 +2428,7 @@
             hasEnded = true;
             
             console.log('🎵 音声終了処理開始');
+            releaseAudioSource(audio);
             if (playbackTimer) {
                 clearTimeout(playbackTimer);
                 playbackTimer = null;
@@ -2173,6 +2453,9 @@
         audio.onplay = function() {
             console.log(`🔊 音声再生開始 (ミュート: ${audioState.isMuted})`);
             
+            // サーバーで計算済みの口の開き具合をUnityに渡す（ブラウザでの波形解析は不要）
+            sendLipSyncToUnity(lipSync, conversationState.conversationId, audio);
+            
             playbackTimer = setTimeout(() => {
                 console.log('⏰ 最大再生時間到達 - 強制終了');
                 audio.pause();
@@ -2330,7 +2613,7 @@
             introductionManager.debugLog(`🎵 音声付き自己紹介: ${emotion}`);
             
             const introTimer = setTimeout(() => {
-                startConversation(emotion, data.audio);
+                startConversation(emotion, data.audio, data.lipSync);
             }, 200);
             
             const completeTimer = setTimeout(() => {
@@ -2369,7 +2652,7 @@
             showSuggestions(data.suggestions, messageWrapper);
         }
         
-        startConversation(emotion, data.audio);
+        startConversationWhenReady(emotion, data);
     }
     
     // ====== イベントハンドラー(続き) ======
@@ -2421,7 +2704,7 @@
         
         const emotion = data.emotion || 'start';
         
-        if (data.audio) {
+        if (hasAudio(data)) {
             console.log('🎵 音声付き挨拶メッセージ');
             
             if (isUnityFullyReady()) {
@@ -2499,8 +2782,8 @@
             
             let emotion = data.emotion || 'neutral';
             
-            if (data.audio) {
-                startConversation(emotion, data.audio);
+            if (hasAudio(data)) {
+                startConversationWhenReady(emotion, data);
             } else {
                 console.log('🔇 音声データなし - テキストのみ応答');
                 
@@ -2749,19 +3032,6 @@
         }
     }
     
-    function convertBlobToBase64(blob) {
-        return new Promise((resolve, reject) => {
-            const reader = new FileReader();
-            reader.onloadend = function() {
-                resolve(reader.result);
-            };
-            reader.onerror = function() {
-                reject(new Error("ファイル変換エラー"));
-            };
-            reader.readAsDataURL(blob);
-        });
-    }
-    
     function cleanupResources() {
         // タイマーをクリア
         if (unityState.instanceCheckTimers) {
@@ -2824,8 +3094,8 @@
         sendEmotionToAvatar(data.emotion, true, 'quiz_proposal');
         
         // 音声再生
-        if (data.audio) {
-            startConversation(data.emotion, data.audio);
+        if (hasAudio(data)) {
+            startConversationWhenReady(data.emotion, data);
         }
         
         // 選択ボタンを表示
@@ -2851,8 +3121,8 @@
         sendEmotionToAvatar('neutraltalking', true, 'quiz_question');
         
         // 音声再生
-        if (data.audio) {
-            startConversation('neutraltalking', data.audio);
+        if (hasAudio(data)) {
+            startConversationWhenReady('neutraltalking', data);
         }
         
         // 選択肢ボタンを表示
@@ -2896,6 +3166,29 @@
         }
     }
 
+    /**
+     * 音声の長さ（秒）を取得
+     * URL配信の場合はメタデータだけを読み込む（ブラウザキャッシュを利用）
+     * @param {string} audioData - Base64音声データまたは音声URL
+     * @returns {Promise<number>} - 音声の長さ（秒）
+     */
+    function resolveAudioDuration(audioData) {
+        if (!audioData || !isAudioUrl(audioData) || audioData.startsWith('data:')) {
+            return Promise.resolve(estimateAudioDuration(audioData));
+        }
+        
+        return new Promise(resolve => {
+            const probe = new Audio();
+            probe.preload = 'metadata';
+            probe.onloadedmetadata = () => resolve(isFinite(probe.duration) ? probe.duration : 3);
+            probe.onerror = () => resolve(3);
+            probe.src = audioData;
+        });
+    }
+
+    // 正確な音声長（audioDurationMs）がある場合の、再生終了から次の問題までの余裕（ミリ秒）
+    const QUIZ_AUDIO_MARGIN_MS = 800;
+    
     /**
      * 回答結果を受信して表示（🎯 修正: 音声長に基づいて遅延時間を計算）
      */
@@ -2914,21 +3207,44 @@
             addMessage(explanationMessage, false, {});
             
             // 音声再生
-            if (data.audio) {
-                startConversation(data.emotion, data.audio);
+            if (hasAudio(data)) {
+                startConversationWhenReady(data.emotion, data);
             }
             
         }, 1000);
         
-        // 🎯 修正: 音声長に基づいて次の処理までの遅延時間を計算
-        let delayTime = 3000;  // デフォルト3秒
-        if (data.audio) {
-            const audioDuration = estimateAudioDuration(data.audio);
-            // 音声長 + 余裕時間（2秒）をミリ秒に変換
-            delayTime = Math.max(3000, (audioDuration + 2) * 1000);
-            console.log(`⏱️ 次の処理まで ${(delayTime / 1000).toFixed(1)}秒待ちます`);
-        }
-        
+        // 🎯 修正: 音声長に基づいて次の処理までの遅延時間を計算（後送音声は到着を待つ）
+        const receivedAt = performance.now();
+        const explanationDelayMs = 1000;
+        waitForAudio(data).then(audio => {
+            if (!audio) {
+                scheduleNextQuizStep(data, 3000);  // デフォルト3秒
+                return;
+            }
+            
+            // サーバーがヘッダーから求めた正確な長さがあれば、再生開始時刻 + 長さ + 短い余裕で次へ進む
+            if (data.audioDurationMs) {
+                const now = performance.now();
+                const playbackStartsIn = Math.max(0, receivedAt + explanationDelayMs - now);
+                const delayTime = playbackStartsIn + data.audioDurationMs + QUIZ_AUDIO_MARGIN_MS;
+                console.log(`⏱️ 次の処理まで ${(delayTime / 1000).toFixed(1)}秒待ちます (音声 ${data.audioDurationMs}ms)`);
+                scheduleNextQuizStep(data, delayTime);
+                return;
+            }
+            
+            // 旧サーバー向け: 音声データから長さを推定し、余裕時間（2秒）を加える
+            resolveAudioDuration(audio).then(audioDuration => {
+                const delayTime = Math.max(3000, (audioDuration + 2) * 1000);
+                console.log(`⏱️ 次の処理まで ${(delayTime / 1000).toFixed(1)}秒待ちます`);
+                scheduleNextQuizStep(data, delayTime);
+            });
+        });
+    }
+    
+    /**
+     * 回答結果の後、次の問題または最終結果をリクエスト
+     */
+    function scheduleNextQuizStep(data, delayTime) {
         setTimeout(() => {
             if (data.hasNextQuestion && data.nextQuestionIndex !== null) {
                 // 次の問題をサーバーにリクエスト
@@ -2962,8 +3278,8 @@
             
             sendEmotionToAvatar('happy', true, 'quiz_perfect');
             
-            if (data.audio) {
-                startConversation('happy', data.audio);
+            if (hasAudio(data)) {
+                startConversationWhenReady('happy', data);
             }
             
             // 報酬を表示
@@ -2999,8 +3315,8 @@
             
             sendEmotionToAvatar('neutral', false, 'quiz_retry_prompt');
             
-            if (data.audio) {
-                startConversation('neutral', data.audio);
+            if (hasAudio(data)) {
+                startConversationWhenReady('neutral', data);
             }
             
             // 再挑戦ボタンを表示
@@ -0,0 +1,169 @@
+# test_tts_resilience.py - サーキットブレーカーとフェイルオーバーのテスト
+# 実行: python -m unittest discover tests（リポジトリのルートで）
+import unittest
+from contextlib import contextmanager
+
+from modules.tts_resilience import CircuitBreaker, EngineFailover
+
+
+class TTSError(Exception):
+    pass
+
+
+def failing(calls, name):
+    def fn():
+        calls.append(name)
+        raise TTSError(name)
+    return fn
+
+
+def succeeding(calls, name):
+    def fn():
+        calls.append(name)
+        return f"audio:{name}"
+    return fn
+
+
+class CircuitBreakerTest(unittest.TestCase):
+
+    def make_breaker(self, open_seconds=60):
+        return CircuitBreaker('azure_speech', window_size=4, min_calls=2,
+                              error_rate_threshold=0.5, open_seconds=open_seconds)
+
+    def test_stays_closed_below_min_calls(self):
+        breaker = self.make_breaker()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+    def test_opens_on_error_rate_and_rejects(self):
+        breaker = self.make_breaker()
+        breaker.record_success(100)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+        self.assertEqual(breaker.get_stats()['rejected'], 1)
+
+    def test_opens_on_slow_p95(self):
+        breaker = CircuitBreaker('openai_tts', min_calls=2, p95_threshold_ms=1000)
+        breaker.record_success(1500)
+        breaker.record_success(1500)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+    def test_half_open_allows_single_trial_and_closes_on_success(self):
+        breaker = self.make_breaker(open_seconds=0)
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        self.assertFalse(breaker.allow_request())
+
+        breaker.record_success(100)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.get_stats()['window_calls'], 0)
+
+    def test_half_open_reopens_on_failure(self):
+        breaker = self.make_breaker(open_seconds=0)
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(breaker.get_stats()['trips'], 2)
+
+
+class EngineFailoverTest(unittest.TestCase):
+
+    def setUp(self):
+        self.failover = EngineFailover(breaker_options={'min_calls': 2, 'open_seconds': 60}, max_workers=2)
+        self.calls = []
+        self.retries = []
+
+    def tearDown(self):
+        self.failover.executor.shutdown(wait=True)
+
+    def retry_once(self, name, error, attempt):
+        self.retries.append((name, attempt))
+        return 0 if attempt == 0 else None
+
+    def test_primary_success(self):
+        result = self.failover.call([
+            ('azure_speech', succeeding(self.calls, 'azure_speech')),
+            ('openai_tts', succeeding(self.calls, 'openai_tts'))
+        ])
+        self.assertEqual(result, ('azure_speech', 'audio:azure_speech'))
+        self.assertEqual(self.calls, ['azure_speech'])
+        self.assertEqual(self.failover.get_stats()['failovers'], 0)
+
+    def test_primary_failure_falls_over_to_secondary(self):
+        result = self.failover.call([
+            ('azure_speech', failing(self.calls, 'azure_speech')),
+            ('openai_tts', succeeding(self.calls, 'openai_tts'))
+        ], retry_delay=self.retry_once)
+        self.assertEqual(result, ('openai_tts', 'audio:openai_tts'))
+        self.assertEqual(self.calls, ['azure_speech', 'openai_tts'])
+        self.assertEqual(self.retries, [])
+        self.assertEqual(self.failover.get_stats()['failovers'], 1)
+
+    def test_open_breaker_is_skipped(self):
+        breaker = self.failover.breaker('azure_speech')
+        breaker.record_failure()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        result = self.failover.call([
+            ('azure_speech', succeeding(self.calls, 'azure_speech')),
+            ('openai_tts', succeeding(self.calls, 'openai_tts'))
+        ])
+        self.assertEqual(result, ('openai_tts', 'audio:openai_tts'))
+        self.assertEqual(self.calls, ['openai_tts'])
+
+    def test_retries_only_the_last_engine(self):
+        outcomes = iter([TTSError('429'), 'audio:openai_tts'])
+
+        def flaky():
+            self.calls.append('openai_tts')
+            outcome = next(outcomes)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        result = self.failover.call([
+            ('azure_speech', failing(self.calls, 'azure_speech')),
+            ('openai_tts', flaky)
+        ], retry_delay=self.retry_once)
+        self.assertEqual(result, ('openai_tts', 'audio:openai_tts'))
+        self.assertEqual(self.calls, ['azure_speech', 'openai_tts', 'openai_tts'])
+        self.assertEqual(self.retries, [('openai_tts', 0)])
+        self.assertEqual(self.failover.get_stats()['retries'], 1)
+
+    def test_raises_last_error_when_retries_exhausted(self):
+        with self.assertRaises(TTSError) as context:
+            self.failover.call([
+                ('azure_speech', failing(self.calls, 'azure_speech')),
+                ('openai_tts', failing(self.calls, 'openai_tts'))
+            ], retry_delay=self.retry_once)
+        self.assertEqual(str(context.exception), 'openai_tts')
+        self.assertEqual(self.calls, ['azure_speech', 'openai_tts', 'openai_tts'])
+        self.assertEqual(self.retries, [('openai_tts', 0), ('openai_tts', 1)])
+
+    def test_acquire_wraps_each_engine_call(self):
+        acquired = []
+
+        @contextmanager
+        def acquire(name):
+            acquired.append(name)
+            yield
+
+        self.failover.call([
+            ('azure_speech', failing(self.calls, 'azure_speech')),
+            ('openai_tts', succeeding(self.calls, 'openai_tts'))
+        ], acquire=acquire)
+        self.assertEqual(acquired, ['azure_speech', 'openai_tts'])
+
+
+if __name__ == '__main__':
+    unittest.main()